@@ -0,0 +1,275 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+# Checks and benchmark for the PTR resolver using a local stub nameserver:
+# - every address is resolved to its name, or to an empty name if missing
+# - the dropped queries are sent again and the forged responses ignored
+# - the cached names are resolved without any other query
+# - the cache file stays valid with many processes writing at once
+# - the names written by the other processes are read at each flush
+# - time to resolve all the addresses with different concurrency
+#
+# Usage: python benchmarks/dns_resolver.py [addresses] [latency ms]
+
+import asyncio
+import multiprocessing
+import os
+import socket
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from netscanner.utils.dns_resolver import (DNS_TYPE_PTR,  # noqa: E402
+                                           RECEIVE_BUFFER_SIZE,
+                                           DNSCache,
+                                           PTRResolver)
+
+
+def get_address(index: int) -> str:
+    return '10.{B}.{C}.{D}'.format(B=index // 65536 % 256,
+                                   C=index // 256 % 256,
+                                   D=index % 256)
+
+
+def get_expected(address: str) -> str:
+    """
+    Get the name returned by the stub nameserver for an address, the
+    addresses ending with 9 are missing
+    """
+    if address.endswith('9'):
+        return ''
+    return 'host-{ADDRESS}.stub'.format(ADDRESS=address.replace('.', '-'))
+
+
+class StubNameserver(asyncio.DatagramProtocol):
+    def __init__(self,
+                 latency: float,
+                 queries: multiprocessing.Value):
+        """
+        Reply to the PTR queries after latency seconds, dropping the first
+        query for the addresses ending with .7 and sending a forged
+        response before each valid response
+        """
+        self.latency = latency
+        self.transport = None
+        self.queries = queries
+        self.dropped = set()
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+        transport.get_extra_info('socket').setsockopt(
+            socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER_SIZE)
+
+    def datagram_received(self, data: bytes, address: tuple) -> None:
+        self.queries.value += 1
+        asyncio.get_running_loop().call_later(self.latency,
+                                              self.reply,
+                                              data,
+                                              address)
+
+    def reply(self,
+              data: bytes,
+              address: tuple) -> None:
+        query_id = struct.unpack('!H', data[:2])[0]
+        offset = 12
+        labels = []
+        while data[offset]:
+            length = data[offset]
+            labels.append(data[offset + 1:offset + 1 + length].decode())
+            offset += 1 + length
+        question = data[12:offset + 5]
+        ptr_address = '.'.join(reversed(labels[:4]))
+        if ptr_address.endswith('.7') and ptr_address not in self.dropped:
+            self.dropped.add(ptr_address)
+            return
+        # Forged response with a wrong query id
+        self.transport.sendto(struct.pack('!HHHHHH',
+                                          (query_id + 1) % 65536, 0x8180,
+                                          1, 0, 0, 0) + question, address)
+        name = get_expected(ptr_address)
+        if not name:
+            # Not existing name
+            self.transport.sendto(struct.pack('!HHHHHH',
+                                              query_id, 0x8183,
+                                              1, 0, 0, 0) + question,
+                                  address)
+            return
+        data = b''.join(struct.pack('!B', len(label)) + label.encode()
+                        for label in name.split('.')) + b'\x00'
+        answer = b'\xc0\x0c' + struct.pack('!HHIH', DNS_TYPE_PTR, 1, 3600,
+                                           len(data)) + data
+        self.transport.sendto(struct.pack('!HHHHHH',
+                                          query_id, 0x8180,
+                                          1, 1, 0, 0) + question + answer,
+                              address)
+
+
+def serve(latency: float,
+          queries: multiprocessing.Value,
+          connection) -> None:
+    """
+    Run the stub nameserver in its own process, like a remote nameserver,
+    sending back its address
+    """
+    async def run() -> None:
+        transport, _ = await asyncio.get_running_loop(
+            ).create_datagram_endpoint(
+                lambda: StubNameserver(latency=latency,
+                                       queries=queries),
+                local_addr=('127.0.0.1', 0))
+        connection.send(transport.get_extra_info('sockname'))
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+async def resolve(resolver: PTRResolver,
+                  addresses: list,
+                  concurrency: int) -> list:
+    """
+    Resolve the addresses with at most concurrency queries at once
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def resolve_address(address: str) -> str:
+        async with semaphore:
+            return await resolver.resolve(address)
+
+    return await asyncio.gather(*(resolve_address(address)
+                                  for address in addresses))
+
+
+async def benchmark(addresses: list,
+                    latency: float,
+                    concurrency: int,
+                    cache_path: str) -> int:
+    """
+    Resolve the addresses twice, returning the errors
+    """
+    queries = multiprocessing.Value('i', 0)
+    connection, server_connection = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=serve,
+                                     args=(latency, queries,
+                                           server_connection),
+                                     daemon=True)
+    server.start()
+    resolver = PTRResolver(nameservers=[tuple(connection.recv())],
+                           timeout=0.5,
+                           retries=2,
+                           cache=DNSCache(path=cache_path),
+                           negative_ttl=300)
+    start_time = time.perf_counter()
+    names = await resolve(resolver=resolver,
+                          addresses=addresses,
+                          concurrency=concurrency)
+    elapsed = time.perf_counter() - start_time
+    sent_queries = queries.value
+    # Every name must be cached now
+    cached_names = await resolve(resolver=resolver,
+                                 addresses=addresses,
+                                 concurrency=concurrency)
+    server.terminate()
+    server.join()
+    resolver.cache.flush()
+    errors = sum(1
+                 for address, name, cached_name
+                 in zip(addresses, names, cached_names)
+                 if name != get_expected(address) or cached_name != name)
+    if queries.value != sent_queries:
+        errors += 1
+    print('{CONCURRENCY:>5} concurrency {ELAPSED:>8.3f} s '
+          '{QUERIES:>6} queries {ERRORS:>4} errors'.format(
+              CONCURRENCY=concurrency,
+              ELAPSED=elapsed,
+              QUERIES=sent_queries,
+              ERRORS=errors))
+    return errors
+
+
+def write_cache(path: str,
+                first: int,
+                count: int) -> None:
+    """
+    Load the cache file and add many names, like a consumer process
+    """
+    cache = DNSCache(path=path)
+    for index in range(first, first + count):
+        address = get_address(index)
+        cache.get(address)
+        cache.set(address=address,
+                  name=get_expected(address),
+                  ttl=3600)
+        if cache.needs_flush():
+            cache.flush()
+    cache.flush()
+
+
+def check_shared_cache(path: str,
+                       processes: int,
+                       count: int) -> int:
+    """
+    Write the cache file from many processes at once, returning the errors
+    """
+    # Load the cache before the other processes write their names
+    cache = DNSCache(path=path)
+    cache.get(get_address(0))
+    workers = [multiprocessing.Process(target=write_cache,
+                                       args=(path, index * count, count))
+               for index in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    cache.flush()
+    errors = sum(1
+                 for index in range(processes * count)
+                 if cache.get(get_address(index)) !=
+                 (True, get_expected(get_address(index))))
+    print('{PROCESSES:>5} processes {COUNT:>6} names {ERRORS:>4} '
+          'errors'.format(PROCESSES=processes,
+                          COUNT=processes * count,
+                          ERRORS=errors))
+    return errors
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.02
+    addresses = [get_address(index) for index in range(count)]
+    print('{COUNT} addresses, {LATENCY:.0f} ms latency'.format(
+        COUNT=count,
+        LATENCY=latency * 1000))
+    errors = 0
+    with tempfile.TemporaryDirectory() as directory:
+        for concurrency in (16, 128, 1024):
+            errors += asyncio.run(benchmark(
+                addresses=addresses,
+                latency=latency,
+                concurrency=concurrency,
+                cache_path=os.path.join(directory,
+                                        'cache-{CONCURRENCY}'.format(
+                                            CONCURRENCY=concurrency))))
+        errors += check_shared_cache(path=os.path.join(directory, 'shared'),
+                                     processes=8,
+                                     count=500)
+    sys.exit(1 if errors else 0)
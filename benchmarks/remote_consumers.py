@@ -0,0 +1,219 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+# Checks and benchmark for the coordinator with many local stub agents:
+# - every address gets exactly one result, even if an agent stops in the
+#   middle of a task and its lease expires
+# - the requests without the shared token are refused
+# - the rate of all the agents together doesn't exceed the bucket rate
+# - time to process all the addresses with a different number of agents
+#
+# Usage: python benchmarks/remote_consumers.py [addresses] [latency ms]
+
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from netscanner.utils.batches import get_batches  # noqa: E402
+from netscanner.utils.rate_limiter import RateLimiter  # noqa: E402
+from netscanner.utils.remote_consumers import (HEADER_TOKEN,  # noqa: E402
+                                               PATH_LEASE,
+                                               PATH_RESULTS,
+                                               RemoteConsumers,
+                                               decode_message,
+                                               encode_message)
+
+TOKEN = 'benchmark'
+
+
+def get_address(index: int) -> str:
+    return '10.{B}.{C}.{D}'.format(B=index // 65536 % 256,
+                                   C=index // 256 % 256,
+                                   D=index % 256)
+
+
+def send(url: str,
+         path: str,
+         message: dict,
+         token: str = TOKEN):
+    """
+    Send a message to the coordinator like the agents
+    """
+    request = urllib.request.Request(url=url + path,
+                                     data=encode_message(message),
+                                     headers={HEADER_TOKEN: token})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return decode_message(response.read())
+
+
+class StubAgent(object):
+    def __init__(self,
+                 url: str,
+                 name: str,
+                 latency: float,
+                 stop_after: int = 0):
+        """
+        Lease the tasks and reply to each address after latency seconds,
+        consuming the tokens from its own rate limiter like the agents.
+        With stop_after the agent stops after the number of results,
+        without completing its task
+        """
+        self.url = url
+        self.name = name
+        self.latency = latency
+        self.stop_after = stop_after
+        self.limiter = RateLimiter()
+        self.processed = 0
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        try:
+            self.process()
+        except OSError:
+            # The coordinator was closed
+            pass
+
+    def process(self) -> None:
+        while not self.stopped.is_set():
+            task = send(url=self.url,
+                        path=PATH_LEASE,
+                        message={'agent': self.name})
+            if not task:
+                time.sleep(0.05)
+                continue
+            buckets = tuple(tuple(bucket)
+                            for bucket in task['specs']['buckets'])
+            for batch in get_batches(items=task['items'], size=20):
+                results = []
+                for address in batch:
+                    if buckets:
+                        self.limiter.acquire(buckets)
+                    time.sleep(self.latency)
+                    results.append((address, {'status': True,
+                                              'agent': self.name}))
+                    self.processed += 1
+                    if self.stop_after and self.processed >= self.stop_after:
+                        # Stop without sending the results
+                        self.stopped.set()
+                        return
+                send(url=self.url,
+                     path=PATH_RESULTS,
+                     message={'agent': self.name,
+                              'task': task['task'],
+                              'results': results,
+                              'final': False})
+            send(url=self.url,
+                 path=PATH_RESULTS,
+                 message={'agent': self.name,
+                          'task': task['task'],
+                          'results': [],
+                          'final': True})
+
+
+def benchmark(addresses: list,
+              latency: float,
+              agents: int,
+              rate: int = 0,
+              stopping: int = 0) -> int:
+    """
+    Process the addresses with many agents, returning the errors
+    """
+    with RemoteConsumers(address='127.0.0.1',
+                         port=0,
+                         lease=1,
+                         token=TOKEN) as consumers:
+        url = 'http://127.0.0.1:{PORT}'.format(
+            PORT=consumers.server.server_address[1])
+        errors = 0
+        try:
+            send(url=url,
+                 path=PATH_LEASE,
+                 message={'agent': 'intruder'},
+                 token='')
+            errors += 1
+        except urllib.error.HTTPError as error:
+            if error.code != 403:
+                errors += 1
+        buckets = ((consumers.limiter.get_bucket(key=('command', ),
+                                                 rate=rate), )
+                   if rate else ())
+        stubs = [StubAgent(url=url,
+                           name='agent-{INDEX}'.format(INDEX=index),
+                           latency=latency,
+                           stop_after=10 if index < stopping else 0)
+                 for index in range(agents)]
+        threads = [threading.Thread(target=stub.run, daemon=True)
+                   for stub in stubs]
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        job = consumers.execute(specs={'tool': 'stub',
+                                       'buckets': buckets},
+                                tasks=get_batches(items=addresses, size=100))
+        results = list(job.results_as_iterator())
+        elapsed = time.perf_counter() - start_time
+        for stub in stubs:
+            stub.stopped.set()
+    for thread in threads:
+        thread.join()
+    received = [address for address, _ in results]
+    if sorted(received) != sorted(addresses):
+        errors += 1
+    if rate and len(addresses) / elapsed > rate * 1.1:
+        errors += 1
+    print('{AGENTS:>3} agents {STOPPING} stopping {RATE:>5} rate '
+          '{ELAPSED:>8.3f} s {RESULTS:>6} results/s {ERRORS:>4} '
+          'errors'.format(AGENTS=agents,
+                          STOPPING=stopping,
+                          RATE=rate,
+                          ELAPSED=elapsed,
+                          RESULTS=int(len(results) / elapsed),
+                          ERRORS=errors))
+    return errors
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.001
+    addresses = [get_address(index) for index in range(count)]
+    print('{COUNT} addresses, {LATENCY:.0f} ms latency'.format(
+        COUNT=count,
+        LATENCY=latency * 1000))
+    errors = 0
+    for agents in (1, 2, 4):
+        errors += benchmark(addresses=addresses,
+                            latency=latency,
+                            agents=agents)
+    # Agents stopping in the middle of their first task
+    errors += benchmark(addresses=addresses,
+                        latency=latency,
+                        agents=4,
+                        stopping=2)
+    # Rate shared between the agents
+    errors += benchmark(addresses=addresses,
+                        latency=0,
+                        agents=4,
+                        rate=1000)
+    sys.exit(1 if errors else 0)
@@ -0,0 +1,144 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+# Microbenchmark comparing the results transport used by the consumers:
+# - queue: a multiprocessing.Manager().Queue() with a put for every result
+# - pipe: a pipe for every worker using ResultsWriter and ResultsReader
+#
+# Usage: python benchmarks/results_transport.py [results] [workers]
+
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from netscanner.utils.results_pipe import (ResultsReader,   # noqa: E402
+                                           ResultsWriter)
+
+# Sample result similar to the ones returned by the scanner tools
+RESULT = {'reply': True,
+          'status': True,
+          'timestamp': 1577836800.0,
+          'start': 1577836800.0,
+          'end': 1577836800.001,
+          'duration': 1.0}
+
+
+def get_address(index: int) -> str:
+    """
+    Get a fake IP address from its index
+    """
+    return '10.{}.{}.{}'.format(index >> 16 & 255,
+                                index >> 8 & 255,
+                                index & 255)
+
+
+def produce_queue(results_queue,
+                  start: int,
+                  count: int) -> None:
+    """
+    Put every result in the manager queue, then the stopper value
+    """
+    for index in range(start, start + count):
+        results_queue.put((get_address(index), RESULT))
+    results_queue.put(None)
+
+
+def produce_pipe(connection,
+                 start: int,
+                 count: int) -> None:
+    """
+    Send every result in batches using a ResultsWriter
+    """
+    results = ResultsWriter(connection=connection,
+                            batch_size=256,
+                            flush_interval=0.2)
+    for index in range(start, start + count):
+        results.put((get_address(index), RESULT))
+    results.close()
+    connection.close()
+
+
+def benchmark_queue(total: int,
+                    workers: int) -> int:
+    results_queue = multiprocessing.Manager().Queue()
+    processes = []
+    for worker in range(workers):
+        processes.append(multiprocessing.Process(
+            target=produce_queue,
+            args=(results_queue,
+                  worker * total // workers,
+                  total // workers)))
+    for process in processes:
+        process.start()
+    received = 0
+    running = workers
+    while running:
+        result = results_queue.get()
+        if result is None:
+            running -= 1
+        else:
+            received += 1
+    for process in processes:
+        process.join()
+    return received
+
+
+def benchmark_pipe(total: int,
+                   workers: int) -> int:
+    processes = []
+    connections = []
+    for worker in range(workers):
+        reader, writer = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(
+            target=produce_pipe,
+            args=(writer,
+                  worker * total // workers,
+                  total // workers))
+        process.start()
+        writer.close()
+        processes.append(process)
+        connections.append(reader)
+    received = 0
+    for _ in ResultsReader(connections=connections):
+        received += 1
+    for process in processes:
+        process.join()
+    return received
+
+
+if __name__ == '__main__':
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 65536
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    print('{RESULTS} results, {WORKERS} workers'.format(
+        RESULTS=total,
+        WORKERS=workers))
+    for name, function in (('queue', benchmark_queue),
+                           ('pipe', benchmark_pipe)):
+        start_time = time.perf_counter()
+        received = function(total=total, workers=workers)
+        elapsed = time.perf_counter() - start_time
+        print('{NAME:<8}{RECEIVED:>8} results {ELAPSED:>8.3f} s '
+              '{RATE:>10.0f} results/s'.format(NAME=name,
+                                               RECEIVED=received,
+                                               ELAPSED=elapsed,
+                                               RATE=received / elapsed))
@@ -0,0 +1,192 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+# Offline checks for the SMB session setup replies parser:
+# - corpus: every reply in the corpus is parsed into the expected values
+#           and read back whole from the NetBIOS session framing
+# - fuzz: truncated and mutated replies never raise exceptions
+# - benchmark: parsing throughput for the corpus replies
+#
+# Usage: python benchmarks/smb_protocol.py [iterations] [fuzz cases] [seed]
+
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from netscanner.utils.smb_protocol import (NETBIOS_HEADER,   # noqa: E402
+                                           NETBIOS_SESSION_KEEPALIVE,
+                                           NETBIOS_SESSION_MESSAGE,
+                                           parse_session_setup,
+                                           read_message)
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'corpus',
+                           'smb_session_setup.jsonl')
+
+
+def load_corpus(path: str) -> list:
+    """
+    Load the replies corpus, a JSON object for each line
+    """
+    with open(path, 'r') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def get_frame(kind: int,
+              message: bytes) -> bytes:
+    """
+    Get a NetBIOS session message with its header
+    """
+    return NETBIOS_HEADER.pack(kind,
+                               len(message) >> 16 & 0x01,
+                               len(message) & 0xffff) + message
+
+
+def send_fragments(sock: socket.socket,
+                   data: bytes) -> None:
+    """
+    Send the data in small fragments to test the framing
+    """
+    index = 0
+    while index < len(data):
+        size = random.randint(1, 97)
+        sock.sendall(data[index:index + size])
+        index += size
+        time.sleep(0)
+    sock.close()
+
+
+def check_corpus(corpus: list) -> int:
+    """
+    Check every reply against its expected values, returning the errors
+    """
+    errors = 0
+    for entry in corpus:
+        reply = bytes.fromhex(entry['reply'])
+        # Read the whole reply from fragmented frames
+        reader, writer = socket.socketpair()
+        thread = threading.Thread(
+            target=send_fragments,
+            args=(writer,
+                  get_frame(NETBIOS_SESSION_KEEPALIVE, b'') +
+                  get_frame(NETBIOS_SESSION_MESSAGE, reply)))
+        thread.start()
+        message = read_message(reader)
+        thread.join()
+        reader.close()
+        if message != reply:
+            print('{NAME}: framing mismatch'.format(NAME=entry['name']))
+            errors += 1
+        results = parse_session_setup(message)
+        if 'timestamp' in results:
+            results['timestamp'] = results['timestamp'].timestamp()
+        for key, value in entry['expected'].items():
+            if results.get(key) != value:
+                print('{NAME}: {KEY} is {RESULT!r} instead of {VALUE!r}'
+                      .format(NAME=entry['name'],
+                              KEY=key,
+                              RESULT=results.get(key),
+                              VALUE=value))
+                errors += 1
+    return errors
+
+
+def get_mutation(reply: bytes) -> bytes:
+    """
+    Get a truncated or randomly modified reply
+    """
+    mutation = random.randint(0, 2)
+    if mutation == 0:
+        # Truncated reply
+        return reply[:random.randint(0, len(reply))]
+    data = bytearray(reply)
+    if mutation == 1:
+        # Random bytes
+        for _ in range(random.randint(1, 8)):
+            data[random.randrange(len(data))] = random.getrandbits(8)
+    else:
+        # Random lengths and offsets, with big values
+        for _ in range(random.randint(1, 4)):
+            index = random.randrange(len(data) - 1)
+            data[index:index + 2] = random.choice(
+                (b'\xff\xff', b'\x00\x00', b'\xff\x7f', b'\x01\x00'))
+    return bytes(data)
+
+
+def fuzz_corpus(corpus: list,
+                cases: int) -> int:
+    """
+    Parse mutated replies from the corpus, returning the failures
+    """
+    replies = [bytes.fromhex(entry['reply']) for entry in corpus]
+    failures = 0
+    for _ in range(cases):
+        data = get_mutation(random.choice(replies))
+        try:
+            parse_session_setup(data)
+        except Exception as error:
+            if not failures:
+                print('fuzz: {ERROR!r} parsing {DATA}'.format(
+                    ERROR=error,
+                    DATA=data.hex()))
+            failures += 1
+    return failures
+
+
+def benchmark_corpus(corpus: list,
+                     iterations: int) -> None:
+    """
+    Measure the parsing throughput for every reply in the corpus
+    """
+    for entry in corpus:
+        reply = bytes.fromhex(entry['reply'])
+        start_time = time.perf_counter()
+        for _ in range(iterations):
+            parse_session_setup(reply)
+        elapsed = time.perf_counter() - start_time
+        print('{NAME:<28}{SIZE:>6} bytes {RATE:>10.0f} replies/s '
+              '{THROUGHPUT:>8.2f} MB/s'.format(
+                  NAME=entry['name'],
+                  SIZE=len(reply),
+                  RATE=iterations / elapsed,
+                  THROUGHPUT=len(reply) * iterations / elapsed / 1e6))
+
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    cases = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    random.seed(int(sys.argv[3]) if len(sys.argv) > 3 else 0)
+    corpus = load_corpus(CORPUS_PATH)
+    errors = check_corpus(corpus)
+    print('corpus: {COUNT} replies, {ERRORS} errors'.format(
+        COUNT=len(corpus),
+        ERRORS=errors))
+    failures = fuzz_corpus(corpus=corpus, cases=cases)
+    print('fuzz: {CASES} cases, {FAILURES} failures'.format(
+        CASES=cases,
+        FAILURES=failures))
+    benchmark_corpus(corpus=corpus, iterations=iterations)
+    sys.exit(1 if errors or failures else 0)
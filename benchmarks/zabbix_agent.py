@@ -0,0 +1,156 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+# Checks and benchmark for the Zabbix agent client using a local stub agent:
+# - every item value is received whole, including large and compressed ones
+# - the connections to the agent never exceed the maximum connections
+# - time to request all the items with different maximum connections
+#
+# Usage: python benchmarks/zabbix_agent.py [hosts] [latency ms]
+
+import asyncio
+import os
+import struct
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from netscanner.tools.zabbix_agent import ZabbixAgent   # noqa: E402
+from netscanner.utils.zabbix_protocol import (ZBXD_FLAG_COMPRESSION,  # noqa
+                                              ZBXD_FLAG_LARGE,
+                                              ZBXD_FLAG_PROTOCOL,
+                                              ZBXD_HEADER,
+                                              ZBXD_SIGNATURE)
+
+# Values returned by the stub agent
+VALUES = {
+    'agent.ping': b'1',
+    'agent.hostname': b'stub-agent',
+    'agent.version': b'6.0.0',
+    'system.uname': b'Linux stub-agent 5.10.0 x86_64',
+    'system.uptime': b'123456',
+    'system.cpu.num': b'8',
+    'vfs.fs.discovery': b'[' + b','.join(
+        b'{"{#FSNAME}":"/mnt/disk%d","{#FSTYPE}":"ext4"}' % index
+        for index in range(2000)) + b']',
+    'system.sw.packages': b', '.join(
+        b'package-%d (1.0.%d-1)' % (index, index)
+        for index in range(100000)),
+}
+UNSUPPORTED = b'ZBX_NOTSUPPORTED\x00Unsupported item key.'
+
+
+class StubAgent(object):
+    def __init__(self,
+                 latency: float):
+        self.latency = latency
+        self.connections = 0
+        self.max_connections = 0
+
+    async def handle(self,
+                     reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        """
+        Reply to a single request with a random fragmentation
+        """
+        self.connections += 1
+        self.max_connections = max(self.max_connections, self.connections)
+        try:
+            _, _, length, _ = ZBXD_HEADER.unpack(
+                await reader.readexactly(ZBXD_HEADER.size))
+            item = (await reader.readexactly(length)).decode()
+            await asyncio.sleep(self.latency)
+            value = VALUES.get(item, UNSUPPORTED)
+            if item == 'system.sw.packages':
+                # Large packet, compressed
+                data = zlib.compress(value)
+                response = (struct.pack('<4sBQQ',
+                                        ZBXD_SIGNATURE,
+                                        ZBXD_FLAG_PROTOCOL |
+                                        ZBXD_FLAG_COMPRESSION |
+                                        ZBXD_FLAG_LARGE,
+                                        len(data),
+                                        len(value)) + data)
+            else:
+                response = ZBXD_HEADER.pack(ZBXD_SIGNATURE,
+                                            ZBXD_FLAG_PROTOCOL,
+                                            len(value),
+                                            0) + value
+            for index in range(0, len(response), 1000):
+                writer.write(response[index:index + 1000])
+                await writer.drain()
+        finally:
+            self.connections -= 1
+            writer.close()
+
+
+async def benchmark(hosts: int,
+                    latency: float,
+                    max_connections: int) -> int:
+    """
+    Request all the items for many hosts, returning the errors
+    """
+    agent = StubAgent(latency=latency)
+    server = await asyncio.start_server(agent.handle, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    tool = ZabbixAgent(verbosity=1,
+                       timeout=10,
+                       port=port,
+                       items=list(VALUES.keys()) + ['unsupported.key'],
+                       max_connections=max_connections)
+    start_time = time.perf_counter()
+    results = await asyncio.gather(*(tool.execute_async('127.0.0.1')
+                                     for _ in range(hosts)))
+    elapsed = time.perf_counter() - start_time
+    server.close()
+    await server.wait_closed()
+    errors = 0
+    for result in results:
+        for item, value in VALUES.items():
+            if result.get(item) != value.decode():
+                errors += 1
+        if 'unsupported.key' in result:
+            errors += 1
+    if agent.max_connections > hosts * max_connections:
+        errors += 1
+    print('{CONNECTIONS:>3} connections {ELAPSED:>8.3f} s '
+          '{MAX:>4} max concurrent {ERRORS:>4} errors'.format(
+              CONNECTIONS=max_connections,
+              ELAPSED=elapsed,
+              MAX=agent.max_connections,
+              ERRORS=errors))
+    return errors
+
+
+if __name__ == '__main__':
+    hosts = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.02
+    print('{HOSTS} hosts, {ITEMS} items, {LATENCY:.0f} ms latency'.format(
+        HOSTS=hosts,
+        ITEMS=len(VALUES) + 1,
+        LATENCY=latency * 1000))
+    errors = 0
+    for max_connections in (1, 3, 8):
+        errors += asyncio.run(benchmark(hosts=hosts,
+                                        latency=latency,
+                                        max_connections=max_connections))
+    sys.exit(1 if errors else 0)
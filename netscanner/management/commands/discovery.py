@@ -62,6 +62,37 @@ class Command(BaseCommand):
                                 'Scanner Custom',
                                 'Execute the discovery only to the selected '
                                 'destinations'))
+        parser.add_argument('--max-tasks',
+                            action='store',
+                            type=int,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner Custom',
+                                'Replace each worker process after the '
+                                'number of tasks (0 for never)'))
+        parser.add_argument('--max-rate',
+                            action='store',
+                            type=int,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner Custom',
+                                'Maximum probes per second for the whole '
+                                'command (0 for unlimited)'))
+        parser.add_argument('--task-timeout',
+                            action='store',
+                            type=float,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner Custom',
+                                'Interrupt each probe after the number of '
+                                'seconds (0 for never)'))
+        parser.add_argument('--resume',
+                            action='store_true',
+                            default=False,
+                            help=pgettext_lazy(
+                                'Scanner Custom',
+                                'Continue the last run, skipping the '
+                                'already completed addresses'))
 
     def handle(self, *args, **options) -> None:
         management_command = DiscoveryBaseCommand()
@@ -41,7 +41,8 @@ class Command(HostBaseCommand):
         return SNMPGetInfo(verbosity=options.get('verbosity', 1),
                            timeout=discovery.timeout,
                            port=options.get('port', 161),
-                           retries=options.get('retries', 0))
+                           retries=options.get('retries', 0),
+                           max_oids=options.get('max_oids', 32))
 
     def process_results(self,
                         discovery: Discovery,
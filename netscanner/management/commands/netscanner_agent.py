@@ -0,0 +1,288 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+import argparse
+import concurrent.futures
+import signal
+import socket
+import threading
+import time
+import urllib.request
+
+from django.core.management.base import BaseCommand
+from django.utils.translation import pgettext_lazy
+
+from netscanner.management.discovery_base_command import DiscoveryBaseCommand
+from netscanner.models import Discovery
+from netscanner.utils.batches import get_batches
+from netscanner.utils.consumers import Consumers
+from netscanner.utils.remote_consumers import (HEADER_TOKEN,
+                                               PATH_LEASE,
+                                               PATH_RESULTS,
+                                               decode_message,
+                                               encode_message)
+
+from . import discovery_tool_commands
+
+
+class Command(BaseCommand):
+    help = 'Execute the discoveries served by a coordinator'
+
+    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
+        BaseCommand.add_arguments(self, parser)
+        parser.add_argument('--coordinator',
+                            action='store',
+                            type=str,
+                            required=True,
+                            help=pgettext_lazy(
+                                'Scanner Agent',
+                                'Coordinator URL (like '
+                                'http://127.0.0.1:8765)'))
+        parser.add_argument('--name',
+                            action='store',
+                            type=str,
+                            default=socket.gethostname(),
+                            help=pgettext_lazy(
+                                'Scanner Agent',
+                                'Agent name'))
+        parser.add_argument('--token',
+                            action='store',
+                            type=str,
+                            default='',
+                            help=pgettext_lazy(
+                                'Scanner Agent',
+                                'Token shared with the coordinator'))
+        parser.add_argument('--slots',
+                            action='store',
+                            type=int,
+                            default=4,
+                            help=pgettext_lazy(
+                                'Scanner Agent',
+                                'Number of tasks to execute at once'))
+        parser.add_argument('--poll',
+                            action='store',
+                            type=float,
+                            default=1.0,
+                            help=pgettext_lazy(
+                                'Scanner Agent',
+                                'Seconds to wait when no task is available'))
+        parser.add_argument('--idle',
+                            action='store',
+                            type=float,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner Agent',
+                                'Exit after the number of seconds without '
+                                'any task (0 for never)'))
+        parser.add_argument('--batch-size',
+                            action='store',
+                            type=int,
+                            default=100,
+                            help=pgettext_lazy(
+                                'Scanner Agent',
+                                'Number of results to send at once'))
+        parser.add_argument('--max-tasks',
+                            action='store',
+                            type=int,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner Agent',
+                                'Replace each worker process after the '
+                                'number of tasks (0 for never)'))
+        parser.add_argument('--max-workers',
+                            action='store',
+                            type=int,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner Agent',
+                                'Maximum worker processes shared by every '
+                                'task (0 for unlimited)'))
+        parser.add_argument('--max-probes',
+                            action='store',
+                            type=int,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner Agent',
+                                'Maximum probes at once of the threads and '
+                                'async executors, shared by every task '
+                                '(0 for unlimited)'))
+
+    def handle(self, *args, **options) -> None:
+        self.management_command = DiscoveryBaseCommand()
+        # Set verbosity level
+        self.management_command.verbosity = options['verbosity']
+        # Stop the agent also using SIGTERM
+        signal.signal(signal.SIGTERM, self.terminate)
+        # Scanner tools by job id
+        self.tools = {}
+        self.tools_lock = threading.Lock()
+        stop = threading.Event()
+        # Share the same consumers pool for every task
+        with Consumers(max_tasks=options['max_tasks'],
+                       max_consumers=options['max_workers'],
+                       max_probes=options['max_probes']) as consumers, \
+                concurrent.futures.ThreadPoolExecutor(
+                    max_workers=max(options['slots'], 1)) as executor:
+            futures = [executor.submit(self.run_slot,
+                                       options=options,
+                                       consumers=consumers,
+                                       stop=stop)
+                       for _ in range(max(options['slots'], 1))]
+            try:
+                for future in futures:
+                    # Raise any error from the slots
+                    future.result()
+            except KeyboardInterrupt:
+                if self.management_command.verbosity >= 1:
+                    self.management_command.print(
+                        'Waiting for the running tasks')
+                stop.set()
+
+    def terminate(self, signum, frame) -> None:
+        """
+        Stop the agent after a termination signal
+        """
+        raise KeyboardInterrupt()
+
+    def run_slot(self,
+                 options: dict,
+                 consumers: Consumers,
+                 stop: threading.Event) -> None:
+        """
+        Lease and execute the tasks from the coordinator, until stopped
+        :param options: general options from command line
+        :param consumers: consumers pool shared by every task
+        :param stop: event to stop leasing new tasks
+        :return: None
+        """
+        idle_time = time.monotonic()
+        while not stop.is_set():
+            try:
+                task = self.send(options=options,
+                                 path=PATH_LEASE,
+                                 message={'agent': options['name']})
+                if task:
+                    self.execute_task(options=options,
+                                      task=task,
+                                      consumers=consumers)
+                    idle_time = time.monotonic()
+                    continue
+            except (OSError, ValueError) as error:
+                # The coordinator will lease the task again
+                if self.management_command.verbosity >= 1:
+                    self.management_command.print(
+                        'Task error: {ERROR}'.format(ERROR=error))
+            if (options['idle'] and
+                    time.monotonic() - idle_time >= options['idle']):
+                # No more tasks to execute
+                break
+            stop.wait(options['poll'])
+
+    def execute_task(self,
+                     options: dict,
+                     task: dict,
+                     consumers: Consumers) -> None:
+        """
+        Execute a task leased from the coordinator and send its results
+        :param options: general options from command line
+        :param task: dictionary with the leased task
+        :param consumers: consumers pool shared by every task
+        :return: None
+        """
+        specs = task['specs']
+        command, tool = self.get_tool(options=options,
+                                      specs=specs)
+        if self.management_command.verbosity >= 1:
+            self.management_command.print(
+                'Executing {COUNT} addresses for discovery '
+                '{DISCOVERY}'.format(COUNT=len(task['items']),
+                                     DISCOVERY=specs['discovery']))
+        # Execute the task as a single chunk using the local executors
+        job = command.execute_tool(
+            discovery=Discovery(name=specs['discovery'],
+                                timeout=specs['timeout'],
+                                workers=specs['workers']),
+            options=specs['options'],
+            tool=tool,
+            tasks=[task['items']],
+            consumers=consumers,
+            buckets=tuple(tuple(bucket) for bucket in specs['buckets']))
+        for results in get_batches(items=job.results_as_iterator(),
+                                   size=options['batch_size']):
+            self.send(options=options,
+                      path=PATH_RESULTS,
+                      message={'agent': options['name'],
+                               'task': task['task'],
+                               'results': results,
+                               'final': False})
+        self.send(options=options,
+                  path=PATH_RESULTS,
+                  message={'agent': options['name'],
+                           'task': task['task'],
+                           'results': [],
+                           'final': True})
+
+    def get_tool(self,
+                 options: dict,
+                 specs: dict) -> tuple:
+        """
+        Get the command and the scanner tool for a job
+        :param options: general options from command line
+        :param specs: dictionary describing the scanner tool to execute
+        :return: tuple with the command and the scanner tool instance
+        """
+        with self.tools_lock:
+            if specs['job'] not in self.tools:
+                for command_class in discovery_tool_commands:
+                    if command_class.tool_name == specs['tool']:
+                        command = command_class()
+                        break
+                else:
+                    raise ValueError('Unknown tool {TOOL}'.format(
+                        TOOL=specs['tool']))
+                tool = command.instance_scanner_tool(
+                    discovery=Discovery(name=specs['discovery'],
+                                        timeout=specs['timeout'],
+                                        workers=specs['workers']),
+                    options=dict(specs['options'],
+                                 verbosity=options['verbosity']))
+                # Keep only the tools for the recent jobs
+                while len(self.tools) >= 16:
+                    del self.tools[next(iter(self.tools))]
+                self.tools[specs['job']] = (command, tool)
+            return self.tools[specs['job']]
+
+    def send(self,
+             options: dict,
+             path: str,
+             message: dict):
+        """
+        Send a compressed message to the coordinator
+        :param options: general options from command line
+        :param path: coordinator path
+        :param message: message to send
+        :return: response from the coordinator
+        """
+        request = urllib.request.Request(
+            url=options['coordinator'].rstrip('/') + path,
+            data=encode_message(message),
+            headers={HEADER_TOKEN: options['token'],
+                     'Content-Type': 'application/octet-stream'})
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return decode_message(response.read())
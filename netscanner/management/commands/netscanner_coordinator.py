@@ -0,0 +1,227 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+import argparse
+import concurrent.futures
+import ipaddress
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.translation import pgettext_lazy
+
+from netscanner.management.discovery_base_command import DiscoveryBaseCommand
+from netscanner.models import Discovery
+from netscanner.utils.remote_consumers import RemoteConsumers
+
+from . import discovery_tool_commands
+
+
+class Command(BaseCommand):
+    help = 'Serve the discoveries to the remote agents'
+
+    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
+        BaseCommand.add_arguments(self, parser)
+        parser.add_argument('--discovery',
+                            action='store',
+                            type=str,
+                            nargs='+',
+                            required=True,
+                            help=pgettext_lazy(
+                                'Scanner Coordinator',
+                                'Discoveries to execute'))
+        parser.add_argument('--disabled',
+                            action='store_true',
+                            default=False,
+                            help=pgettext_lazy(
+                                'Scanner Coordinator',
+                                'Launch also disabled discoveries'))
+        parser.add_argument('--failing',
+                            action='store_true',
+                            default=False,
+                            help=pgettext_lazy(
+                                'Scanner Coordinator',
+                                'Save results also for failing hosts'))
+        parser.add_argument('--destinations',
+                            action='store',
+                            type=str,
+                            required=False,
+                            help=pgettext_lazy(
+                                'Scanner Coordinator',
+                                'Execute the discoveries only to the '
+                                'selected destinations'))
+        parser.add_argument('--listen-address',
+                            action='store',
+                            type=str,
+                            default='127.0.0.1',
+                            help=pgettext_lazy(
+                                'Scanner Coordinator',
+                                'Address to listen for the agents'))
+        parser.add_argument('--listen-port',
+                            action='store',
+                            type=int,
+                            default=8765,
+                            help=pgettext_lazy(
+                                'Scanner Coordinator',
+                                'Port to listen for the agents'))
+        parser.add_argument('--token',
+                            action='store',
+                            type=str,
+                            default='',
+                            help=pgettext_lazy(
+                                'Scanner Coordinator',
+                                'Token shared with the agents (required '
+                                'unless listening on a loopback '
+                                'address)'))
+        parser.add_argument('--lease',
+                            action='store',
+                            type=float,
+                            default=30,
+                            help=pgettext_lazy(
+                                'Scanner Coordinator',
+                                'Lease the addresses of an agent again '
+                                'after the number of seconds without '
+                                'results'))
+        parser.add_argument('--max-rate',
+                            action='store',
+                            type=int,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner Coordinator',
+                                'Maximum probes per second for all the '
+                                'agents together (0 for unlimited)'))
+        parser.add_argument('--task-timeout',
+                            action='store',
+                            type=float,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner Coordinator',
+                                'Interrupt each probe after the number of '
+                                'seconds (0 for never)'))
+        parser.add_argument('--resume',
+                            action='store_true',
+                            default=False,
+                            help=pgettext_lazy(
+                                'Scanner Coordinator',
+                                'Continue the last run, skipping the '
+                                'already completed addresses'))
+
+    def handle(self, *args, **options) -> None:
+        management_command = DiscoveryBaseCommand()
+        # Set verbosity level
+        management_command.verbosity = options['verbosity']
+        destinations = (options['destinations'].split(' ')
+                        if options['destinations']
+                        else None)
+        # Don't send the token to the agents or save it in the results
+        token = options.pop('token')
+        if not token and not self.is_loopback(options['listen_address']):
+            # Any host could lease the tasks and send forged results
+            raise CommandError('A token is required to listen on '
+                               '{ADDRESS}'.format(
+                                    ADDRESS=options['listen_address']))
+        with RemoteConsumers(address=options['listen_address'],
+                             port=options['listen_port'],
+                             lease=options['lease'],
+                             token=token) as consumers, \
+                concurrent.futures.ThreadPoolExecutor(
+                    max_workers=len(options['discovery'])) as executor:
+            if management_command.verbosity >= 1:
+                management_command.print(
+                    'Waiting for agents on {ADDRESS}:{PORT}'.format(
+                        ADDRESS=options['listen_address'],
+                        PORT=options['listen_port']))
+            futures = []
+            for name in options['discovery']:
+                future = self.launch_discovery(
+                    management_command=management_command,
+                    name=name,
+                    options=options,
+                    destinations=destinations,
+                    consumers=consumers,
+                    executor=executor)
+                if future:
+                    futures.append(future)
+            for future in futures:
+                # Raise any error from the discoveries
+                future.result()
+
+    def is_loopback(self,
+                    address: str) -> bool:
+        """
+        Check if the listening address is reachable only from this host
+        :param address: listening address
+        :return: True if the address is a loopback address
+        """
+        if address == 'localhost':
+            return True
+        try:
+            return ipaddress.ip_address(address).is_loopback
+        except ValueError:
+            # Host name or any address
+            return False
+
+    def launch_discovery(self,
+                         management_command: DiscoveryBaseCommand,
+                         name: str,
+                         options: dict,
+                         destinations: list,
+                         consumers: RemoteConsumers,
+                         executor: concurrent.futures.Executor
+                         ) -> concurrent.futures.Future:
+        """
+        Launch a discovery served to the remote agents
+        :param management_command: command used to print and get options
+        :param name: Discovery name to launch
+        :param options: general options from command line
+        :param destinations: list of manual destinations
+        :param consumers: remote consumers serving the agents
+        :param executor: executor for the running discoveries
+        :return: future for the running discovery or None if not available
+        """
+        discovery = Discovery.objects.filter(name=name).first()
+        if not discovery:
+            # Not existing Discovery
+            if management_command.verbosity >= 1:
+                management_command.print(
+                    'No discovery named "{NAME}"'.format(NAME=name))
+        elif not discovery.enabled and not options['disabled']:
+            # Disabled discovery
+            if management_command.verbosity >= 1:
+                management_command.print(
+                    'The discovery "{NAME}" is disabled'.format(NAME=name))
+        else:
+            # Find the tool for the requested discovery
+            for command in discovery_tool_commands:
+                if command.tool_name == discovery.scanner.tool:
+                    if not issubclass(command, DiscoveryBaseCommand):
+                        # The hosts discoveries need the local hosts
+                        if management_command.verbosity >= 1:
+                            management_command.print(
+                                'The discovery "{NAME}" cannot be '
+                                'executed by the agents'.format(NAME=name))
+                        break
+                    return executor.submit(
+                        command().do_discovery_thread,
+                        discovery=discovery,
+                        options=management_command.get_options(
+                            general_options={**options},
+                            scanner_options=discovery.scanner.options,
+                            discovery_options=discovery.options),
+                        destinations=destinations,
+                        consumers=consumers)
+        return None
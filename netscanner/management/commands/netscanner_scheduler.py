@@ -0,0 +1,291 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import argparse
+import concurrent.futures
+import datetime
+import heapq
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.translation import pgettext_lazy
+
+from netscanner.management.discovery_base_command import DiscoveryBaseCommand
+from netscanner.models import Discovery
+from netscanner.utils.consumers import Consumers
+
+from . import discovery_tool_commands
+from .sequence import Command as SequenceCommand
+
+
+class Command(BaseCommand):
+    help = 'Discoveries and sequences scheduler'
+
+    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
+        BaseCommand.add_arguments(self, parser)
+        parser.add_argument('--max-jobs',
+                            action='store',
+                            type=int,
+                            default=4,
+                            help=pgettext_lazy(
+                                'Scanner Scheduler',
+                                'Number of discoveries to launch at once'))
+        parser.add_argument('--reload',
+                            action='store',
+                            type=int,
+                            default=60,
+                            help=pgettext_lazy(
+                                'Scanner Scheduler',
+                                'Reload the discoveries after the number '
+                                'of seconds'))
+        parser.add_argument('--failing',
+                            action='store_true',
+                            default=False,
+                            help=pgettext_lazy(
+                                'Scanner Scheduler',
+                                'Save results also for failing hosts'))
+        parser.add_argument('--max-tasks',
+                            action='store',
+                            type=int,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner Scheduler',
+                                'Replace each worker process after the '
+                                'number of tasks (0 for never)'))
+        parser.add_argument('--max-rate',
+                            action='store',
+                            type=int,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner Scheduler',
+                                'Maximum probes per second for the whole '
+                                'command (0 for unlimited)'))
+        parser.add_argument('--task-timeout',
+                            action='store',
+                            type=float,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner Scheduler',
+                                'Interrupt each probe after the number of '
+                                'seconds (0 for never)'))
+        parser.add_argument('--max-workers',
+                            action='store',
+                            type=int,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner Scheduler',
+                                'Maximum worker processes shared by every '
+                                'discovery (0 for unlimited)'))
+        parser.add_argument('--max-probes',
+                            action='store',
+                            type=int,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner Scheduler',
+                                'Maximum probes at once of the threads and '
+                                'async executors, shared by every discovery '
+                                '(0 for unlimited)'))
+
+    def handle(self, *args, **options) -> None:
+        management_command = DiscoveryBaseCommand()
+        # Set verbosity level
+        management_command.verbosity = options['verbosity']
+        # Stop the scheduler also using SIGTERM
+        signal.signal(signal.SIGTERM, self.terminate)
+        # Running discoveries by their primary key
+        running = {}
+        queue = []
+        reload_time = 0
+        # Share the same consumers pool for every discovery
+        with Consumers(max_tasks=options['max_tasks'],
+                       max_consumers=options['max_workers'],
+                       max_probes=options['max_probes']) as consumers, \
+                concurrent.futures.ThreadPoolExecutor(
+                    max_workers=max(options['max_jobs'], 1)) as executor:
+            try:
+                while True:
+                    # Reload the discoveries queue periodically
+                    if time.monotonic() >= reload_time:
+                        queue = self.get_queue()
+                        reload_time = time.monotonic() + options['reload']
+                    # Reschedule the completed discoveries
+                    for discovery_id, future in list(running.items()):
+                        if future.done():
+                            del running[discovery_id]
+                            self.complete_discovery(
+                                management_command=management_command,
+                                queue=queue,
+                                discovery_id=discovery_id,
+                                future=future)
+                    # Launch the due discoveries
+                    now = timezone.now()
+                    while (queue and queue[0][0] <= now and
+                           len(running) < options['max_jobs']):
+                        _, discovery_id = heapq.heappop(queue)
+                        if discovery_id in running:
+                            # Skip any discovery still in progress
+                            if management_command.verbosity >= 2:
+                                management_command.print(
+                                    'Discovery {ID} still in progress, '
+                                    'skipping'.format(ID=discovery_id))
+                            continue
+                        future = self.launch_discovery(
+                            management_command=management_command,
+                            discovery_id=discovery_id,
+                            options=options,
+                            consumers=consumers,
+                            executor=executor)
+                        if future:
+                            running[discovery_id] = future
+                    # Wait for the next due discovery or any completed one
+                    timeout = reload_time - time.monotonic()
+                    if queue and len(running) < options['max_jobs']:
+                        timeout = min(timeout,
+                                      (queue[0][0] - now).total_seconds())
+                    if running:
+                        concurrent.futures.wait(
+                            running.values(),
+                            timeout=max(timeout, 0),
+                            return_when=concurrent.futures.FIRST_COMPLETED)
+                    else:
+                        time.sleep(max(timeout, 0))
+            except KeyboardInterrupt:
+                if management_command.verbosity >= 1:
+                    management_command.print(
+                        'Waiting for {COUNT} running discoveries'.format(
+                            COUNT=len(running)))
+
+    def terminate(self, signum, frame) -> None:
+        """
+        Stop the scheduler loop after a termination signal
+        """
+        raise KeyboardInterrupt()
+
+    def get_queue(self) -> list:
+        """
+        Get the priority queue of the enabled discoveries and sequences
+        by their next scan time (last scan + interval in minutes)
+        :return: heap list of tuples with next scan time and discovery id
+        """
+        tools = [command.tool_name for command in discovery_tool_commands]
+        queue = []
+        for discovery in Discovery.objects.filter(
+                enabled=True).select_related('scanner'):
+            if (SequenceCommand.is_sequence(discovery) or
+                    discovery.scanner.tool in tools):
+                queue.append((self.get_next_scan(discovery), discovery.pk))
+        heapq.heapify(queue)
+        return queue
+
+    def get_next_scan(self,
+                      discovery: Discovery) -> datetime.datetime:
+        """
+        Get the next scan time for a discovery
+        :param discovery: Discovery object to schedule
+        :return: datetime of the next scan
+        """
+        if discovery.last_scan:
+            return discovery.last_scan + datetime.timedelta(
+                minutes=discovery.interval)
+        else:
+            # Never scanned discovery
+            return timezone.now()
+
+    def launch_discovery(self,
+                         management_command: DiscoveryBaseCommand,
+                         discovery_id: int,
+                         options: dict,
+                         consumers: Consumers,
+                         executor: concurrent.futures.Executor
+                         ) -> concurrent.futures.Future:
+        """
+        Launch a discovery from the executor threads
+        :param management_command: command used to print and get options
+        :param discovery_id: Discovery primary key to launch
+        :param options: general options from command line
+        :param consumers: consumers pool shared by every discovery
+        :param executor: executor for the running discoveries
+        :return: future for the running discovery or None if not available
+        """
+        discovery = Discovery.objects.filter(pk=discovery_id,
+                                             enabled=True).first()
+        if discovery:
+            if SequenceCommand.is_sequence(discovery):
+                # Execute every operation of the sequence
+                if management_command.verbosity >= 1:
+                    management_command.print(
+                        'Executing sequence {DISCOVERY}'.format(
+                            DISCOVERY=discovery.name))
+                return executor.submit(
+                    SequenceCommand().do_sequence_thread,
+                    management_command=management_command,
+                    sequence=discovery,
+                    options={**options},
+                    consumers=consumers)
+            # Find the tool for the requested discovery
+            for command in discovery_tool_commands:
+                if command.tool_name == discovery.scanner.tool:
+                    if management_command.verbosity >= 1:
+                        management_command.print(
+                            'Executing discovery {DISCOVERY}'.format(
+                                DISCOVERY=discovery.name))
+                    return executor.submit(
+                        command().do_discovery_thread,
+                        discovery=discovery,
+                        options=management_command.get_options(
+                            general_options={**options},
+                            scanner_options=discovery.scanner.options,
+                            discovery_options=discovery.options),
+                        destinations=None,
+                        consumers=consumers)
+        return None
+
+    def complete_discovery(self,
+                           management_command: DiscoveryBaseCommand,
+                           queue: list,
+                           discovery_id: int,
+                           future: concurrent.futures.Future) -> None:
+        """
+        Add a completed discovery to the queue for its next scan
+        :param management_command: command used to print and get options
+        :param queue: heap list of the scheduled discoveries
+        :param discovery_id: Discovery primary key completed
+        :param future: future for the completed discovery
+        :return: None
+        """
+        error = future.exception()
+        if error and management_command.verbosity >= 1:
+            management_command.print(
+                'Discovery {ID} failed: {ERROR}'.format(ID=discovery_id,
+                                                        ERROR=error))
+        discovery = Discovery.objects.filter(pk=discovery_id,
+                                             enabled=True).first()
+        if discovery:
+            # Remove any previous schedule for the discovery
+            queue[:] = [item for item in queue if item[1] != discovery_id]
+            heapq.heapify(queue)
+            next_scan = self.get_next_scan(discovery)
+            if error:
+                # Retry a failed discovery only after its interval
+                next_scan = timezone.now() + datetime.timedelta(
+                    minutes=discovery.interval)
+            heapq.heappush(queue, (next_scan, discovery_id))
@@ -22,7 +22,7 @@ from django.utils import timezone
 
 from netscanner.management.discovery_base_command import DiscoveryBaseCommand
 from netscanner.models import Discovery, Host
-from netscanner.tools.arp_request import ARPRequest
+from netscanner.tools.arp_request import ARPRequest, ARPSweep
 
 
 class Command(DiscoveryBaseCommand):
@@ -38,6 +38,11 @@ class Command(DiscoveryBaseCommand):
         :param options: dictionary containing the options
         :return:
         """
+        if options.get('sweep', False):
+            # Send the requests for many addresses at once
+            return ARPSweep(verbosity=options.get('verbosity', 1),
+                            timeout=discovery.timeout,
+                            interval=options.get('interval', 0))
         return ARPRequest(verbosity=options.get('verbosity', 1),
                           timeout=discovery.timeout)
 
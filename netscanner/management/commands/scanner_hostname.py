@@ -18,11 +18,16 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 ##
 
+from django.core.management.base import CommandError
 from django.utils import timezone
 
 from netscanner.management.discovery_base_command import DiscoveryBaseCommand
 from netscanner.models import Discovery, Domain, Host
 from netscanner.tools.hostname import Hostname
+from netscanner.utils.dns_resolver import (DNSCache,
+                                           PTRResolver,
+                                           get_nameserver,
+                                           get_nameservers)
 
 
 class Command(DiscoveryBaseCommand):
@@ -38,7 +43,25 @@ class Command(DiscoveryBaseCommand):
         :param options: dictionary containing the options
         :return:
         """
-        return Hostname(verbosity=options.get('verbosity', 1))
+        resolver = None
+        if options.get('resolver', 'system') == 'dns':
+            nameservers = ([get_nameserver(nameserver)
+                            for nameserver in options['nameservers']]
+                           if 'nameservers' in options
+                           else get_nameservers())
+            if not nameservers:
+                raise CommandError(
+                    'No nameservers available for the discovery '
+                    '"{NAME}"'.format(NAME=discovery.name))
+            # Resolve the names using asynchronous PTR queries
+            resolver = PTRResolver(
+                nameservers=nameservers,
+                timeout=options.get('dns_timeout', discovery.timeout or 1),
+                retries=options.get('dns_retries', 2),
+                cache=DNSCache(path=options.get('dns_cache')),
+                negative_ttl=options.get('negative_ttl', 300))
+        return Hostname(verbosity=options.get('verbosity', 1),
+                        resolver=resolver)
 
     def process_results(self,
                         discovery: Discovery,
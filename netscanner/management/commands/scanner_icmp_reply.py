@@ -23,6 +23,7 @@ from django.utils import timezone
 from netscanner.management.discovery_base_command import DiscoveryBaseCommand
 from netscanner.models import Discovery, Host
 from netscanner.tools.icmp_reply import ICMPReply
+from netscanner.tools.icmp_sweep import ICMPSweep, SOCKET_AUTO
 
 
 class Command(DiscoveryBaseCommand):
@@ -38,6 +39,16 @@ class Command(DiscoveryBaseCommand):
         :param options: dictionary containing the options
         :return:
         """
+        if options.get('sweep', False):
+            # Send the requests for many addresses at once
+            return ICMPSweep(verbosity=options.get('verbosity', 1),
+                             timeout=discovery.timeout,
+                             interval=options.get('interval', 0),
+                             socket_type=options.get('socket', SOCKET_AUTO),
+                             count=options.get('count', 1),
+                             round_interval=options.get('round_interval',
+                                                        0.1),
+                             max_loss=options.get('max_loss', 100))
         return ICMPReply(verbosity=options.get('verbosity', 1),
                          timeout=discovery.timeout)
 
@@ -22,7 +22,9 @@ from django.utils import timezone
 
 from netscanner.management.discovery_base_command import DiscoveryBaseCommand
 from netscanner.models import Discovery, Host
-from netscanner.tools.netbios_smb_info import NetBIOSSMBInfo, PROTOCOL_NETBIOS
+from netscanner.tools.netbios_smb_info import (NetBIOSSMBInfo,
+                                               NetBIOSSweep,
+                                               PROTOCOL_NETBIOS)
 
 
 class Command(DiscoveryBaseCommand):
@@ -38,6 +40,15 @@ class Command(DiscoveryBaseCommand):
         :param options: dictionary containing the options
         :return:
         """
+        if options.get('sweep', False):
+            # Send the name requests for many addresses at once
+            return NetBIOSSweep(verbosity=options.get('verbosity', 1),
+                                timeout=discovery.timeout,
+                                port=options.get('port', 139),
+                                port_names=options.get('port_names', 137),
+                                interval=options.get('interval', 0),
+                                max_connections=options.get(
+                                    'concurrency', discovery.workers))
         return NetBIOSSMBInfo(verbosity=options.get('verbosity', 1),
                               timeout=discovery.timeout,
                               protocol=PROTOCOL_NETBIOS,
@@ -43,8 +43,10 @@ class Command(DiscoveryBaseCommand):
         :param options: dictionary containing the options
         :return:
         """
-        snmp_configurations = SNMPConfiguration.objects.all().exclude(
-            device_model__isnull=True).exclude(autodetect__isnull=True)
+        snmp_configurations = (SNMPConfiguration.objects
+                               .exclude(device_model__isnull=True)
+                               .exclude(autodetect__isnull=True)
+                               .select_related('autodetect', 'device_model'))
         initial_configuration = (SNMPConfiguration.objects.get(
                                  name=options['initial_configuration'])
                                  .snmpconfigurationvalue_set.all()
@@ -69,7 +71,8 @@ class Command(DiscoveryBaseCommand):
                                  skip_existing=options.get('skip_existing',
                                                            False),
                                  configurations=snmp_configurations,
-                                 initial_configuration=initial_configuration)
+                                 initial_configuration=initial_configuration,
+                                 max_oids=options.get('max_oids', 32))
 
     def process_results(self,
                         discovery: Discovery,
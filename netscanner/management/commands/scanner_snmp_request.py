@@ -60,7 +60,8 @@ class Command(DiscoveryBaseCommand):
                                retries=options.get('retries', 0),
                                values=[snmp_configuration_value.snmp_value
                                        for snmp_configuration_value
-                                       in snmp_configuration_values])
+                                       in snmp_configuration_values],
+                               max_oids=options.get('max_oids', 32))
 
     def process_results(self,
                         discovery: Discovery,
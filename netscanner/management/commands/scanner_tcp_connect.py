@@ -23,6 +23,7 @@ from django.utils import timezone
 from netscanner.management.discovery_base_command import DiscoveryBaseCommand
 from netscanner.models import Discovery, Host
 from netscanner.tools.tcp_connect import TCPConnect
+from netscanner.tools.tcp_ports import TCPPortsSweep, get_ports
 
 
 class Command(DiscoveryBaseCommand):
@@ -38,6 +39,13 @@ class Command(DiscoveryBaseCommand):
         :param options: dictionary containing the options
         :return:
         """
+        if 'ports' in options:
+            # Connect to many ports of many addresses at once
+            return TCPPortsSweep(
+                verbosity=options.get('verbosity', 1),
+                timeout=discovery.timeout,
+                ports=get_ports(options['ports']),
+                max_connections=options.get('max_connections', 1024))
         return TCPConnect(verbosity=options.get('verbosity', 1),
                           timeout=discovery.timeout,
                           portnr=options.get('port', 80))
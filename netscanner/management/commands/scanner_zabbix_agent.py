@@ -41,7 +41,9 @@ class Command(DiscoveryBaseCommand):
         return ZabbixAgent(verbosity=options.get('verbosity', 1),
                            timeout=discovery.timeout,
                            port=options.get('port', 10050),
-                           items=options['items'])
+                           items=options['items'],
+                           max_connections=options.get('max_connections',
+                                                       3))
 
     def process_results(self,
                         discovery: Discovery,
@@ -19,16 +19,20 @@
 ##
 
 import argparse
+import concurrent.futures
 import json
 import time
+import uuid
 
-from django.core.management.base import BaseCommand
-from django.db import models
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models
 from django.utils import timezone
 from django.utils.translation import pgettext_lazy
 
 from netscanner.management.discovery_base_command import DiscoveryBaseCommand
 from netscanner.models import Discovery
+from netscanner.utils.address_stream import AddressStream
+from netscanner.utils.consumers import Consumers
 
 from . import discovery_tool_commands
 
@@ -59,6 +63,38 @@ class Command(BaseCommand):
                                 'Scanner Sequence',
                                 'Execute the discovery only to the selected '
                                 'destinations'))
+        parser.add_argument('--max-tasks',
+                            action='store',
+                            type=int,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner Sequence',
+                                'Replace each worker process after the '
+                                'number of tasks (0 for never)'))
+        parser.add_argument('--max-rate',
+                            action='store',
+                            type=int,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner Sequence',
+                                'Maximum probes per second for the whole '
+                                'command (0 for unlimited)'))
+        parser.add_argument('--task-timeout',
+                            action='store',
+                            type=float,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner Sequence',
+                                'Interrupt each probe after the number of '
+                                'seconds (0 for never)'))
+        parser.add_argument('--resume',
+                            action='store_true',
+                            default=False,
+                            help=pgettext_lazy(
+                                'Scanner Sequence',
+                                'Continue the last interrupted run, skipping '
+                                'the already completed addresses (not '
+                                'available for sequences with depends)'))
 
     def handle(self, *args, **options) -> None:
         management_command = DiscoveryBaseCommand()
@@ -77,44 +113,270 @@ class Command(BaseCommand):
             destinations = (options['destinations'].split(' ')
                             if options['destinations']
                             else None)
-            operations = json.loads(sequence.options)
             # Execute only enabled discoveries or any if disabled is passed
             if sequence.enabled or options['disabled']:
-                # Find the tool for the requested discovery
-                for operation in operations:
-                    discovery = Discovery.objects.get(
-                        name=operation['discovery'])
-                    for command in discovery_tool_commands:
-                        if command.tool_name == discovery.scanner.tool:
-                            if management_command.verbosity >= 1:
-                                management_command.print(
-                                    'Executing discovery {DISCOVERY}'.format(
-                                        DISCOVERY=discovery.name))
-                            # Execute discovery for the requested tool
-                            command().do_discovery(
-                                discovery=discovery,
-                                options=management_command.get_options(
-                                    general_options={**options},
-                                    scanner_options=discovery.scanner.options,
-                                    discovery_options=discovery.options),
-                                destinations=destinations)
-                            # Sleep after the discovery
-                            if operation['wait'] > 0:
-                                if management_command.verbosity >= 1:
-                                    management_command.print(
-                                        'Sleeping for {WAIT} seconds '
-                                        'after discovery {DISCOVERY}'.format(
-                                            WAIT=operation['wait'],
-                                            DISCOVERY=discovery.name))
-                                time.sleep(operation['wait'])
-                            break
-                # Update last scan discovery
-                sequence = Discovery.objects.get(name=options['discovery'])
-                sequence.last_scan = timezone.now()
-                sequence.save()
+                # Share the same consumers pool for every discovery
+                with Consumers(max_tasks=options['max_tasks']) as consumers:
+                    self.do_sequence(management_command=management_command,
+                                     sequence=sequence,
+                                     options=options,
+                                     destinations=destinations,
+                                     consumers=consumers)
             else:
                 # Disabled discovery
                 if management_command.verbosity >= 1:
                     management_command.print(
                         'The discovery "{NAME}" is disabled'.format(
                             NAME=sequence.name))
+
+    @staticmethod
+    def is_sequence(discovery: Discovery) -> bool:
+        """
+        Check if a discovery is a sequence, whose options are the list of
+        the operations to execute instead of the tool options
+        :param discovery: Discovery object to check
+        :return: True if the discovery options are a list of operations
+        """
+        try:
+            operations = json.loads(discovery.options)
+        except ValueError:
+            return False
+        return (isinstance(operations, list) and
+                all(isinstance(operation, dict) and 'discovery' in operation
+                    for operation in operations))
+
+    def do_sequence(self,
+                    management_command: DiscoveryBaseCommand,
+                    sequence: Discovery,
+                    options: dict,
+                    destinations: list,
+                    consumers: Consumers,
+                    close_on_error: bool = True) -> None:
+        """
+        Execute every operation of a sequence
+        :param management_command: command used to print and get options
+        :param sequence: Discovery object with the operations to execute
+        :param options: general options from command line
+        :param destinations: list of manual destinations
+        :param consumers: consumers pool shared by every operation
+        :param close_on_error: close the consumers pool to stop the running
+                               operations if any operation fails
+        :return: None
+        """
+        operations = json.loads(sequence.options)
+        pipeline = any('depends' in operation
+                       for operation in operations)
+        if pipeline and options.get('resume', False):
+            # The completed addresses of an operation would not be
+            # passed again to the operations depending on it
+            raise CommandError(
+                'The sequence "{NAME}" passes the addresses between '
+                'its operations and cannot be resumed'.format(
+                    NAME=sequence.name))
+        # Every operation shares the run id of the sequence, to
+        # resume only the operations of the same run
+        if not (options.get('resume', False) and sequence.run_id):
+            sequence.run_id = uuid.uuid4().hex
+            sequence.save(update_fields=['run_id'])
+        options = dict(options, run_id=sequence.run_id)
+        if pipeline:
+            # Pass the found addresses between the operations
+            self.do_pipeline(management_command=management_command,
+                             operations=operations,
+                             options=options,
+                             destinations=destinations,
+                             consumers=consumers,
+                             close_on_error=close_on_error)
+        else:
+            for operation in operations:
+                self.do_operation(management_command=management_command,
+                                  operation=operation,
+                                  options=options,
+                                  destinations=destinations,
+                                  consumers=consumers)
+        # Update last scan discovery
+        sequence = Discovery.objects.get(pk=sequence.pk)
+        sequence.last_scan = timezone.now()
+        # The run was finished, a later resume starts a new run
+        sequence.run_id = ''
+        sequence.save()
+
+    def do_sequence_thread(self,
+                           management_command: DiscoveryBaseCommand,
+                           sequence: Discovery,
+                           options: dict,
+                           consumers: Consumers) -> None:
+        """
+        Execute a sequence from a separate thread, leaving the shared
+        consumers pool open if any operation fails
+        :param management_command: command used to print and get options
+        :param sequence: Discovery object with the operations to execute
+        :param options: general options from command line
+        :param consumers: consumers pool shared by every discovery
+        :return: None
+        """
+        try:
+            self.do_sequence(management_command=management_command,
+                             sequence=sequence,
+                             options=options,
+                             destinations=None,
+                             consumers=consumers,
+                             close_on_error=False)
+        finally:
+            # Each thread uses its own database connection
+            connection.close()
+
+    def do_operation(self,
+                     management_command: DiscoveryBaseCommand,
+                     operation: dict,
+                     options: dict,
+                     destinations: list,
+                     consumers: Consumers) -> None:
+        """
+        Execute a single operation of the sequence
+        :param management_command: command used to print and get options
+        :param operation: dictionary with the operation to execute
+        :param options: general options from command line
+        :param destinations: list of manual destinations
+        :param consumers: consumers pool shared by every operation
+        :return: None
+        """
+        discovery = Discovery.objects.get(name=operation['discovery'])
+        # Find the tool for the requested discovery
+        for command in discovery_tool_commands:
+            if command.tool_name == discovery.scanner.tool:
+                if management_command.verbosity >= 1:
+                    management_command.print(
+                        'Executing discovery {DISCOVERY}'.format(
+                            DISCOVERY=discovery.name))
+                # Execute discovery for the requested tool
+                command().do_discovery(
+                    discovery=discovery,
+                    options=management_command.get_options(
+                        general_options={**options},
+                        scanner_options=discovery.scanner.options,
+                        discovery_options=discovery.options),
+                    destinations=destinations,
+                    consumers=consumers)
+                # Sleep after the discovery
+                if operation['wait'] > 0:
+                    if management_command.verbosity >= 1:
+                        management_command.print(
+                            'Sleeping for {WAIT} seconds '
+                            'after discovery {DISCOVERY}'.format(
+                                WAIT=operation['wait'],
+                                DISCOVERY=discovery.name))
+                    time.sleep(operation['wait'])
+                break
+
+    def do_pipeline(self,
+                    management_command: DiscoveryBaseCommand,
+                    operations: list,
+                    options: dict,
+                    destinations: list,
+                    consumers: Consumers,
+                    close_on_error: bool = True) -> None:
+        """
+        Execute every operation of the sequence at the same time, passing
+        the successful addresses of each operation to the operations
+        depending on it as soon as they are found.
+        Any wait after the operations is not allowed, as every operation
+        is running at the same time
+        :param management_command: command used to print and get options
+        :param operations: list of operations to execute
+        :param options: general options from command line
+        :param destinations: list of manual destinations
+        :param consumers: consumers pool shared by every operation
+        :param close_on_error: close the consumers pool to stop the running
+                               operations if any operation fails
+        :return: None
+        """
+        inputs = {}
+        outputs = {}
+        for operation in operations:
+            name = operation['discovery']
+            depends = operation.get('depends')
+            if operation.get('wait', 0) > 0:
+                # Every operation runs at the same time, there is no end of
+                # the previous operation to wait for
+                raise CommandError(
+                    'The discovery {DISCOVERY} cannot wait in a sequence '
+                    'with depends'.format(DISCOVERY=name))
+            if depends:
+                if depends not in outputs:
+                    # The dependency must be an earlier operation
+                    raise CommandError(
+                        'The discovery {DISCOVERY} depends on {DEPENDS} '
+                        'which is not an earlier operation'.format(
+                            DISCOVERY=name,
+                            DEPENDS=depends))
+                inputs[name] = AddressStream()
+                outputs[depends].append(inputs[name])
+            outputs[name] = []
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=len(operations)) as executor:
+            futures = [executor.submit(
+                self.do_stage,
+                management_command=management_command,
+                operation=operation,
+                options=options,
+                destinations=inputs.get(operation['discovery'],
+                                        destinations),
+                consumers=consumers,
+                streams=outputs[operation['discovery']])
+                for operation in operations]
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    # Raise any exception from the operations
+                    future.result()
+            except BaseException:
+                if close_on_error:
+                    # Stop the running operations before waiting for them
+                    consumers.close()
+                raise
+
+    def do_stage(self,
+                 management_command: DiscoveryBaseCommand,
+                 operation: dict,
+                 options: dict,
+                 destinations,
+                 consumers: Consumers,
+                 streams: list) -> None:
+        """
+        Execute a single operation of a pipelined sequence
+        :param management_command: command used to print and get options
+        :param operation: dictionary with the operation to execute
+        :param options: general options from command line
+        :param destinations: list of manual destinations or AddressStream
+                             with the addresses found by another operation
+        :param consumers: consumers pool shared by every operation
+        :param streams: list of AddressStream to pass the successful
+                        addresses to the depending operations
+        :return: None
+        """
+        try:
+            discovery = Discovery.objects.get(name=operation['discovery'])
+            # Find the tool for the requested discovery
+            for command in discovery_tool_commands:
+                if command.tool_name == discovery.scanner.tool:
+                    if management_command.verbosity >= 1:
+                        management_command.print(
+                            'Executing discovery {DISCOVERY}'.format(
+                                DISCOVERY=discovery.name))
+                    # Execute discovery for the requested tool
+                    command().do_discovery(
+                        discovery=discovery,
+                        options=management_command.get_options(
+                            general_options={**options},
+                            scanner_options=discovery.scanner.options,
+                            discovery_options=discovery.options),
+                        destinations=destinations,
+                        consumers=consumers,
+                        streams=streams)
+                    break
+        finally:
+            # Let the depending operations complete
+            for stream in streams:
+                stream.close()
+            # Close the thread database connection
+            connection.close()
@@ -18,20 +18,23 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 ##
 
-import argparse
 import datetime
 import json
-import multiprocessing
 
 from django.core.management.base import BaseCommand
-from django.db import transaction
 from django.utils import timezone
 
+from netscanner.management.discovery_mixin import DiscoveryMixin
 from netscanner.models import Discovery, DiscoveryResult
-from netscanner.utils.consumers import Consumers
+from netscanner.utils.address_chunks import (address_to_numeric,
+                                             get_address_chunks,
+                                             get_chunk_size)
+from netscanner.utils.address_stream import AddressStream
+from netscanner.utils.batches import get_batches
+from netscanner.utils.discovery_progress import DiscoveryProgress
 
 
-class DiscoveryBaseCommand(BaseCommand):
+class DiscoveryBaseCommand(DiscoveryMixin, BaseCommand):
     def __init__(self):
         """
         Discovery base command for all management discovery commands
@@ -44,21 +47,6 @@ class DiscoveryBaseCommand(BaseCommand):
         # Verbosity level for printing results
         self.verbosity = 0
 
-    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
-        BaseCommand.add_arguments(self, parser)
-
-    def handle(self, *args, **options) -> None:
-        discoveries = Discovery.objects.filter(scanner__tool=self.tool_name,
-                                               enabled=True)
-        for discovery in discoveries:
-            # Launch a discovery
-            self.do_discovery(discovery=discovery,
-                              options=self.get_options(
-                                  general_options={**options},
-                                  scanner_options=discovery.scanner.options,
-                                  discovery_options=discovery.options),
-                              destinations=[])
-
     def get_options(self,
                     general_options: dict,
                     scanner_options: dict,
@@ -85,69 +73,77 @@ class DiscoveryBaseCommand(BaseCommand):
                 del result[reserved_options]
         return result
 
-    def do_discovery(self,
-                     discovery: Discovery,
-                     options: dict,
-                     destinations: list) -> None:
+    def get_tasks(self,
+                  discovery: Discovery,
+                  options: dict,
+                  destinations: list,
+                  progress: DiscoveryProgress):
         """
-        Launch a discovery
+        Get the chunks of addresses to discover, skipping the excluded and
+        the completed addresses
         :param discovery: Discovery object to launch
         :param options: discovery options
-        :param destinations: list of manual destinations
-        :return:
+        :param destinations: list of manual destinations or AddressStream
+                             with the addresses from another discovery
+        :param progress: DiscoveryProgress to skip the completed addresses
+        :return: iterable of chunks of addresses or None if no address is
+                 available yet
         """
-        # Save verbosity level
-        self.verbosity = options['verbosity']
-        # Prepare addresses to discover
         excluded_addresses = options.get('excluded', [])
-        tasks = multiprocessing.JoinableQueue()
-        # Choose destinations group (manual group or Discovery subnet)
-        addresses = (destinations
-                     if destinations
-                     else discovery.subnetv4.get_ip_list())
-        for address in addresses:
-            # Process only not excluded addresses
-            if address not in excluded_addresses:
-                # Add address to the processing queue
-                tasks.put(address)
-            elif self.verbosity >= 3:
-                # Excluded address
-                self.print('Host {ADDRESS} excluded, skipping'.format(
-                    ADDRESS=address))
-        # Prepare consumers to execute the network discovery
-        consumers = Consumers(tasks_queue=tasks)
-        # Instance the scanner tool using the discovery options
-        tool = self.instance_scanner_tool(discovery=discovery,
-                                          options=options)
-        if tool:
-            # Print results if verbosity >= 1
-            if self.verbosity >= 1:
-                self.print('Discovery "{DISCOVERY}" - '
-                           'workers: {WORKERS}, '
-                           'timeout: {TIMEOUT}, '
-                           'options: {OPTIONS}'.format(
-                                DISCOVERY=discovery.name,
-                                WORKERS=discovery.workers,
-                                TIMEOUT=discovery.timeout,
-                                OPTIONS=options))
-            consumers.execute(runners=discovery.workers,
-                              action=tool.execute)
-            # Process the results in a single operation on the DB side
-            with transaction.atomic():
-                # Exclude invalid items from their status
-                # If the failing option was passed, include any response
-                consumers_list = consumers.results_as_list()
-                results = (list(filter(lambda item: item[1]['status'],
-                                      consumers_list))
-                           if not options['failing'] else consumers_list)
-                # Process the results to update the models, if needed
-                self.process_results(discovery=discovery,
-                                     options=options,
-                                     results=results)
-                # Update last scan discovery
-                discovery = Discovery.objects.get(pk=discovery.pk)
-                discovery.last_scan = timezone.now()
-                discovery.save()
+        chunk_size = options.get('chunk_size', 256)
+        # Choose destinations group (addresses from another discovery,
+        # manual group or Discovery subnet)
+        if isinstance(destinations, AddressStream):
+            # Process the addresses while they are found, skipping the
+            # excluded and the completed addresses
+            tasks = ([address
+                      for address in chunk
+                      if address not in excluded_addresses and
+                      not progress.is_completed(address)]
+                     if chunk is not None else None
+                     for chunk in destinations.get_chunks(size=chunk_size))
+        elif destinations:
+            addresses = []
+            for address in destinations:
+                # Process only not excluded addresses
+                if address in excluded_addresses:
+                    if self.verbosity >= 3:
+                        # Excluded address
+                        self.print('Host {ADDRESS} excluded, '
+                                   'skipping'.format(ADDRESS=address))
+                elif not progress.is_completed(address):
+                    # Add address to the processing list
+                    addresses.append(address)
+            # Split the manual destinations in chunks of addresses
+            tasks = get_batches(items=addresses,
+                                size=get_chunk_size(
+                                    count=len(addresses),
+                                    runners=discovery.workers,
+                                    maximum=chunk_size))
+        else:
+            ranges = discovery.subnetv4.get_ip_ranges()
+            excluded = set()
+            for address in excluded_addresses:
+                value = address_to_numeric(address)
+                # Skip only the excluded addresses in the subnet
+                if any(start <= value <= end for start, end in ranges):
+                    excluded.add(value)
+                    if self.verbosity >= 3:
+                        # Excluded address
+                        self.print('Host {ADDRESS} excluded, '
+                                   'skipping'.format(ADDRESS=address))
+            # Skip the addresses completed before resuming
+            excluded.update(progress.completed)
+            # Split the subnet in ranges of numeric addresses, which will be
+            # expanded by the consumers
+            tasks = get_address_chunks(
+                ranges=ranges,
+                excluded=excluded,
+                chunk_size=get_chunk_size(
+                    count=sum(end - start + 1 for start, end in ranges),
+                    runners=discovery.workers,
+                    maximum=chunk_size))
+        return tasks
 
     def instance_scanner_tool(self,
                               discovery: Discovery,
@@ -185,7 +181,8 @@ class DiscoveryBaseCommand(BaseCommand):
                             int(value.timestamp()))
                     elif isinstance(value, list):
                         # Convert lists to strings
-                        serializable_values[key] = ', '.join(value)
+                        serializable_values[key] = ', '.join(
+                            str(item) for item in value)
                     else:
                         # Raw value
                         serializable_values[key] = value
@@ -0,0 +1,422 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import argparse
+import concurrent.futures
+import json
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.translation import pgettext_lazy
+
+from netscanner.models import Discovery
+from netscanner.utils.address_stream import get_items
+from netscanner.utils.async_consumers import AsyncConsumers
+from netscanner.utils.batches import get_batches
+from netscanner.utils.concurrency import ConcurrencyController
+from netscanner.utils.consumers import Consumers
+from netscanner.utils.discovery_progress import DiscoveryProgress
+from netscanner.utils.executors import (EXECUTOR_ASYNC,
+                                        EXECUTOR_PROCESS,
+                                        EXECUTOR_THREAD,
+                                        get_executor)
+from netscanner.utils.remote_consumers import RemoteConsumers
+from netscanner.utils.sweeps import SweepsJob, get_sweeps
+from netscanner.utils.thread_consumers import ThreadConsumers
+
+
+class DiscoveryMixin(object):
+    """
+    Shared methods to launch the discoveries for the discovery and the
+    host management commands, which get their items to process from
+    get_tasks and get_item_address
+    """
+
+    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
+        super().add_arguments(parser)
+        parser.add_argument('--max-tasks',
+                            action='store',
+                            type=int,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner',
+                                'Replace each worker process after the '
+                                'number of tasks (0 for never)'))
+        parser.add_argument('--max-rate',
+                            action='store',
+                            type=int,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner',
+                                'Maximum probes per second for the whole '
+                                'command (0 for unlimited)'))
+        parser.add_argument('--task-timeout',
+                            action='store',
+                            type=float,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner',
+                                'Interrupt each probe after the number of '
+                                'seconds (0 for never)'))
+        parser.add_argument('--parallel',
+                            action='store',
+                            type=int,
+                            default=1,
+                            help=pgettext_lazy(
+                                'Scanner',
+                                'Number of discoveries to launch at once'))
+        parser.add_argument('--max-workers',
+                            action='store',
+                            type=int,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner',
+                                'Maximum worker processes shared by every '
+                                'discovery (0 for unlimited)'))
+        parser.add_argument('--max-probes',
+                            action='store',
+                            type=int,
+                            default=0,
+                            help=pgettext_lazy(
+                                'Scanner',
+                                'Maximum probes at once of the threads and '
+                                'async executors, shared by every discovery '
+                                '(0 for unlimited)'))
+        parser.add_argument('--resume',
+                            action='store_true',
+                            default=False,
+                            help=pgettext_lazy(
+                                'Scanner',
+                                'Continue the last run, skipping the '
+                                'already completed addresses'))
+
+    def handle(self, *args, **options) -> None:
+        discoveries = Discovery.objects.filter(scanner__tool=self.tool_name,
+                                               enabled=True)
+        # Share the same consumers pool for every discovery
+        with Consumers(max_tasks=options['max_tasks'],
+                       max_consumers=options['max_workers'],
+                       max_probes=options['max_probes']) as consumers:
+            if options['parallel'] > 1:
+                # Launch many discoveries at once, each one from its own
+                # thread and processing its own results
+                with concurrent.futures.ThreadPoolExecutor(
+                        max_workers=options['parallel']) as executor:
+                    futures = [executor.submit(
+                        self.do_discovery_thread,
+                        discovery=discovery,
+                        options=self.get_options(
+                            general_options={**options},
+                            scanner_options=discovery.scanner.options,
+                            discovery_options=discovery.options),
+                        destinations=None,
+                        consumers=consumers)
+                        for discovery in discoveries]
+                for future in futures:
+                    # Raise any error from the discoveries
+                    future.result()
+            else:
+                for discovery in discoveries:
+                    # Launch a discovery
+                    self.do_discovery(
+                        discovery=discovery,
+                        options=self.get_options(
+                            general_options={**options},
+                            scanner_options=discovery.scanner.options,
+                            discovery_options=discovery.options),
+                        destinations=None,
+                        consumers=consumers)
+
+    def do_discovery(self,
+                     discovery: Discovery,
+                     options: dict,
+                     destinations: list,
+                     consumers: Consumers = None,
+                     streams: list = None) -> None:
+        """
+        Launch a discovery
+        :param discovery: Discovery object to launch
+        :param options: discovery options
+        :param destinations: list of manual destinations or AddressStream
+                             with the addresses from another discovery
+        :param consumers: consumers pool to use (None for a new pool)
+        :param streams: list of AddressStream to pass the successful
+                        addresses to other discoveries
+        :return:
+        """
+        if consumers is None:
+            # Use a new consumers pool only for this discovery
+            with Consumers(max_tasks=options.get('max_tasks', 0)) as pool:
+                return self.do_discovery(discovery=discovery,
+                                         options=options,
+                                         destinations=destinations,
+                                         consumers=pool,
+                                         streams=streams)
+        # Save verbosity level
+        self.verbosity = options['verbosity']
+        # Save the completed addresses to resume the discovery later
+        progress = DiscoveryProgress(discovery=discovery,
+                                     run_id=options.get('run_id'),
+                                     resume=options.get('resume', False))
+        if progress.resumed and self.verbosity >= 1:
+            self.print('Resuming run {RUN_ID} of discovery {DISCOVERY}, '
+                       '{COUNT} addresses already completed'.format(
+                            RUN_ID=discovery.run_id,
+                            DISCOVERY=discovery.name,
+                            COUNT=len(progress.completed)))
+        elif progress.finished:
+            # The discovery was already finished in the resumed run
+            if self.verbosity >= 1:
+                self.print('Run {RUN_ID} of discovery {DISCOVERY} '
+                           'already finished, skipping'.format(
+                                RUN_ID=discovery.run_id,
+                                DISCOVERY=discovery.name))
+            return
+        # Prepare the chunks of items to discover
+        tasks = self.get_tasks(discovery=discovery,
+                               options=options,
+                               destinations=destinations,
+                               progress=progress)
+        # Instance the scanner tool using the discovery options
+        tool = self.instance_scanner_tool(discovery=discovery,
+                                          options=options)
+        if tool:
+            # Print results if verbosity >= 1
+            if self.verbosity >= 1:
+                self.print('Discovery "{DISCOVERY}" - '
+                           'executor: {EXECUTOR}, '
+                           'workers: {WORKERS}, '
+                           'timeout: {TIMEOUT}, '
+                           'options: {OPTIONS}'.format(
+                                DISCOVERY=discovery.name,
+                                EXECUTOR=get_executor(options=options,
+                                                      tool=tool),
+                                WORKERS=discovery.workers,
+                                TIMEOUT=discovery.timeout,
+                                OPTIONS=options))
+            # Adapt the concurrent probes for the threads and async
+            # executors, if requested
+            controller = None
+            if (options.get('adaptive', False) and
+                    get_executor(options=options,
+                                 tool=tool) != EXECUTOR_PROCESS):
+                controller = ConcurrencyController(
+                    initial=options.get('concurrency', discovery.workers),
+                    maximum=options.get('max_concurrency', 1024),
+                    timeout=discovery.timeout)
+            # Execute the network discovery
+            job = self.execute_tool(discovery=discovery,
+                                    options=options,
+                                    tool=tool,
+                                    tasks=tasks,
+                                    consumers=consumers,
+                                    controller=controller,
+                                    buckets=self.get_rate_buckets(
+                                        discovery=discovery,
+                                        options=options,
+                                        consumers=consumers))
+            # Process the results while the discovery is still running,
+            # each batch of results in a single operation on the DB side
+            for results in get_batches(
+                    items=job.results_as_iterator(),
+                    size=options.get('batch_size', 100)):
+                with transaction.atomic():
+                    # Save the probed addresses with their results
+                    progress.update(addresses=[
+                        self.get_item_address(item=item[0])
+                        for item in results])
+                    # Exclude invalid items from their status
+                    # If the failing option was passed, include any response
+                    if not options.get('failing', False):
+                        results = [item
+                                   for item in results
+                                   if item[1]['status']]
+                    if results:
+                        # Process the results to update the models, if needed
+                        self.process_results(discovery=discovery,
+                                             options=options,
+                                             results=results)
+                if results:
+                    # Pass the successful addresses to the next discoveries
+                    for stream in streams or []:
+                        stream.put([self.get_item_address(item=item[0])
+                                    for item in results
+                                    if item[1]['status']])
+            # Update last scan discovery
+            discovery = Discovery.objects.get(pk=discovery.pk)
+            discovery.last_scan = timezone.now()
+            if controller:
+                # Save the concurrency curve for the discovery
+                discovery.concurrency = json.dumps(controller.history)
+                if self.verbosity >= 2:
+                    self.print('Concurrency: {HISTORY}'.format(
+                        HISTORY=controller.history))
+            discovery.save()
+            # Mark the run as finished, so it will not be resumed
+            progress.finish()
+
+    def get_tasks(self,
+                  discovery: Discovery,
+                  options: dict,
+                  destinations: list,
+                  progress: DiscoveryProgress):
+        """
+        Get the chunks of items to discover, skipping the completed ones
+        :param discovery: Discovery object to launch
+        :param options: discovery options
+        :param destinations: list of manual destinations or AddressStream
+                             with the addresses from another discovery
+        :param progress: DiscoveryProgress to skip the completed addresses
+        :return: iterable of chunks of items or None if no item is
+                 available yet
+        """
+        raise NotImplementedError()
+
+    def get_item_address(self,
+                         item) -> str:
+        """
+        Get the address of an item processed by the scanner tool
+        :param item: item processed by the scanner tool
+        :return: address of the item
+        """
+        return item
+
+    def do_discovery_thread(self,
+                            discovery: Discovery,
+                            options: dict,
+                            destinations: list,
+                            consumers: Consumers) -> None:
+        """
+        Launch a discovery from a separate thread
+        :param discovery: Discovery object to launch
+        :param options: discovery options
+        :param destinations: list of manual destinations
+        :param consumers: consumers pool shared by every discovery
+        :return:
+        """
+        try:
+            self.do_discovery(discovery=discovery,
+                              options=options,
+                              destinations=destinations,
+                              consumers=consumers)
+        finally:
+            # Each thread uses its own database connection
+            connection.close()
+
+    def execute_tool(self,
+                     discovery: Discovery,
+                     options: dict,
+                     tool,
+                     tasks,
+                     consumers: Consumers,
+                     controller: ConcurrencyController = None,
+                     buckets: tuple = ()):
+        """
+        Execute the scanner tool for every item in the tasks chunks using
+        the requested executor
+        :param discovery: Discovery object that launches the tool
+        :param options: dictionary containing the options
+        :param tool: scanner tool to execute
+        :param tasks: iterable of chunks of items to process
+        :param consumers: consumers pool for the process executor or
+                          remote consumers to serve the remote agents
+        :param controller: concurrency controller for the threads and
+                           async executors (None for fixed concurrency)
+        :param buckets: rate limiter buckets from the consumers pool
+        :return: running job to get the results from
+        """
+        executor = get_executor(options=options,
+                                tool=tool)
+        if isinstance(consumers, RemoteConsumers):
+            # Serve the chunks to the remote agents, which execute the
+            # same scanner tool with the same options
+            return consumers.execute(specs={'tool': self.tool_name,
+                                            'discovery': discovery.name,
+                                            'timeout': discovery.timeout,
+                                            'workers': discovery.workers,
+                                            'options': options,
+                                            'buckets': buckets},
+                                     tasks=tasks)
+        sweep = getattr(tool, 'sweep', False)
+        tokens = None
+        if sweep:
+            # Process many addresses at once, as a single item for each
+            # sweep of addresses, consuming a rate limiter token for each
+            # packet sent by the sweep
+            tasks = get_sweeps(tasks=tasks,
+                               size=options.get('sweep_size', 256))
+            tokens = tool.get_tokens
+        if executor == EXECUTOR_ASYNC:
+            # Execute many concurrent probes from a single event loop.
+            # Tools without a coroutine are executed in a threads pool
+            job = AsyncConsumers().execute(
+                runners=options.get('concurrency', discovery.workers),
+                action=getattr(tool, 'execute_async', tool.execute),
+                tasks=get_items(tasks),
+                controller=controller,
+                limiter=consumers.limiter,
+                buckets=buckets,
+                deadline=options.get('task_timeout', 0),
+                tokens=tokens,
+                probes=consumers.probes)
+        elif executor == EXECUTOR_THREAD:
+            # Execute many concurrent probes in a threads pool, for the
+            # tools blocking in system calls which release the GIL
+            job = ThreadConsumers().execute(
+                runners=options.get('concurrency', discovery.workers),
+                action=tool.execute,
+                tasks=get_items(tasks),
+                controller=controller,
+                limiter=consumers.limiter,
+                buckets=buckets,
+                deadline=options.get('task_timeout', 0),
+                tokens=tokens,
+                probes=consumers.probes)
+        else:
+            # Execute each probe in a process from the consumers pool
+            job = consumers.execute(runners=discovery.workers,
+                                    action=tool.execute,
+                                    tasks=tasks,
+                                    buckets=buckets,
+                                    deadline=options.get('task_timeout', 0),
+                                    tokens=tokens)
+        # Get back the results for each address of the sweeps
+        return SweepsJob(job=job) if sweep else job
+
+    def get_rate_buckets(self,
+                         discovery: Discovery,
+                         options: dict,
+                         consumers: Consumers) -> tuple:
+        """
+        Get the rate limiter buckets for the whole command, the scanner
+        and the subnet, shared by every discovery using the same pool
+        :param discovery: Discovery object that launches the tool
+        :param options: dictionary containing the options
+        :param consumers: consumers pool owning the rate limiter
+        :return: tuple of rate limiter buckets
+        """
+        rates = ((('command', ), options.get('max_rate', 0)),
+                 (('scanner', discovery.scanner.pk), discovery.scanner.rate),
+                 (('subnetv4', discovery.subnetv4.pk),
+                  discovery.subnetv4.rate))
+        return tuple(consumers.limiter.get_bucket(key=key,
+                                                  rate=rate)
+                     for key, rate in rates
+                     if rate)
@@ -18,20 +18,21 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 ##
 
-import argparse
 import datetime
 import json
-import multiprocessing
 
 from django.core.management.base import BaseCommand
-from django.db import transaction
 from django.utils import timezone
 
+from netscanner.management.discovery_mixin import DiscoveryMixin
 from netscanner.models import Discovery, DiscoveryResult, Host
-from netscanner.utils.consumers import Consumers
+from netscanner.utils.address_chunks import get_chunk_size
+from netscanner.utils.address_stream import AddressStream
+from netscanner.utils.batches import get_batches
+from netscanner.utils.discovery_progress import DiscoveryProgress
 
 
-class HostBaseCommand(BaseCommand):
+class HostBaseCommand(DiscoveryMixin, BaseCommand):
     def __init__(self):
         """
         Host base command for all management host commands
@@ -43,21 +44,6 @@ class HostBaseCommand(BaseCommand):
         # Verbosity level for printing results
         self.verbosity = 0
 
-    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
-        BaseCommand.add_arguments(self, parser)
-
-    def handle(self, *args, **options) -> None:
-        discoveries = Discovery.objects.filter(scanner__tool=self.tool_name,
-                                               enabled=True)
-        for discovery in discoveries:
-            # Launch a discovery
-            self.do_discovery(discovery=discovery,
-                              options=self.get_options(
-                                  general_options={**options},
-                                  scanner_options=discovery.scanner.options,
-                                  discovery_options=discovery.options),
-                              destinations=None)
-
     def get_options(self,
                     general_options: dict,
                     scanner_options: dict,
@@ -84,62 +70,81 @@ class HostBaseCommand(BaseCommand):
                 del result[reserved_options]
         return result
 
-    def do_discovery(self,
-                     discovery: Discovery,
-                     options: dict,
-                     destinations: list) -> None:
+    def get_tasks(self,
+                  discovery: Discovery,
+                  options: dict,
+                  destinations: list,
+                  progress: DiscoveryProgress):
         """
-        Launch a discovery
+        Get the chunks of Hosts with a device model to discover, skipping
+        the completed hosts
         :param discovery: Discovery object to launch
         :param options: discovery options
-        :param destinations: list of manual destinations
-        :return:
+        :param destinations: list of manual destinations or AddressStream
+                             with the addresses from another discovery
+        :param progress: DiscoveryProgress to skip the completed addresses
+        :return: iterable of lists of Hosts or None if no host is
+                 available yet
         """
-        # Save verbosity level
-        self.verbosity = options['verbosity']
-        # Prepare addresses to discover
-        tasks = multiprocessing.JoinableQueue()
-        # Choose destinations group (manual group or Hosts from a Discovery)
-        if destinations:
-            addresses = Host.objects.filter(address__in=destinations).exclude(
-                device_model=None)
+        # Choose destinations group (addresses from another discovery,
+        # manual group or Hosts from a Discovery)
+        if isinstance(destinations, AddressStream):
+            # Process the hosts while they are found
+            tasks = self.get_stream_hosts(
+                destinations=destinations,
+                progress=progress,
+                size=options.get('chunk_size', 256))
         else:
-            addresses = Host.objects.filter(
-                address__in=discovery.subnetv4.get_ip_list()).exclude(
-                device_model=None)
-        for address in addresses:
-            tasks.put(address)
-        # Prepare consumers to execute the network discovery
-        consumers = Consumers(tasks_queue=tasks)
-        # Instance the scanner tool using the discovery options
-        tool = self.instance_scanner_tool(discovery=discovery,
-                                          options=options)
-        if tool:
-            # Print results if verbosity >= 1
-            if self.verbosity >= 1:
-                self.print('Discovery "{DISCOVERY}" - '
-                           'workers: {WORKERS}, '
-                           'timeout: {TIMEOUT}, '
-                           'options: {OPTIONS}'.format(
-                                DISCOVERY=discovery.name,
-                                WORKERS=discovery.workers,
-                                TIMEOUT=discovery.timeout,
-                                OPTIONS=options))
-            consumers.execute(runners=discovery.workers,
-                              action=tool.execute)
-            # Process the results in a single operation on the DB side
-            with transaction.atomic():
-                # Exclude invalid items from their status
-                results = list(filter(lambda item: item[1]['status'],
-                                      consumers.results_as_list()))
-                # Process the results to update the models, if needed
-                self.process_results(discovery=discovery,
-                                     options=options,
-                                     results=results)
-                # Update last scan discovery
-                discovery = Discovery.objects.get(pk=discovery.pk)
-                discovery.last_scan = timezone.now()
-                discovery.save()
+            if destinations:
+                addresses = Host.objects.filter(
+                    address__in=destinations).exclude(device_model=None)
+            else:
+                addresses = Host.objects.filter(
+                    address__in=discovery.subnetv4.get_ip_list()).exclude(
+                    device_model=None)
+            # Skip the hosts completed before resuming
+            addresses = [host
+                         for host in addresses
+                         if not progress.is_completed(host.address)]
+            # Split the hosts in chunks to process in each consumer
+            tasks = get_batches(items=addresses,
+                                size=get_chunk_size(
+                                    count=len(addresses),
+                                    runners=discovery.workers,
+                                    maximum=options.get('chunk_size', 256)))
+        return tasks
+
+    def get_item_address(self,
+                         item: Host) -> str:
+        """
+        Get the address of a Host processed by the scanner tool
+        :param item: Host processed by the scanner tool
+        :return: address of the Host
+        """
+        return item.address
+
+    def get_stream_hosts(self,
+                         destinations: AddressStream,
+                         progress: DiscoveryProgress,
+                         size: int):
+        """
+        Get the chunks of Hosts with a device model from the addresses
+        found by another discovery
+        :param destinations: AddressStream with the found addresses
+        :param progress: DiscoveryProgress to skip the completed addresses
+        :param size: maximum number of addresses for each chunk
+        :return: iterator of lists of Hosts or None if no address is
+                 available yet
+        """
+        for chunk in destinations.get_chunks(size=size):
+            if chunk is None:
+                yield None
+            else:
+                yield list(Host.objects.filter(
+                    address__in=[address
+                                 for address in chunk
+                                 if not progress.is_completed(address)]
+                ).exclude(device_model=None))
 
     def instance_scanner_tool(self,
                               discovery: Discovery,
@@ -178,7 +183,8 @@ class HostBaseCommand(BaseCommand):
                             int(value.timestamp()))
                     elif isinstance(value, list):
                         # Convert lists to strings
-                        serializable_values[key] = ', '.join(value)
+                        serializable_values[key] = ', '.join(
+                            str(item) for item in value)
                     else:
                         # Raw value
                         serializable_values[key] = value
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.10 on 2026-10-17 22:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netscanner', '0042_subnetv4_hosts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='discovery',
+            name='concurrency',
+            field=models.TextField(blank=True, verbose_name='last concurrency'),
+        ),
+    ]
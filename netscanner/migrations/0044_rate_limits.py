@@ -0,0 +1,23 @@
+# Generated by Django 2.2.10 on 2026-10-17 22:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netscanner', '0043_discovery_concurrency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanner',
+            name='rate',
+            field=models.PositiveIntegerField(default=0, verbose_name='probes per second'),
+        ),
+        migrations.AddField(
+            model_name='subnetv4',
+            name='rate',
+            field=models.PositiveIntegerField(default=0, verbose_name='probes per second'),
+        ),
+    ]
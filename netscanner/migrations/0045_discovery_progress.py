@@ -0,0 +1,23 @@
+# Generated by Django 2.2.10 on 2026-10-17 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netscanner', '0044_rate_limits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='discovery',
+            name='progress',
+            field=models.TextField(blank=True, verbose_name='completed ranges'),
+        ),
+        migrations.AddField(
+            model_name='discovery',
+            name='run_id',
+            field=models.CharField(blank=True, max_length=32, verbose_name='run id'),
+        ),
+    ]
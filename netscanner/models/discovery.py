@@ -72,6 +72,18 @@ class Discovery(BaseModel):
                                      default=None,
                                      verbose_name=pgettext_lazy('Discovery',
                                                                 'last scan'))
+    concurrency = models.TextField(blank=True,
+                                   verbose_name=pgettext_lazy(
+                                       'Discovery',
+                                       'last concurrency'))
+    run_id = models.CharField(max_length=32,
+                              blank=True,
+                              verbose_name=pgettext_lazy('Discovery',
+                                                         'run id'))
+    progress = models.TextField(blank=True,
+                                verbose_name=pgettext_lazy(
+                                    'Discovery',
+                                    'completed ranges'))
 
     class Meta:
         # Define the database table
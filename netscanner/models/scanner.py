@@ -38,6 +38,10 @@ class Scanner(BaseModel):
     options = models.TextField(blank=True,
                                verbose_name=pgettext_lazy('Scanner',
                                                           'options'))
+    rate = models.PositiveIntegerField(default=0,
+                                       verbose_name=pgettext_lazy(
+                                           'Scanner',
+                                           'probes per second'))
 
     class Meta:
         # Define the database table
@@ -56,6 +56,9 @@ class SubnetV4(BaseModel):
                                    related_name='netscanner_subnet_v4_hosts',
                                    verbose_name=pgettext_lazy(
                                        'SubnetV4', 'Manual hosts list'))
+    rate = models.PositiveIntegerField(
+        default=0,
+        verbose_name=pgettext_lazy('SubnetV4', 'probes per second'))
 
     class Meta:
         # Define the database table
@@ -83,6 +86,34 @@ class SubnetV4(BaseModel):
             # Single host subnet
             return (self.subnet_ip, )
 
+    def get_ip_ranges(self) -> list:
+        """
+        Get the whole IP list for a network/CIDR as a list of ranges, each
+        one with the first and the last address in numeric form
+        """
+        if self.cidr == 0:
+            # Fixed hosts list
+            return [(value, value)
+                    for value in sorted(
+                        int(ipaddress.IPv4Address(address))
+                        for address in self.get_ip_list())]
+        elif self.cidr < 32:
+            # Normal network
+            ip_network = ipaddress.ip_network('{}/{}'.format(self.subnet_ip,
+                                                             self.cidr))
+            if ip_network.num_addresses > 2:
+                # Skip network and broadcast addresses
+                return [(int(ip_network.network_address) + 1,
+                         int(ip_network.broadcast_address) - 1)]
+            else:
+                # Point to point network
+                return [(int(ip_network.network_address),
+                         int(ip_network.broadcast_address))]
+        else:
+            # Single host subnet
+            value = int(ipaddress.IPv4Address(self.subnet_ip))
+            return [(value, value)]
+
 
 class SubnetV4Admin(BaseModelAdmin):
     pass
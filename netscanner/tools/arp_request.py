@@ -43,9 +43,16 @@ class ARPRequest(object):
         reply = scapy.all.srp(broadcast / arp,
                               timeout=self.timeout,
                               verbose=False)[0]
-        result = reply[0][1].hwsrc.upper() if reply else None
-        start_time = reply[0][0].sent_time if reply else 0
-        end_time = reply[0][1].time if reply else 0
+        return self.get_result(reply=reply[0] if reply else None)
+
+    def get_result(self,
+                   reply: tuple) -> dict:
+        """
+        Get the result from the (sent, received) packets of a reply
+        """
+        result = reply[1].hwsrc.upper() if reply else None
+        start_time = reply[0].sent_time if reply else 0
+        end_time = reply[1].time if reply else 0
         duration = round((end_time - start_time) * 1000, 2) if reply else 0
         if duration < 0:
             # Workaround for negative duration
@@ -59,3 +66,49 @@ class ARPRequest(object):
             'end': end_time,
             'duration': duration,
         }
+
+
+class ARPSweep(ARPRequest):
+    # Each item is a list of addresses to process at once
+    sweep = True
+
+    def __init__(self,
+                 verbosity: int,
+                 timeout: int,
+                 interval: float):
+        super().__init__(verbosity=verbosity,
+                         timeout=timeout)
+        self.interval = interval
+
+    def get_tokens(self,
+                   destinations: list) -> int:
+        """
+        Get the rate limiter tokens for a sweep, a token for each packet
+        :param destinations: list of addresses in the sweep
+        :return: number of ARP requests sent to the destinations
+        """
+        return len(destinations)
+
+    def execute(self,
+                destinations: list) -> list:
+        """
+        Send the ARP requests to every address at once, waiting the
+        replies for a single timeout (requires root access)
+        """
+        # Print destinations for verbosity >= 2
+        if self.verbosity >= 2:
+            for destination in destinations:
+                print(destination)
+        broadcast = scapy.all.Ether(dst="ff:ff:ff:ff:ff:ff")
+        packets = [broadcast / scapy.all.ARP(pdst=destination)
+                   for destination in destinations]
+        replies = {}
+        for reply in scapy.all.srp(packets,
+                                   inter=self.interval,
+                                   timeout=self.timeout,
+                                   verbose=False)[0]:
+            # Match each reply with its requested address
+            replies.setdefault(reply[0][scapy.all.ARP].pdst, reply)
+        return [(destination, self.get_result(
+                    reply=replies.get(destination)))
+                for destination in destinations]
@@ -18,14 +18,27 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 ##
 
+import asyncio
 import datetime
 import socket
 
+from netscanner.utils.dns_resolver import PTRResolver
+from netscanner.utils.executors import EXECUTOR_ASYNC, EXECUTOR_THREAD
+
 
 class Hostname(object):
+    # The name resolution blocks in system calls releasing the GIL
+    executor = EXECUTOR_THREAD
+
     def __init__(self,
-                 verbosity: int):
+                 verbosity: int,
+                 resolver: PTRResolver = None):
         self.verbosity = verbosity
+        # Resolve the names using the PTR queries instead of the system
+        # resolver, many queries at once from an event loop
+        self.resolver = resolver
+        if resolver:
+            self.executor = EXECUTOR_ASYNC
 
     def execute(self,
                 destination: str) -> dict:
@@ -35,7 +48,36 @@ class Hostname(object):
         # Print destination for verbosity >= 2
         if self.verbosity >= 2:
             print(destination)
-        result = socket.getfqdn(destination)
+        if self.resolver:
+            return self.get_result(
+                destination=destination,
+                result=self.resolver.resolve_sync(destination))
+        return self.get_result(destination=destination,
+                               result=socket.getfqdn(destination))
+
+    async def execute_async(self,
+                            destination: str) -> dict:
+        """
+        Resolve the address hostname using asynchronous PTR queries
+        """
+        if not self.resolver:
+            # Use the system resolver from the threads pool
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self.execute, destination)
+        # Print destination for verbosity >= 2
+        if self.verbosity >= 2:
+            print(destination)
+        return self.get_result(
+            destination=destination,
+            result=await self.resolver.resolve(destination))
+
+    def get_result(self,
+                   destination: str,
+                   result: str) -> dict:
+        """
+        Get the result for the resolved hostname
+        """
+        result = result or destination
         return {
             'fqdn': result,
             'status': bool(result) and result != destination,
@@ -0,0 +1,266 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+import datetime
+import math
+import os
+import select
+import socket
+import statistics
+import struct
+import time
+
+# Linux socket option to get the receive time from the kernel
+SO_TIMESTAMPNS = getattr(socket, 'SO_TIMESTAMPNS', 35)
+# ICMP echo types
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+# Sockets types
+SOCKET_AUTO = 'auto'
+SOCKET_DGRAM = 'dgram'
+SOCKET_RAW = 'raw'
+
+
+def get_checksum(data: bytes) -> int:
+    """
+    Get the internet checksum for the data
+    """
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack('!%dH' % (len(data) // 2), data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+def get_percentile(values: list,
+                   percentile: float) -> float:
+    """
+    Get the percentile of the values using the nearest rank method
+    """
+    values = sorted(values)
+    return values[max(math.ceil(percentile / 100 * len(values)), 1) - 1]
+
+
+class ICMPSweep(object):
+    # Each item is a list of addresses to process at once
+    sweep = True
+
+    def __init__(self,
+                 verbosity: int,
+                 timeout: int,
+                 interval: float,
+                 socket_type: str,
+                 count: int = 1,
+                 round_interval: float = 0.1,
+                 max_loss: float = 100):
+        self.verbosity = verbosity
+        self.timeout = timeout
+        self.interval = interval
+        self.socket_type = socket_type
+        # Requests for each address, sent in rounds to every address
+        self.count = max(count, 1)
+        self.round_interval = round_interval
+        # Maximum loss percentage for a successful status
+        self.max_loss = max_loss
+
+    def get_socket(self) -> tuple:
+        """
+        Open an ICMP socket, an unprivileged datagram socket if allowed by
+        net.ipv4.ping_group_range, otherwise a raw socket (requires root
+        access)
+        :return: tuple with the socket and the raw status
+        """
+        if self.socket_type != SOCKET_RAW:
+            try:
+                return socket.socket(family=socket.AF_INET,
+                                     type=socket.SOCK_DGRAM,
+                                     proto=socket.IPPROTO_ICMP), False
+            except OSError:
+                if self.socket_type == SOCKET_DGRAM:
+                    raise
+        return socket.socket(family=socket.AF_INET,
+                             type=socket.SOCK_RAW,
+                             proto=socket.IPPROTO_ICMP), True
+
+    def get_tokens(self,
+                   destinations: list) -> int:
+        """
+        Get the rate limiter tokens for a sweep, a token for each packet
+        :param destinations: list of addresses in the sweep
+        :return: number of ICMP requests sent to the destinations
+        """
+        return len(destinations) * self.count
+
+    def execute(self,
+                destinations: list) -> list:
+        """
+        Ping many IP addresses at once using a single ICMP socket, waiting
+        the replies for a single timeout after the last round of requests
+        """
+        # Print destinations for verbosity >= 2
+        if self.verbosity >= 2:
+            for destination in destinations:
+                print(destination)
+        sock, raw = self.get_socket()
+        # Send time of the requests by their address and sequence number,
+        # as the sequence numbers wrap for the larger sweeps
+        pending = {}
+        # Round trip times in milliseconds by address
+        replies = {destination: [] for destination in destinations}
+        # Send and receive time for the first reply by address
+        times = {}
+        try:
+            try:
+                # Get the receive time from the kernel
+                sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+            except OSError:
+                pass
+            # The kernel replaces the identifier for the datagram sockets
+            identifier = os.getpid() & 0xffff
+            for round_number in range(self.count):
+                round_time = time.monotonic()
+                for index, destination in enumerate(destinations):
+                    sequence = (round_number * len(destinations) +
+                                index) & 0xffff
+                    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0,
+                                         identifier, sequence)
+                    payload = struct.pack('!d', time.time())
+                    checksum = get_checksum(header + payload)
+                    packet = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0,
+                                         checksum, identifier,
+                                         sequence) + payload
+                    start_time = time.time()
+                    try:
+                        sock.sendto(packet, (destination, 0))
+                    except OSError:
+                        # Unreachable destination
+                        continue
+                    pending[(destination, sequence)] = start_time
+                    if self.interval:
+                        time.sleep(self.interval)
+                # Receive the replies until the next round or the timeout
+                self.receive(sock=sock,
+                             raw=raw,
+                             identifier=(identifier
+                                         if raw or not pending
+                                         else sock.getsockname()[1]),
+                             pending=pending,
+                             replies=replies,
+                             times=times,
+                             deadline=round_time + (
+                                 self.round_interval
+                                 if round_number < self.count - 1
+                                 else self.timeout))
+        finally:
+            sock.close()
+        return [(destination, self.get_result(rtts=replies[destination],
+                                              times=times.get(destination)))
+                for destination in destinations]
+
+    def receive(self,
+                sock: socket.socket,
+                raw: bool,
+                identifier: int,
+                pending: dict,
+                replies: dict,
+                times: dict,
+                deadline: float) -> None:
+        """
+        Receive the replies for the pending requests until the deadline
+        :param sock: ICMP socket
+        :param raw: the socket is a raw socket, including the IP header
+        :param identifier: ICMP identifier for the requests
+        :param pending: send time of the requests by their address and
+                        sequence number
+        :param replies: round trip times by address, updated
+        :param times: send and receive times of the first reply by
+                      address, updated
+        :param deadline: monotonic time to stop receiving
+        :return: None
+        """
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if not select.select([sock], [], [], remaining)[0]:
+                break
+            data, ancillary, _, address = sock.recvmsg(
+                2048, socket.CMSG_SPACE(16))
+            end_time = time.time()
+            for level, kind, value in ancillary:
+                if (level == socket.SOL_SOCKET and
+                        kind == SO_TIMESTAMPNS and len(value) >= 16):
+                    seconds, nanoseconds = struct.unpack('qq', value[:16])
+                    end_time = seconds + nanoseconds / 1e9
+            if raw:
+                # Skip the IP header
+                data = data[(data[0] & 0x0f) * 4:]
+            if len(data) < 8:
+                continue
+            kind, code, _, reply_identifier, sequence = struct.unpack(
+                '!BBHHH', data[:8])
+            # Match the reply with its request
+            destination = address[0]
+            if (kind == ICMP_ECHO_REPLY and
+                    reply_identifier == identifier and
+                    (destination, sequence) in pending):
+                start_time = pending.pop((destination, sequence))
+                replies[destination].append(
+                    round((end_time - start_time) * 1000, 2))
+                times.setdefault(destination, (start_time, end_time))
+
+    def get_result(self,
+                   rtts: list,
+                   times: tuple) -> dict:
+        """
+        Get the result for an address from its round trip times
+        :param rtts: list of round trip times in milliseconds
+        :param times: send and receive times of the first reply or None
+        :return: dictionary with the result
+        """
+        reply = bool(rtts)
+        result = {
+            'reply': reply,
+            'status': reply,
+            'timestamp': datetime.datetime.now().timestamp(),
+            'start': times[0] if times else 0,
+            'end': times[1] if times else 0,
+            'duration': rtts[0] if rtts else 0,
+        }
+        if self.count > 1:
+            # Statistics for many requests
+            loss = round((self.count - len(rtts)) * 100 / self.count, 2)
+            result.update({
+                'status': reply and loss <= self.max_loss,
+                'sent': self.count,
+                'received': len(rtts),
+                'loss': loss,
+                'min': min(rtts) if rtts else 0,
+                'avg': round(statistics.mean(rtts), 2) if rtts else 0,
+                'max': max(rtts) if rtts else 0,
+                'stddev': round(statistics.pstdev(rtts), 2) if rtts else 0,
+                'p95': get_percentile(rtts, 95) if rtts else 0,
+                'jitter': (round(statistics.mean(
+                              abs(current - previous)
+                              for previous, current in zip(rtts, rtts[1:])),
+                              2)
+                           if len(rtts) > 1 else 0),
+            })
+        return result
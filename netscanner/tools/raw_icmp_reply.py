@@ -38,12 +38,16 @@ class RawICMPReply(object):
         # Print destination for verbosity >= 2
         if self.verbosity >= 2:
             print(destination)
-        scapy.all.conf.L3socket = scapy.all.L3RawSocket
         ip_request = scapy.all.IP(dst=destination)
         ping = scapy.all.ICMP()
-        reply = scapy.all.sr(ip_request / ping,
-                             timeout=self.timeout,
-                             verbose=False)[0]
+        # Use a raw socket without changing the global scapy configuration
+        sock = scapy.all.L3RawSocket()
+        try:
+            reply = sock.sr(ip_request / ping,
+                            timeout=self.timeout,
+                            verbose=False)[0]
+        finally:
+            sock.close()
         result = reply[0][1].code == 0 if reply else False
         start_time = reply[0][0].sent_time if reply else 0
         end_time = reply[0][1].time if reply else 0
@@ -37,7 +37,8 @@ class SNMPFindModel(object):
                  retries: int,
                  skip_existing: bool,
                  configurations: list,
-                 initial_configuration: SNMPConfiguration):
+                 initial_configuration: SNMPConfiguration,
+                 max_oids: int):
         self.verbosity = verbosity
         self.timeout = timeout
         self.port = port
@@ -45,8 +46,18 @@ class SNMPFindModel(object):
         self.snmp_community = community
         self.retries = retries
         self.skip_existing = skip_existing
-        self.configurations = configurations
-        self.initial_configuration = initial_configuration
+        # SNMP values of the initial configuration
+        self.initial_configuration = (
+            [snmp_configuration_value.snmp_value
+             for snmp_configuration_value
+             in initial_configuration.select_related('snmp_value')]
+            if initial_configuration is not None
+            else None)
+        # Autodetection values by OID and value format, each one with a
+        # dictionary of the expected values and their DeviceModel
+        self.autodetect = self.get_autodetect_map(configurations)
+        # Maximum number of OIDs requested in a single GET request
+        self.max_oids = max_oids
 
     def execute(self,
                 destination: str) -> dict:
@@ -85,25 +96,26 @@ class SNMPFindModel(object):
         # will be done using the models configurations.
         if self.initial_configuration:
             value = None
-            for snmp_configuration_value in self.initial_configuration:
-                snmp_value = snmp_configuration_value.snmp_value
-                if self.verbosity >= 4:
+            snmp_values = self.initial_configuration
+            if self.verbosity >= 4:
+                for snmp_value in snmp_values:
                     print(destination,
                           'Initial configuration',
                           snmp_value.name,
                           snmp_value.oid)
-                try:
+            result_values = SNMPGetInfo.get_snmp_values(
+                session=session,
+                oids=[snmp_value.oid for snmp_value in snmp_values],
+                max_oids=self.max_oids)
+            for snmp_value, result_value in zip(snmp_values, result_values):
+                if result_value is not None:
                     value = SNMPGetInfo.format_snmp_value(
-                        value=session.get(snmp_value.oid),
+                        value=result_value,
                         format=snmp_value.format,
                         lstrip=snmp_value.lstrip,
                         rstrip=snmp_value.rstrip)
                     if value is not None:
                         break
-                except SystemError:
-                    # Handle SystemError bug under Python >= 3.7
-                    # https://github.com/kamakazikamikaze/easysnmp/issues/108
-                    pass
             # If not a single value was found from the request, abort the scan
             if value is None:
                 if self.verbosity >= 3:
@@ -111,36 +123,66 @@ class SNMPFindModel(object):
                           'initial configuration, skipping'.format(
                               DESTINATION=destination))
                 return results
-        # Try every model for the best matching
-        for configuration in self.configurations:
-            try:
-                value = SNMPGetInfo.format_snmp_value(
-                    value=session.get(configuration.autodetect.oid),
-                    format=configuration.format,
-                    lstrip=configuration.lstrip,
-                    rstrip=configuration.rstrip)
-            except SystemError:
-                # Handle SystemError bug under Python >= 3.7
-                # https://github.com/kamakazikamikaze/easysnmp/issues/108
-                value = None
-            # Replace '${ }' with spaces in autodetection value
-            # Django-admin automatically removes trailing whitespaces
-            autodetect_value = configuration.value.replace('${ }', ' ')
-            if self.verbosity >= 3:
-                print('destination="{}"'.format(destination),
-                      'requested value="{}"'.format(autodetect_value),
-                      'oid="{}"'.format(configuration.autodetect.oid),
-                      'value="{}"'.format(value))
-            # Check if the value is the autodetection value
-            if value and value == autodetect_value:
-                # Save status and model
-                results['status'] = True
-                results['model_name'] = configuration.device_model.name
-                results['model_id'] = configuration.device_model.id
-                break
+        # Get every autodetection OID only once
+        oids = list(self.autodetect.keys())
+        result_values = SNMPGetInfo.get_snmp_values(session=session,
+                                                    oids=oids,
+                                                    max_oids=self.max_oids)
+        # Find the first matching model using the autodetection values
+        model = None
+        for oid, result_value in zip(oids, result_values):
+            if result_value is None:
+                continue
+            for (format, lstrip, rstrip), models in (
+                    self.autodetect[oid].items()):
+                value = SNMPGetInfo.format_snmp_value(value=result_value,
+                                                      format=format,
+                                                      lstrip=lstrip,
+                                                      rstrip=rstrip)
+                if self.verbosity >= 3:
+                    print('destination="{}"'.format(destination),
+                          'oid="{}"'.format(oid),
+                          'format="{}"'.format(format),
+                          'value="{}"'.format(value))
+                # Check if the value is an autodetection value
+                if value and value in models:
+                    model = min(model or models[value], models[value])
+        if model:
+            # Save status and model
+            results['status'] = True
+            results['model_name'] = model[1]
+            results['model_id'] = model[2]
         # Add some information to the results
         if results['status']:
             results['version'] = self.snmp_version.name
         # Add timestamp
         results['timestamp'] = datetime.datetime.now().timestamp()
         return results
+
+    @staticmethod
+    def get_autodetect_map(configurations: list) -> dict:
+        """
+        Get the autodetection values by OID and value format
+        :param configurations: list of SNMPConfiguration with autodetection
+        :return: dictionary with the autodetection OIDs, each one with a
+                 dictionary by value format (format, lstrip, rstrip) of
+                 the expected values and their DeviceModel (the order of
+                 the configuration, the model name and the model id)
+        """
+        results = {}
+        for index, configuration in enumerate(configurations):
+            # Replace '${ }' with spaces in autodetection value
+            # Django-admin automatically removes trailing whitespaces
+            autodetect_value = configuration.value.replace('${ }', ' ')
+            if not autodetect_value:
+                continue
+            formats = results.setdefault(configuration.autodetect.oid, {})
+            models = formats.setdefault((configuration.format,
+                                         configuration.lstrip,
+                                         configuration.rstrip), {})
+            # The first configuration has precedence for the same value
+            models.setdefault(autodetect_value,
+                              (index,
+                               configuration.device_model.name,
+                               configuration.device_model.id))
+        return results
@@ -26,17 +26,23 @@ import easysnmp
 from netscanner.models import OperatingSystem, SNMPConfiguration
 from ..models import Host
 
+# SNMP error status for responses exceeding the agent message size
+SNMP_ERR_TOOBIG = 1
+
 
 class SNMPGetInfo(object):
     def __init__(self,
                  verbosity: int,
                  timeout: int,
                  port: int,
-                 retries: int):
+                 retries: int,
+                 max_oids: int):
         self.verbosity = verbosity
         self.timeout = timeout
         self.port = port
         self.retries = retries
+        # Maximum number of OIDs requested in a single GET request
+        self.max_oids = max_oids
 
     def execute(self,
                 host: Host) -> dict:
@@ -64,69 +70,129 @@ class SNMPGetInfo(object):
                                                    'public'),
                                                timeout=self.timeout or 30,
                                                retries=self.retries)
-            # Cycle all SNMP Configurations
-            for snmp_configuration in snmp_configurations:
-                # Cycle all configured SNMP values and save values
-                values = snmp_configuration.snmpconfigurationvalue_set.all()
+            # Get all the configured SNMP values at once
+            values = [snmp_configuration_value
+                      for snmp_configuration in snmp_configurations
+                      for snmp_configuration_value
+                      in (snmp_configuration.snmpconfigurationvalue_set
+                          .select_related('snmp_value'))]
+            if self.verbosity >= 3:
                 for snmp_configuration_value in values:
-                    snmp_value = snmp_configuration_value.snmp_value
-                    try:
-                        result_name = '{SECTION} - {BRAND} - {NAME}'.format(
-                            SECTION=snmp_value.section,
-                            BRAND=snmp_value.brand,
-                            NAME=snmp_value.name)
-                        if self.verbosity >= 3:
-                            print('destination="{}"'.format(host.address),
-                                  'oid="{}"'.format(snmp_value.oid))
-                        result_value = session.get(snmp_value.oid)
-                        # Skip invalid response types
-                        if result_value.snmp_type in ('NOSUCHOBJECT',
-                                                      'NOSUCHINSTANCE'):
-                            raise TypeError
-                        result_value = self.format_snmp_value(
-                                value=result_value,
-                                format=snmp_value.format,
-                                lstrip=snmp_value.lstrip,
-                                rstrip=snmp_value.rstrip)
-                        # Skip invalid MAC Addresses
-                        if (snmp_value.format == 'mac address' and
-                                all(c == '0' for c in result_value)):
-                            raise TypeError
-                        # Save values
-                        results[result_name] = result_value
-                        if self.verbosity >= 3:
-                            print('\r')
-                            print('destination="{}"'.format(host.address),
-                                  'requested value="{}"'.format(
-                                      snmp_value.name),
-                                  'oid="{}"'.format(snmp_value.oid),
-                                  'value="{}"'.format(results[result_name]))
-                        # SNMPConfigurationValue has field to set
-                        field = snmp_configuration_value.field
-                        if field:
-                            if snmp_configuration_value.text_values:
-                                # JSON Text value configuration
-                                json_values = json.loads(
-                                    snmp_configuration_value.text_values)
-                                # Get the field value if result matches
-                                if results[result_name] == json_values['value']:
-                                    results[field] = self.get_field_value(
-                                        field, json_values)
-                            else:
-                                # Field set
-                                results[field] = results[result_name]
-                    except SystemError:
-                        # Handle SystemError bug under Python >= 3.7
-                        # https://github.com/kamakazikamikaze/easysnmp/issues/108
-                        pass
-                    except TypeError:
-                        # Skip invalid response types
-                        pass
+                    print('destination="{}"'.format(host.address),
+                          'oid="{}"'.format(
+                              snmp_configuration_value.snmp_value.oid))
+            result_values = self.get_snmp_values(
+                session=session,
+                oids=[snmp_configuration_value.snmp_value.oid
+                      for snmp_configuration_value in values],
+                max_oids=self.max_oids)
+            # Cycle all configured SNMP values and save values
+            for snmp_configuration_value, result_value in zip(values,
+                                                              result_values):
+                snmp_value = snmp_configuration_value.snmp_value
+                try:
+                    result_name = '{SECTION} - {BRAND} - {NAME}'.format(
+                        SECTION=snmp_value.section,
+                        BRAND=snmp_value.brand,
+                        NAME=snmp_value.name)
+                    # Skip invalid response types
+                    if (result_value is None or
+                            result_value.snmp_type in ('NOSUCHOBJECT',
+                                                       'NOSUCHINSTANCE')):
+                        raise TypeError
+                    result_value = self.format_snmp_value(
+                            value=result_value,
+                            format=snmp_value.format,
+                            lstrip=snmp_value.lstrip,
+                            rstrip=snmp_value.rstrip)
+                    # Skip invalid MAC Addresses
+                    if (snmp_value.format == 'mac address' and
+                            all(c == '0' for c in result_value)):
+                        raise TypeError
+                    # Save values
+                    results[result_name] = result_value
+                    if self.verbosity >= 3:
+                        print('\r')
+                        print('destination="{}"'.format(host.address),
+                              'requested value="{}"'.format(
+                                  snmp_value.name),
+                              'oid="{}"'.format(snmp_value.oid),
+                              'value="{}"'.format(results[result_name]))
+                    # SNMPConfigurationValue has field to set
+                    field = snmp_configuration_value.field
+                    if field:
+                        if snmp_configuration_value.text_values:
+                            # JSON Text value configuration
+                            json_values = json.loads(
+                                snmp_configuration_value.text_values)
+                            # Get the field value if result matches
+                            if results[result_name] == json_values['value']:
+                                results[field] = self.get_field_value(
+                                    field, json_values)
+                        else:
+                            # Field set
+                            results[field] = results[result_name]
+                except TypeError:
+                    # Skip invalid response types
+                    pass
         results['status'] = bool(results)
         # Add timestamp
         results['timestamp'] = datetime.datetime.now().timestamp()
         return results
 
+    @staticmethod
+    def get_snmp_values(session: easysnmp.session.Session,
+                        oids: list,
+                        max_oids: int) -> list:
+        """
+        Get many SNMP values using as few GET requests as possible
+        :param session: SNMP session
+        :param oids: list of OIDs to request
+        :param max_oids: maximum number of OIDs in a single request
+        :return: list of SNMPVariable objects (None for the failed OIDs)
+        """
+        max_oids = max(max_oids, 1)
+        results = []
+        for index in range(0, len(oids), max_oids):
+            results.extend(SNMPGetInfo._get_snmp_values_batch(
+                session=session,
+                oids=oids[index:index + max_oids]))
+        return results
+
+    @staticmethod
+    def _get_snmp_values_batch(session: easysnmp.session.Session,
+                               oids: list) -> list:
+        """
+        Get many SNMP values using a single GET request, splitting the
+        request in halves when it was refused by the agent
+        :param session: SNMP session
+        :param oids: list of OIDs to request
+        :return: list of SNMPVariable objects (None for the failed OIDs)
+        """
+        if not oids:
+            return []
+        try:
+            values = session.get(oids)
+            refused = getattr(session, 'error_number', 0) == SNMP_ERR_TOOBIG
+        except (easysnmp.exceptions.EasySNMPConnectionError,
+                easysnmp.exceptions.EasySNMPTimeoutError):
+            raise
+        except (easysnmp.exceptions.EasySNMPError, SystemError):
+            # The agent refused the request (tooBig or noSuchName for
+            # SNMPv1) or a value could not be decoded
+            # Handle SystemError bug under Python >= 3.7
+            # https://github.com/kamakazikamikaze/easysnmp/issues/108
+            refused = True
+        if not refused:
+            return list(values)
+        if len(oids) == 1:
+            return [None]
+        middle = len(oids) // 2
+        return (SNMPGetInfo._get_snmp_values_batch(session=session,
+                                                   oids=oids[:middle]) +
+                SNMPGetInfo._get_snmp_values_batch(session=session,
+                                                   oids=oids[middle:]))
+
     @staticmethod
     def format_snmp_value(value: easysnmp.variables.SNMPVariable,
                           format: str,
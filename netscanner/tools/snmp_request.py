@@ -35,7 +35,8 @@ class SNMPRequest(object):
                  version: SNMPVersion,
                  community: str,
                  retries: int,
-                 values: list):
+                 values: list,
+                 max_oids: int):
         self.verbosity = verbosity
         self.timeout = timeout
         self.port = port
@@ -43,6 +44,8 @@ class SNMPRequest(object):
         self.snmp_community = community
         self.retries = retries
         self.values = values
+        # Maximum number of OIDs requested in a single GET request
+        self.max_oids = max_oids
 
     def execute(self,
                 destination: str) -> dict:
@@ -59,19 +62,20 @@ class SNMPRequest(object):
                                            community=self.snmp_community,
                                            timeout=self.timeout,
                                            retries=self.retries)
-        for value in self.values:
-            if self.verbosity >= 3:
+        if self.verbosity >= 3:
+            for value in self.values:
                 print(destination, value.name, value.oid)
-            try:
+        result_values = SNMPGetInfo.get_snmp_values(
+            session=session,
+            oids=[value.oid for value in self.values],
+            max_oids=self.max_oids)
+        for value, result_value in zip(self.values, result_values):
+            if result_value is not None:
                 results[value.name] = SNMPGetInfo.format_snmp_value(
-                    value=session.get(value.oid),
+                    value=result_value,
                     format=value.format,
                     lstrip=value.lstrip,
                     rstrip=value.rstrip)
-            except SystemError:
-                # Handle SystemError bug under Python >= 3.7
-                # https://github.com/kamakazikamikaze/easysnmp/issues/108
-                pass
         # Add status
         results['status'] = bool(results)
         # Add timestamp
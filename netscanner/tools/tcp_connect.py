@@ -18,11 +18,17 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 ##
 
+import asyncio
 import datetime
 import socket
 
+from netscanner.utils.executors import EXECUTOR_ASYNC
+
 
 class TCPConnect(object):
+    # The connections can be awaited concurrently from an event loop
+    executor = EXECUTOR_ASYNC
+
     def __init__(self,
                  verbosity: int,
                  timeout: int,
@@ -56,3 +62,28 @@ class TCPConnect(object):
             'status': status,
             'timestamp': datetime.datetime.now().timestamp(),
         }
+
+    async def execute_async(self,
+                            destination: str) -> dict:
+        """
+        Connect to an IP address using asynchronous TCP connection
+        """
+        # Print destination for verbosity >= 2
+        if self.verbosity >= 2:
+            print(destination)
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(host=destination,
+                                        port=self.portnr),
+                timeout=self.timeout)
+            writer.close()
+            status = True
+        except (ConnectionRefusedError,
+                OSError,
+                asyncio.TimeoutError):
+            status = False
+        return {
+            'connected': status,
+            'status': status,
+            'timestamp': datetime.datetime.now().timestamp(),
+        }
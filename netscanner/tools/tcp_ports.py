@@ -0,0 +1,217 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+import collections
+import datetime
+import errno
+import selectors
+import socket
+import time
+
+from netscanner.utils.concurrency import get_descriptors_limit
+
+
+def get_ports(value) -> list:
+    """
+    Get the list of ports from a string or a list of ports and ranges
+    (like "22,80,8000-8100" or [22, 80, "8000-8100"])
+    :param value: ports string or list
+    :return: sorted list of unique ports
+    """
+    if isinstance(value, (str, int)):
+        value = str(value).split(',')
+    ports = set()
+    for item in value:
+        item = str(item).strip()
+        if '-' in item:
+            start, end = item.split('-', 1)
+            ports.update(range(int(start), int(end) + 1))
+        elif item:
+            ports.add(int(item))
+    return sorted(port for port in ports if 0 < port < 65536)
+
+
+class TCPPortsSweep(object):
+    # Each item is a list of addresses to process at once
+    sweep = True
+
+    def __init__(self,
+                 verbosity: int,
+                 timeout: int,
+                 ports: list,
+                 max_connections: int):
+        self.verbosity = verbosity
+        self.timeout = timeout
+        self.ports = ports
+        # Keep some descriptors available for the process
+        limit = get_descriptors_limit()
+        self.max_connections = (min(max_connections, limit)
+                                if limit
+                                else max_connections)
+
+    def get_tokens(self,
+                   destinations: list) -> int:
+        """
+        Get the rate limiter tokens for a sweep, a token for each packet
+        :param destinations: list of addresses in the sweep
+        :return: number of TCP connections to the destinations
+        """
+        return len(destinations) * len(self.ports)
+
+    def execute(self,
+                destinations: list) -> list:
+        """
+        Connect to many ports of many IP addresses at once using
+        non-blocking TCP connections
+        """
+        # Print destinations for verbosity >= 2
+        if self.verbosity >= 2:
+            for destination in destinations:
+                print(destination)
+        states = {destination: {'open': [], 'closed': [], 'filtered': []}
+                  for destination in destinations}
+        latencies = {destination: {} for destination in destinations}
+        # Spread the connections for each port across the addresses
+        connections = ((destination, port)
+                       for port in self.ports
+                       for destination in destinations)
+        # Running connections by their start time
+        running = collections.OrderedDict()
+        selector = selectors.DefaultSelector()
+        try:
+            while True:
+                # Start new connections up to the maximum connections
+                for destination, port in connections:
+                    self.connect(selector=selector,
+                                 destination=destination,
+                                 port=port,
+                                 running=running,
+                                 states=states,
+                                 latencies=latencies)
+                    if len(running) >= self.max_connections:
+                        break
+                if not running:
+                    break
+                # Wait for the first connection to complete or to expire
+                oldest = next(iter(running.values()))[2]
+                for key, _ in selector.select(
+                        timeout=max(oldest + self.timeout -
+                                    time.monotonic(), 0)):
+                    self.complete(selector=selector,
+                                  sock=key.fileobj,
+                                  running=running,
+                                  states=states,
+                                  latencies=latencies)
+                # Set the expired connections as filtered
+                now = time.monotonic()
+                while running:
+                    sock, (destination, port, start) = next(
+                        iter(running.items()))
+                    if start + self.timeout > now:
+                        break
+                    states[destination]['filtered'].append(port)
+                    del running[sock]
+                    selector.unregister(sock)
+                    sock.close()
+        finally:
+            for sock in running:
+                selector.unregister(sock)
+                sock.close()
+            selector.close()
+        results = []
+        for destination in destinations:
+            status = bool(states[destination]['open'])
+            results.append((destination, {
+                'connected': status,
+                'status': status,
+                'timestamp': datetime.datetime.now().timestamp(),
+                'open': sorted(states[destination]['open']),
+                'closed': sorted(states[destination]['closed']),
+                'filtered': sorted(states[destination]['filtered']),
+                'latency': latencies[destination],
+            }))
+        return results
+
+    def connect(self,
+                selector: selectors.BaseSelector,
+                destination: str,
+                port: int,
+                running: collections.OrderedDict,
+                states: dict,
+                latencies: dict) -> None:
+        """
+        Start a non-blocking connection
+        """
+        sock = socket.socket(family=socket.AF_INET,
+                             type=socket.SOCK_STREAM,
+                             proto=socket.IPPROTO_TCP)
+        sock.setblocking(False)
+        start = time.monotonic()
+        error = sock.connect_ex((destination, port))
+        if error in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+            running[sock] = (destination, port, start)
+            selector.register(sock, selectors.EVENT_WRITE)
+        else:
+            # Connection completed immediately
+            self.set_state(destination=destination,
+                           port=port,
+                           error=error,
+                           latency=time.monotonic() - start,
+                           states=states,
+                           latencies=latencies)
+            sock.close()
+
+    def complete(self,
+                 selector: selectors.BaseSelector,
+                 sock: socket.socket,
+                 running: collections.OrderedDict,
+                 states: dict,
+                 latencies: dict) -> None:
+        """
+        Complete a non-blocking connection
+        """
+        destination, port, start = running.pop(sock)
+        error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        self.set_state(destination=destination,
+                       port=port,
+                       error=error,
+                       latency=time.monotonic() - start,
+                       states=states,
+                       latencies=latencies)
+        selector.unregister(sock)
+        sock.close()
+
+    def set_state(self,
+                  destination: str,
+                  port: int,
+                  error: int,
+                  latency: float,
+                  states: dict,
+                  latencies: dict) -> None:
+        """
+        Set the port state from the connection error
+        """
+        if error == 0:
+            states[destination]['open'].append(port)
+            latencies[destination][port] = round(latency * 1000, 2)
+        elif error == errno.ECONNREFUSED:
+            states[destination]['closed'].append(port)
+        else:
+            # Unreachable or timed out
+            states[destination]['filtered'].append(port)
@@ -0,0 +1,244 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+import datetime
+import hashlib
+import os
+import random
+import select
+import socket
+import struct
+import time
+
+from netscanner.tools.icmp_sweep import get_checksum
+
+# TCP flags
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_ACK = 0x10
+
+
+def get_source_address(destination: str) -> str:
+    """
+    Get the local address used to reach the destination, without sending
+    any packet
+    """
+    sock = socket.socket(family=socket.AF_INET,
+                         type=socket.SOCK_DGRAM)
+    try:
+        sock.connect((destination, 9))
+        return sock.getsockname()[0]
+    finally:
+        sock.close()
+
+
+class TCPSyn(object):
+    # Each item is a list of addresses to process at once
+    sweep = True
+
+    def __init__(self,
+                 verbosity: int,
+                 timeout: int,
+                 ports: list,
+                 interval: float):
+        self.verbosity = verbosity
+        self.timeout = timeout
+        self.ports = ports
+        self.interval = interval
+        # Secret key for the sequence numbers cookies
+        self.secret = os.urandom(16)
+
+    def get_cookie(self,
+                   destination: str,
+                   port: int,
+                   source_port: int) -> int:
+        """
+        Get the initial sequence number for a connection, to match the
+        replies without keeping any state
+        """
+        return int.from_bytes(hashlib.blake2b(
+            socket.inet_aton(destination) + struct.pack('!HH',
+                                                        port,
+                                                        source_port),
+            key=self.secret,
+            digest_size=4).digest(), 'big')
+
+    def get_packet(self,
+                   source: str,
+                   destination: str,
+                   source_port: int,
+                   port: int) -> bytes:
+        """
+        Get the TCP SYN segment for a port
+        """
+        sequence = self.get_cookie(destination=destination,
+                                   port=port,
+                                   source_port=source_port)
+        header = struct.pack('!HHIIBBHHH', source_port, port, sequence, 0,
+                             5 << 4, TCP_SYN, 1024, 0, 0)
+        pseudo_header = struct.pack('!4s4sBBH',
+                                    socket.inet_aton(source),
+                                    socket.inet_aton(destination),
+                                    0, socket.IPPROTO_TCP, len(header))
+        checksum = get_checksum(pseudo_header + header)
+        return header[:16] + struct.pack('!H', checksum) + header[18:]
+
+    def get_tokens(self,
+                   destinations: list) -> int:
+        """
+        Get the rate limiter tokens for a sweep, a token for each packet
+        :param destinations: list of addresses in the sweep
+        :return: number of TCP SYN sent to the destinations
+        """
+        return len(destinations) * len(self.ports)
+
+    def execute(self,
+                destinations: list) -> list:
+        """
+        Send a TCP SYN to many ports of many IP addresses at once using a
+        single raw socket, without completing the connections (requires
+        root access)
+        """
+        # Print destinations for verbosity >= 2
+        if self.verbosity >= 2:
+            for destination in destinations:
+                print(destination)
+        states = {destination: {'open': [], 'closed': [], 'filtered': []}
+                  for destination in destinations}
+        latencies = {destination: {} for destination in destinations}
+        # Send time for each (address, port) without a reply
+        pending = {}
+        source_port = random.randint(32768, 60999)
+        sources = {}
+        sock = socket.socket(family=socket.AF_INET,
+                             type=socket.SOCK_RAW,
+                             proto=socket.IPPROTO_TCP)
+        try:
+            # Spread the requests for each port across the addresses
+            for index, (destination, port) in enumerate(
+                    (destination, port)
+                    for port in self.ports
+                    for destination in destinations):
+                if destination not in sources:
+                    try:
+                        sources[destination] = get_source_address(
+                            destination)
+                    except OSError:
+                        # Unreachable destination
+                        sources[destination] = None
+                if not sources[destination]:
+                    continue
+                packet = self.get_packet(source=sources[destination],
+                                         destination=destination,
+                                         source_port=source_port,
+                                         port=port)
+                pending[(destination, port)] = time.monotonic()
+                try:
+                    sock.sendto(packet, (destination, 0))
+                except OSError:
+                    # Unreachable destination
+                    del pending[(destination, port)]
+                    continue
+                if self.interval:
+                    time.sleep(self.interval)
+                if index % 64 == 63:
+                    # Receive the available replies
+                    self.receive(sock=sock,
+                                 source_port=source_port,
+                                 pending=pending,
+                                 states=states,
+                                 latencies=latencies,
+                                 deadline=0)
+            # Receive the replies until the timeout
+            self.receive(sock=sock,
+                         source_port=source_port,
+                         pending=pending,
+                         states=states,
+                         latencies=latencies,
+                         deadline=time.monotonic() + self.timeout)
+        finally:
+            sock.close()
+        # Any request without a reply is filtered
+        for destination, port in pending:
+            states[destination]['filtered'].append(port)
+        for destination in destinations:
+            if not sources.get(destination):
+                states[destination]['filtered'] = list(self.ports)
+        results = []
+        for destination in destinations:
+            status = bool(states[destination]['open'])
+            results.append((destination, {
+                'connected': status,
+                'status': status,
+                'timestamp': datetime.datetime.now().timestamp(),
+                'open': sorted(states[destination]['open']),
+                'closed': sorted(states[destination]['closed']),
+                'filtered': sorted(states[destination]['filtered']),
+                'latency': latencies[destination],
+            }))
+        return results
+
+    def receive(self,
+                sock: socket.socket,
+                source_port: int,
+                pending: dict,
+                states: dict,
+                latencies: dict,
+                deadline: float) -> None:
+        """
+        Receive the replies for the pending requests until the deadline
+        (0 to receive only the replies already available)
+        :param sock: raw TCP socket
+        :param source_port: TCP source port for the requests
+        :param pending: send time for each (address, port) request
+        :param states: ports states by address, updated
+        :param latencies: open ports latencies by address, updated
+        :param deadline: monotonic time to stop receiving
+        :return: None
+        """
+        while pending:
+            remaining = max(deadline - time.monotonic(), 0)
+            if not select.select([sock], [], [], remaining)[0]:
+                break
+            data = sock.recv(4096)
+            end_time = time.monotonic()
+            header_length = (data[0] & 0x0f) * 4
+            if len(data) < header_length + 20:
+                continue
+            address = socket.inet_ntoa(data[12:16])
+            (port, reply_port, _, ack, _, flags) = struct.unpack(
+                '!HHIIBB', data[header_length:header_length + 14])
+            # Match the reply with its request using the cookie
+            if (reply_port != source_port or
+                    (address, port) not in pending or
+                    ack != (self.get_cookie(destination=address,
+                                            port=port,
+                                            source_port=source_port) +
+                            1) & 0xffffffff):
+                continue
+            start_time = pending.pop((address, port))
+            if flags & (TCP_SYN | TCP_ACK) == TCP_SYN | TCP_ACK:
+                states[address]['open'].append(port)
+                latencies[address][port] = round(
+                    (end_time - start_time) * 1000, 2)
+            elif flags & TCP_RST:
+                states[address]['closed'].append(port)
+            else:
+                # Unexpected reply
+                pending[(address, port)] = start_time
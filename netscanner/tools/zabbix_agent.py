@@ -18,61 +18,71 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 ##
 
+import asyncio
 import datetime
-import socket
-import struct
+
+from netscanner.utils.executors import EXECUTOR_ASYNC
+from netscanner.utils.zabbix_protocol import (ZBX_NOTSUPPORTED,
+                                              ZBXD_ERRORS,
+                                              ZabbixClient)
 
 
 class ZabbixAgent(object):
+    # The items can be awaited concurrently from an event loop
+    executor = EXECUTOR_ASYNC
+
     def __init__(self,
                  verbosity: int,
                  timeout: int,
                  port: int,
-                 items: list):
+                 items: list,
+                 max_connections: int = 3):
         self.verbosity = verbosity
         self.timeout = timeout
         self.port = port
         self.items = items
+        # Connections to the same agent at once
+        self.client = ZabbixClient(timeout=timeout,
+                                   max_connections=max_connections)
 
     def execute(self,
                 destination: str) -> dict:
         """
         Scan a destination for Zabbix Agent values
         """
+        return asyncio.run(self.execute_async(destination))
+
+    async def execute_async(self,
+                            destination: str) -> dict:
+        """
+        Scan a destination for Zabbix Agent values, requesting the items
+        concurrently
+        """
         results = {}
         # Print destination for verbosity >= 2
         if self.verbosity >= 2:
             print(destination)
-        for item in self.items:
-            if self.verbosity >= 3:
+        if self.verbosity >= 3:
+            for item in self.items:
                 print(destination, item)
+        items = list(self.items)
+        if 'agent.ping' in items:
+            # If an error was raised for the ping operation, cancel scan
+            items.remove('agent.ping')
             try:
-                # Connect to the server
-                sock = socket.socket(family=socket.AF_INET,
-                                     type=socket.SOCK_STREAM)
-                sock.settimeout(self.timeout)
-                sock.connect((destination, self.port))
-                # Send data
-                # [HEADER ZBXD][LENGTH 4 bytes][DATA]
-                data = 'ZBXD\1{LENGTH}{DATA}'.format(
-                    LENGTH=struct.pack('<Q', len(item)).decode('utf-8'),
-                    DATA=item)
-                sock.send(data.encode('utf-8'))
-                value = sock.recv(4096).decode('utf-8')
-                # Get results
-                # [HEADER ZBXD][LENGTH 4 bytes][RESERVED 4 bytes][DATA]
-                # https://www.zabbix.com/documentation/4.0/manual/appendix/protocols/header_datalen
-                if value.startswith('ZBXD'):
-                    # Check for unsupported value
-                    if not value[13:].startswith('ZBX_NOTSUPPORTED'):
-                        results[item] = value[13:]
-                sock.close()
-            except (ConnectionRefusedError,
-                    OSError,
-                    socket.timeout):
-                # If an error was raised for the ping operation, cancel scan
-                if item == 'agent.ping':
-                    break
+                value = await self.client.get_value(destination=destination,
+                                                    port=self.port,
+                                                    item='agent.ping')
+            except ZBXD_ERRORS:
+                items = []
+            else:
+                # Check for unsupported value
+                if not value.startswith(ZBX_NOTSUPPORTED):
+                    results['agent.ping'] = value.decode('utf-8',
+                                                         errors='replace')
+        results.update(await self.client.get_values(destination=destination,
+                                                    port=self.port,
+                                                    items=items))
         # Add status
         results['status'] = bool(results)
         # Add timestamp
@@ -0,0 +1,103 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import socket
+import struct
+
+
+def address_to_numeric(address: str) -> int:
+    """
+    Convert an IPv4 address to its numeric form
+    """
+    return struct.unpack('!I', socket.inet_aton(address))[0]
+
+
+def numeric_to_address(value: int) -> str:
+    """
+    Convert a numeric IPv4 address to its dotted form
+    """
+    return socket.inet_ntoa(struct.pack('!I', value))
+
+
+class AddressRange(object):
+    """
+    Range of consecutive IPv4 addresses in numeric form, including both
+    the start and the end addresses.
+    The addresses are expanded in their dotted form only when iterated
+    """
+    __slots__ = ('start', 'end')
+
+    def __init__(self,
+                 start: int,
+                 end: int) -> None:
+        self.start = start
+        self.end = end
+
+    def __iter__(self):
+        for value in range(self.start, self.end + 1):
+            yield numeric_to_address(value)
+
+    def __len__(self) -> int:
+        return self.end - self.start + 1
+
+    def __repr__(self) -> str:
+        return '{START}-{END}'.format(START=numeric_to_address(self.start),
+                                      END=numeric_to_address(self.end))
+
+
+def get_address_chunks(ranges: list,
+                       excluded: set,
+                       chunk_size: int):
+    """
+    Split the addresses ranges in AddressRange objects of at most
+    chunk_size addresses, skipping any excluded address
+    :param ranges: list of (start, end) tuples of numeric addresses
+    :param excluded: set of numeric addresses to skip
+    :param chunk_size: maximum number of addresses for each chunk
+    :return: iterator of AddressRange objects
+    """
+    for start, end in ranges:
+        while start <= end:
+            # Skip the excluded addresses at the range start
+            if start in excluded:
+                start += 1
+                continue
+            # Stop the chunk before the first excluded address
+            chunk_end = min(start + chunk_size - 1, end)
+            for value in range(start + 1, chunk_end + 1):
+                if value in excluded:
+                    chunk_end = value - 1
+                    break
+            yield AddressRange(start=start, end=chunk_end)
+            start = chunk_end + 1
+
+
+def get_chunk_size(count: int,
+                   runners: int,
+                   maximum: int) -> int:
+    """
+    Get a chunk size to split count items for a number of runners, keeping
+    at least four chunks for each runner to balance their load
+    :param count: number of items to split
+    :param runners: number of runners processing the chunks
+    :param maximum: maximum chunk size
+    :return: number of items for each chunk
+    """
+    return max(1, min(maximum, count // (max(runners, 1) * 4)))
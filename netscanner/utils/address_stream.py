@@ -0,0 +1,93 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import queue
+
+
+class AddressStream(object):
+    def __init__(self) -> None:
+        """
+        AddressStream object to pass the addresses found by a running
+        discovery to another discovery, while they are found.
+        The chunks from the stream are None while no address is
+        available and the stream is not yet closed, so the executors can
+        process any other item in the meantime
+        """
+        self.queue = queue.Queue()
+
+    def put(self,
+            addresses: list) -> None:
+        """
+        Add the addresses to the stream
+        """
+        for address in addresses:
+            self.queue.put(address)
+
+    def close(self) -> None:
+        """
+        Close the stream after the last address
+        """
+        self.queue.put(None)
+
+    def get_chunks(self,
+                   size: int):
+        """
+        Get the chunks of the available addresses, up to size addresses
+        for each chunk, until the stream is closed
+        :param size: maximum number of addresses for each chunk
+        :return: iterator of lists of addresses or None if no address
+                 is available yet
+        """
+        while True:
+            try:
+                address = self.queue.get_nowait()
+            except queue.Empty:
+                # No address available yet
+                yield None
+                continue
+            if address is None:
+                # The stream was closed
+                break
+            chunk = [address]
+            while len(chunk) < size:
+                try:
+                    address = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if address is None:
+                    # Keep the closing for the next chunk
+                    self.queue.put(None)
+                    break
+                chunk.append(address)
+            yield chunk
+
+
+def get_items(chunks):
+    """
+    Get the items from the chunks, including None for any chunk still not
+    available
+    :param chunks: iterable of chunks of items (or None)
+    :return: iterator of items or None if no item is available yet
+    """
+    for chunk in chunks:
+        if chunk is None:
+            yield None
+        else:
+            yield from chunk
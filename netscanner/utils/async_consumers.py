@@ -0,0 +1,253 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import asyncio
+import concurrent.futures
+import queue
+import threading
+import time
+import types
+
+from .concurrency import ConcurrencyController
+from .rate_limiter import RateLimiter
+from .task_deadline import get_error_result, get_timeout_result
+
+# Marker for the end of the items
+ITEMS_END = object()
+
+
+class AsyncConsumers(object):
+    def __init__(self) -> None:
+        """
+        AsyncConsumers object to consume the data in the tasks iterable
+        using many coroutines running in a single event loop.
+        The results will be saved in the results queue.
+        """
+        self.tasks = None
+        self.results = queue.Queue()
+        self.thread = None
+        self.error = None
+        self.controller = None
+        self.running = 0
+        self.limiter = None
+        self.buckets = ()
+        self.deadline = 0
+        self.tokens = None
+        self.consumers = []
+        self.exhausted = False
+        self.probes = None
+
+    def execute(self,
+                runners: int,
+                action: types.FunctionType,
+                tasks,
+                controller: ConcurrencyController = None,
+                limiter: RateLimiter = None,
+                buckets: tuple = (),
+                deadline: float = 0,
+                tokens: types.FunctionType = None,
+                probes: threading.Semaphore = None) -> 'AsyncConsumers':
+        """
+        Execute the action for every item in the tasks iterable, keeping
+        at most a number of concurrent actions defined by runners.
+        If a ConcurrencyController is passed, the concurrent actions are
+        adapted by the controller, up to its maximum limit, starting only
+        the coroutines allowed by its current limit and adding more
+        coroutines while the limit grows.
+        Each item will be processed after consuming a token from every
+        limiter bucket in buckets, or the tokens from the tokens function
+        for the item, and it will be cancelled after deadline
+        seconds (0 for no deadline). Any error is saved as a failure result.
+        If a probes semaphore is passed, each action holds it while
+        running, to share the probes at once with other executors.
+        Coroutine functions are awaited directly while any other action
+        is executed in a threads pool owned by the event loop.
+        The event loop is started in a separate thread without waiting
+        for its completion, the results can be consumed using
+        results_as_iterator while the event loop is still running.
+        """
+        self.tasks = tasks
+        self.controller = controller
+        self.limiter = limiter
+        self.buckets = buckets
+        self.deadline = deadline
+        self.tokens = tokens
+        self.probes = probes
+        self.thread = threading.Thread(
+            target=self._run,
+            args=(controller.maximum if controller else runners, action))
+        self.thread.start()
+        return self
+
+    def _run(self,
+             runners: int,
+             action: types.FunctionType) -> None:
+        """
+        Run the event loop until every item was processed
+        """
+        loop = asyncio.new_event_loop()
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(runners, 1))
+        loop.set_default_executor(executor)
+        try:
+            loop.run_until_complete(self._execute(runners=runners,
+                                                  action=action))
+        except Exception as error:
+            # Save the error to raise it again from the calling thread
+            self.error = error
+        finally:
+            loop.close()
+            executor.shutdown(wait=True)
+            # Signal the event loop completion in the results queue
+            self.results.put(None)
+
+    async def _execute(self,
+                       runners: int,
+                       action: types.FunctionType) -> None:
+        """
+        Start the runners coroutines and wait for their completion
+        """
+        # Every runner consumes the same iterator, so each item will
+        # be processed only once
+        items = iter(self.tasks)
+        condition = asyncio.Condition()
+        self.consumers = []
+        self.exhausted = False
+        self._start_runners(runners=(self.controller.limit
+                                     if self.controller
+                                     else runners),
+                            items=items,
+                            action=action,
+                            condition=condition)
+        # Any runner is added by a running runner before its completion
+        index = 0
+        while index < len(self.consumers):
+            await self.consumers[index]
+            index += 1
+
+    def _start_runners(self,
+                       runners: int,
+                       items,
+                       action: types.FunctionType,
+                       condition: asyncio.Condition) -> None:
+        """
+        Start new coroutines until there are runners coroutines, unless
+        the items are already exhausted
+        """
+        while len(self.consumers) < max(runners, 1) and not self.exhausted:
+            self.consumers.append(asyncio.ensure_future(
+                self._consume(items=items,
+                              action=action,
+                              condition=condition)))
+
+    async def _consume(self,
+                       items,
+                       action: types.FunctionType,
+                       condition: asyncio.Condition) -> None:
+        """
+        Process the items until the iterator is exhausted and save the
+        results into the results queue.
+        A None item means no item is available yet from the iterator
+        """
+        loop = asyncio.get_event_loop()
+        while True:
+            if self.controller:
+                # Wait until the controller allows another action
+                async with condition:
+                    await condition.wait_for(
+                        lambda: self.running < self.controller.limit)
+                    self.running += 1
+            item = next(items, ITEMS_END)
+            if item is ITEMS_END:
+                self.exhausted = True
+            # A None item is not yet available from the iterator
+            processed = item is not None and item is not ITEMS_END
+            if processed:
+                if self.buckets:
+                    # Wait for the rate limiter
+                    tokens = self.tokens(item) if self.tokens else 1
+                    delay = self.limiter.get_delay(self.buckets, tokens)
+                    while delay:
+                        await asyncio.sleep(delay)
+                        delay = self.limiter.get_delay(self.buckets, tokens)
+                if self.probes:
+                    # Wait for the shared probes, without blocking the
+                    # event loop
+                    while not self.probes.acquire(blocking=False):
+                        await asyncio.sleep(0.01)
+                started = time.monotonic()
+                if asyncio.iscoroutinefunction(action):
+                    awaitable = action(item)
+                else:
+                    awaitable = loop.run_in_executor(None, action, item)
+                try:
+                    result = await asyncio.wait_for(
+                        awaitable,
+                        timeout=self.deadline or None)
+                except asyncio.TimeoutError:
+                    result = get_timeout_result(self.deadline)
+                except Exception as error:
+                    result = get_error_result(error)
+                finally:
+                    if self.probes:
+                        self.probes.release()
+                self.results.put((item, result))
+            if self.controller:
+                if processed:
+                    self.controller.record(
+                        elapsed=time.monotonic() - started,
+                        status=bool(result and result.get('status')))
+                # Release the action and wake up the waiting runners
+                async with condition:
+                    self.running -= 1
+                    # Add the runners for a grown limit
+                    self._start_runners(runners=self.controller.limit,
+                                        items=items,
+                                        action=action,
+                                        condition=condition)
+                    condition.notify_all()
+            if item is ITEMS_END:
+                break
+            elif item is None:
+                # Wait for the next available item
+                await asyncio.sleep(0.1)
+
+    def results_as_iterator(self):
+        """
+        Consume the results queue while the event loop is running, until
+        the event loop has signaled its completion
+        """
+        while True:
+            result = self.results.get()
+            if result is None:
+                # The event loop has processed all the items
+                break
+            elif result:
+                # Skip any empty value
+                yield result
+        self.thread.join()
+        if self.error:
+            raise self.error
+
+    def results_as_list(self) -> list:
+        """
+        Consume the results queue and convert it to a list
+        """
+        return list(self.results_as_iterator())
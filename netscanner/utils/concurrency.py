@@ -0,0 +1,169 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import math
+import resource
+import time
+
+# File descriptors to keep available for anything else than the probes
+RESERVED_DESCRIPTORS = 64
+
+
+def get_descriptors_limit() -> int:
+    """
+    Get the maximum number of file descriptors available for the probes
+    :return: number of file descriptors or None if unlimited
+    """
+    limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    if limit == resource.RLIM_INFINITY:
+        return None
+    return max(1, limit - RESERVED_DESCRIPTORS)
+
+
+def get_average(average: float,
+                value: float,
+                weight: float = 0.2) -> float:
+    """
+    Get the exponential moving average updated with a new value
+    :param average: current average (None for the first value)
+    :param value: new value to add to the average
+    :param weight: weight for the new value
+    :return: updated average
+    """
+    if average is None:
+        return value
+    return average + (value - average) * weight
+
+
+class ConcurrencyController(object):
+    def __init__(self,
+                 initial: int,
+                 maximum: int,
+                 timeout: float,
+                 minimum: int = 1,
+                 increase: int = 1,
+                 decrease: float = 0.5,
+                 tolerance: float = 0.1,
+                 rtt_factor: float = 2.0,
+                 window: int = 50) -> None:
+        """
+        ConcurrencyController object to adapt the number of probes in
+        flight (AIMD, additive increase and multiplicative decrease).
+        After each window of completed probes the limit is increased if
+        the timeouts rate and the round trip time are stable, otherwise
+        it's decreased.
+        Until the first congested window the limit is doubled instead of
+        being increased (slow start).
+        :param initial: initial number of probes in flight
+        :param maximum: maximum number of probes in flight
+        :param timeout: probes timeout, used to detect timed out probes
+        :param minimum: minimum number of probes in flight
+        :param increase: probes to add for each stable window
+        :param decrease: limit multiplier for each congested window
+        :param tolerance: timeouts rate increase over the stable windows
+                          to consider a window as congested
+        :param rtt_factor: round trip time multiplier over the stable
+                           windows to consider a window as congested
+        :param window: minimum number of probes for each window after
+                       the slow start
+        """
+        # Limit the probes by the available file descriptors
+        descriptors = get_descriptors_limit()
+        if descriptors is not None:
+            maximum = min(maximum, descriptors)
+        self.minimum = max(1, min(minimum, maximum))
+        self.maximum = max(self.minimum, maximum)
+        self.limit = max(self.minimum, min(initial, self.maximum))
+        self.timeout = timeout
+        self.increase = increase
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.rtt_factor = rtt_factor
+        self.window = window
+        self.slow_start = True
+        # Average timeouts rate and round trip time of the stable windows
+        self.stable_timeouts = None
+        self.stable_rtt = None
+        # Current window counters
+        self.probes = 0
+        self.timeouts = 0
+        self.rtt_count = 0
+        self.rtt_total = 0.0
+        # Concurrency curve with the elapsed seconds and the limit
+        self.started = time.monotonic()
+        self.history = [(0.0, self.limit)]
+
+    def record(self,
+               elapsed: float,
+               status: bool) -> None:
+        """
+        Record a completed probe
+        :param elapsed: seconds elapsed for the probe
+        :param status: True if the probe has received a response
+        """
+        self.probes += 1
+        if status:
+            self.rtt_count += 1
+            self.rtt_total += elapsed
+        elif not self.timeout or elapsed >= self.timeout * 0.9:
+            # Failed probe which has waited for the whole timeout
+            self.timeouts += 1
+        # During the slow start each window lasts a single round of probes
+        if self.probes >= (self.limit
+                           if self.slow_start
+                           else max(self.limit, self.window)):
+            self.update()
+
+    def update(self) -> None:
+        """
+        Update the limit using the current window counters
+        """
+        timeouts = self.timeouts / self.probes
+        rtt = self.rtt_total / self.rtt_count if self.rtt_count else None
+        congested = False
+        if self.stable_timeouts is not None:
+            # Allow more variance for the smaller windows
+            variance = self.stable_timeouts * (1 - self.stable_timeouts)
+            congested = timeouts > (self.stable_timeouts + self.tolerance +
+                                    2 * math.sqrt(variance / self.probes))
+        if rtt is not None and self.stable_rtt is not None:
+            congested = congested or rtt > self.stable_rtt * self.rtt_factor
+        if congested:
+            limit = max(self.minimum, int(self.limit * self.decrease))
+            self.slow_start = False
+        elif self.slow_start:
+            limit = min(self.maximum, self.limit * 2)
+        else:
+            limit = min(self.maximum, self.limit + self.increase)
+        if not congested:
+            # Update the moving averages of the stable windows
+            self.stable_timeouts = get_average(self.stable_timeouts,
+                                               timeouts)
+            if rtt is not None:
+                self.stable_rtt = get_average(self.stable_rtt, rtt)
+        if limit != self.limit:
+            self.limit = limit
+            self.history.append((round(time.monotonic() - self.started, 3),
+                                 self.limit))
+        # Start a new window
+        self.probes = 0
+        self.timeouts = 0
+        self.rtt_count = 0
+        self.rtt_total = 0.0
@@ -18,40 +18,105 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 ##
 
+import ctypes
 import multiprocessing
-import queue
-import types
+import multiprocessing.connection
+import signal
+import time
+
+from .rate_limiter import RateLimiter
+from .results_pipe import ResultsWriter
+from .task_deadline import execute_with_deadline
+
+# Message to add the action for a job
+MESSAGE_JOB = 0
+# Message to process a chunk of items for a job
+MESSAGE_TASK = 1
+# Message to remove the action for a completed job
+MESSAGE_FORGET = 2
 
 
 class Consumer(multiprocessing.Process):
     """
-    Consumer object to perform an action over any item in the tasks
-    queue and save the results in the results queue
+    Consumer object to perform the jobs actions over any item received
+    from the connection and send back the results using the same connection
     """
     def __init__(self,
-                 tasks_queue: multiprocessing.JoinableQueue,
-                 results_queue: queue.Queue,
-                 action: types.FunctionType) -> None:
+                 connection: multiprocessing.connection.Connection,
+                 batch_size: int,
+                 flush_interval: float,
+                 max_tasks: int,
+                 limiter: RateLimiter,
+                 started: ctypes.c_double) -> None:
         multiprocessing.Process.__init__(self)
-        self.tasks = tasks_queue
-        self.results = results_queue
-        # Action to perform for each item
-        self.action = action
+        self.connection = connection
+        # Results batching
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Number of tasks to process before exiting (0 for unlimited)
+        self.max_tasks = max_tasks
+        # Rate limiter shared with the other consumers
+        self.limiter = limiter
+        # Start time of the current action (0 if idle), shared with the
+        # pool to detect any hung action
+        self.started = started
 
     def run(self) -> None:
         """
-        Process the data in the tasks queue until a stopper value is
-        found and save the results into the results queue
+        Process the messages from the connection until a stopper value is
+        found or the maximum number of tasks was processed.
+        The actions for each job are received only once, before the first
+        task of the job, and they are kept until the job is forgotten.
+        Each item is processed only after its tokens were consumed from the
+        job rate limiter buckets, if any, and it's interrupted after the
+        job deadline. Any error is sent as a failure result.
+        The results for each task are sent in batches followed by the
+        end of stream for the task
         """
+        # Restore the default termination signal, as the parent process
+        # could have replaced it
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        actions = {}
+        processed = 0
         while True:
-            # Get an item from the queue to process
-            item = self.tasks.get()
-            # If the item is the stopper value, break the cycle
-            if item is None:
-                self.tasks.task_done()
+            # Get a message from the connection to process
+            message = self.connection.recv()
+            # If the message is the stopper value, break the cycle
+            if message is None:
                 break
-            # Get the result from the action and put into the queue
-            result = self.action(item)
-            self.results.put((item, result))
-            self.tasks.task_done()
+            if message[0] == MESSAGE_JOB:
+                # Save the action to perform for the job tasks
+                _, job_id, action, buckets, deadline, tokens = message
+                actions[job_id] = (action, buckets, deadline, tokens)
+            elif message[0] == MESSAGE_FORGET:
+                # Remove the action for a completed job
+                actions.pop(message[1], None)
+            elif message[0] == MESSAGE_TASK:
+                _, job_id, task_id, chunk = message
+                action, buckets, deadline, tokens = actions[job_id]
+                results = ResultsWriter(connection=self.connection,
+                                        batch_size=self.batch_size,
+                                        flush_interval=self.flush_interval,
+                                        stream=task_id)
+                # Expand the chunk locally and process each item
+                for item in chunk:
+                    if buckets:
+                        # Wait for the rate limiter
+                        self.limiter.acquire(buckets,
+                                             tokens(item) if tokens else 1)
+                    # Get the result from the action and add it to the results
+                    self.started.value = time.monotonic()
+                    result = execute_with_deadline(action=action,
+                                                   item=item,
+                                                   deadline=deadline)
+                    self.started.value = 0
+                    results.put((item, result))
+                # Send the remaining results and the end of the task
+                results.close()
+                processed += 1
+                # Exit after the maximum number of tasks to release
+                # the memory used by the process
+                if self.max_tasks and processed >= self.max_tasks:
+                    break
+        self.connection.close()
         return
@@ -18,60 +18,479 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 ##
 
+import collections
+import itertools
 import multiprocessing
+import multiprocessing.connection
+import threading
+import time
 import types
 
-from .consumer import Consumer
+from .consumer import Consumer, MESSAGE_FORGET, MESSAGE_JOB, MESSAGE_TASK
+from .rate_limiter import RateLimiter
+from .results_pipe import RESULTS_END
+from .task_deadline import get_failure_result
+
+# Seconds to wait for each Consumer to exit after closing the pool
+CLOSE_TIMEOUT = 5.0
+
+
+class ConsumerHandle(object):
+    def __init__(self,
+                 consumer: Consumer,
+                 connection: multiprocessing.connection.Connection) -> None:
+        """
+        ConsumerHandle object to keep the state of a running Consumer
+        """
+        self.consumer = consumer
+        self.connection = connection
+        # Jobs whose action was already sent to the consumer
+        self.jobs = set()
+        # Tasks sent to the consumer and not yet completed
+        self.tasks = {}
+        # Number of tasks sent to the consumer
+        self.sent = 0
+
+
+class ConsumerTask(object):
+    def __init__(self,
+                 job: 'ConsumersJob',
+                 chunk,
+                 retry: bool) -> None:
+        """
+        ConsumerTask object to keep the state of a task sent to a Consumer
+        """
+        self.job = job
+        self.chunk = chunk
+        # The task is a retry for an item from a failed Consumer
+        self.retry = retry
+        # Number of results received for the task
+        self.received = 0
+
+
+class ConsumersJob(object):
+    def __init__(self,
+                 consumers: 'Consumers',
+                 job_id: int,
+                 runners: int,
+                 action: types.FunctionType,
+                 tasks,
+                 buckets: tuple,
+                 deadline: float,
+                 tokens: types.FunctionType = None) -> None:
+        """
+        ConsumersJob object to execute an action over the items in the
+        tasks iterable using at most a number of consumers defined by
+        runners.
+        Each task is a chunk of items (like a list or an AddressRange) to
+        be expanded and processed by a single consumer, limiting the
+        probes rate by the rate limiter buckets and interrupting each
+        item after deadline seconds (0 for no deadline).
+        The tokens function gets the rate limiter tokens for each item
+        (None for a single token)
+        """
+        self.consumers = consumers
+        self.job_id = job_id
+        self.runners = runners
+        self.action = action
+        self.tasks = iter(tasks)
+        self.buckets = buckets
+        self.deadline = deadline
+        self.tokens = tokens
+        # No more tasks to dispatch
+        self.exhausted = False
+        # No task available yet from the tasks iterator
+        self.waiting = False
+        # Tasks to dispatch again, with their retry status
+        self.retries = collections.deque()
+        # Results received and not yet consumed
+        self.results = collections.deque()
+        # Consumers having tasks of this job
+        self.handles = set()
+
+    @property
+    def finished(self) -> bool:
+        """
+        Check if every task was dispatched and completed
+        """
+        return self.exhausted and not self.retries and not self.handles
+
+    def next_task(self) -> tuple:
+        """
+        Get the next task to dispatch, giving precedence to the retries.
+        A None task from the tasks iterator means no task is available yet
+        :return: tuple with a boolean value for a valid task, the task
+                 and its retry status
+        """
+        if self.retries:
+            return (True, ) + self.retries.popleft()
+        try:
+            task = next(self.tasks)
+        except StopIteration:
+            self.exhausted = True
+            return False, None, False
+        self.waiting = task is None
+        return not self.waiting, task, False
+
+    def results_as_iterator(self):
+        """
+        Get the results while the job is running, until every task was
+        completed
+        """
+        return self.consumers.results_as_iterator(job=self)
 
 
 class Consumers(object):
     def __init__(self,
-                 tasks_queue: multiprocessing.JoinableQueue) -> None:
+                 batch_size: int = 256,
+                 flush_interval: float = 0.2,
+                 max_tasks: int = 0,
+                 prefetch: int = 2,
+                 max_consumers: int = 0,
+                 max_probes: int = 0) -> None:
         """
-        Consumers object to collect many Consumer objects to consume
-        the data in the tasks queue.
-        The results will be saved in the results queue.
+        Consumers object to keep a pool of Consumer processes, reused for
+        every job executed until the pool is closed.
+        Each Consumer sends its results in batches of batch_size results
+        or after flush_interval seconds, using its own pipe, and it is
+        replaced by a new Consumer after max_tasks tasks (0 for never).
+        Up to prefetch tasks are sent to each Consumer in advance.
+        The pool is limited to max_consumers Consumers (0 for unlimited),
+        shared by every job executed at the same time from many threads.
+        The probes of the threads and async executors of every job are
+        limited together to max_probes probes at once (0 for unlimited),
+        as they are not running in the Consumers.
+        The rate limiter is shared by every Consumer and every job.
+        Any Consumer terminated unexpectedly or hung for more than twice
+        the job deadline is replaced, and its unprocessed items are
+        dispatched again one by one; an item failing again gets a failure
+        result.
         """
-        self.tasks = tasks_queue
-        # A multiprocessing.Queue hangs indefinitively during the
-        # fill using self.results.put(...) as it appears to be locked
-        # even if no others processes or threads are using it.
-        # The multiprocessing.Manager().Queue() send the data from the
-        # queue at once, resulting in no lock during the put operation.
-        # https://bugs.python.org/issue29797
-        self.results = multiprocessing.Manager().Queue()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_tasks = max_tasks
+        self.prefetch = prefetch
+        self.max_consumers = max_consumers
+        self.handles = []
+        # Running jobs, whose tasks are dispatched together
+        self.jobs = []
+        # Only a thread at once can dispatch and receive the results
+        self.lock = threading.Lock()
+        self.jobs_ids = itertools.count(1)
+        self.tasks_ids = itertools.count(1)
+        # The rate limiter must exist before starting the consumers
+        self.limiter = RateLimiter()
+        # Concurrent probes of the threads and async executors
+        self.probes = (threading.BoundedSemaphore(max_probes)
+                       if max_probes
+                       else None)
+        # No more consumers are started after closing the pool
+        self.closed = False
+
+    def __enter__(self) -> 'Consumers':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
 
     def execute(self,
                 runners: int,
-                action: types.FunctionType) -> None:
-        """
-        Instance a number of Consumer objects defined by runner and
-        for each one execute the action function.
-        The tasks queue is automatically join to wait the completion.
-        All the results at the end can be find in the results queue.
-        """
-        # Define consumers
-        consumers = []
-        for _ in range(1, runners + 1):
-            # Create a new Consumer object and start it
-            consumers.append(Consumer(tasks_queue=self.tasks,
-                                      results_queue=self.results,
-                                      action=action))
-            # For each consumer add a stopper value to exit from loop
-            self.tasks.put(None)
-        for consumer in consumers:
-            consumer.start()
-        # Wait until the the queue is empty
-        self.tasks.join()
-
-    def results_as_list(self) -> list:
-        """
-        Consume the results queue and convert it to a list
-        """
-        results = []
-        while not self.results.empty():
-            result = self.results.get()
-            # Skip any empty value
-            if result:
-                results.append(result)
-        return results
+                action: types.FunctionType,
+                tasks,
+                buckets: tuple = (),
+                deadline: float = 0,
+                tokens: types.FunctionType = None) -> ConsumersJob:
+        """
+        Prepare a job to execute the action for every item in the chunks
+        from the tasks iterable, using a number of consumers defined by
+        runners.
+        Each item will be processed after consuming a token from every
+        rate limiter bucket in buckets, or the tokens from the tokens
+        function for the item, and it will be interrupted after deadline
+        seconds (0 for no deadline).
+        The pool is enlarged if it has less consumers than runners.
+        The tasks are dispatched while the results are consumed using the
+        job results_as_iterator
+        """
+        runners = max(runners, 1)
+        if self.max_consumers:
+            runners = min(runners, self.max_consumers)
+        with self.lock:
+            if self.closed:
+                raise RuntimeError('The consumers pool is closed')
+            while len(self.handles) < runners:
+                self.start_consumer()
+            job = ConsumersJob(consumers=self,
+                               job_id=next(self.jobs_ids),
+                               runners=runners,
+                               action=action,
+                               tasks=tasks,
+                               buckets=buckets,
+                               deadline=deadline,
+                               tokens=tokens)
+            self.jobs.append(job)
+        return job
+
+    def start_consumer(self) -> ConsumerHandle:
+        """
+        Start a new Consumer and add it to the pool, unless the pool was
+        already closed
+        """
+        if self.closed:
+            return None
+        connection, consumer_connection = multiprocessing.Pipe()
+        started = multiprocessing.RawValue('d', 0)
+        consumer = Consumer(connection=consumer_connection,
+                            batch_size=self.batch_size,
+                            flush_interval=self.flush_interval,
+                            max_tasks=self.max_tasks,
+                            limiter=self.limiter,
+                            started=started)
+        consumer.start()
+        # Close the consumer side in this process, so a terminated
+        # consumer will be detected as a closed connection
+        consumer_connection.close()
+        handle = ConsumerHandle(consumer=consumer,
+                                connection=connection)
+        self.handles.append(handle)
+        return handle
+
+    def is_retiring(self,
+                    handle: ConsumerHandle) -> bool:
+        """
+        Check if the consumer has received its maximum number of tasks
+        """
+        return bool(self.max_tasks) and handle.sent >= self.max_tasks
+
+    def is_hung(self,
+                handle: ConsumerHandle) -> bool:
+        """
+        Check if the consumer is processing an item for more than twice
+        the deadline of its job
+        """
+        if handle.tasks and handle.consumer.started.value:
+            # The first task is the one being processed
+            deadline = next(iter(handle.tasks.values())).job.deadline
+            return bool(deadline) and (
+                time.monotonic() - handle.consumer.started.value >
+                deadline * 2)
+        return False
+
+    def dispatch(self,
+                 job: ConsumersJob) -> None:
+        """
+        Send the job tasks to the available consumers
+        """
+        for handle in list(self.handles):
+            while (len(handle.tasks) < self.prefetch and
+                    not self.is_retiring(handle) and
+                    (handle in job.handles or
+                     len(job.handles) < job.runners)):
+                # Send the job action only to an idle consumer, as the
+                # action could be larger than the pipe buffer
+                if job.job_id not in handle.jobs and handle.tasks:
+                    break
+                valid, chunk, retry = job.next_task()
+                if not valid:
+                    # No more tasks available to dispatch
+                    return
+                task_id = next(self.tasks_ids)
+                try:
+                    if job.job_id not in handle.jobs:
+                        handle.connection.send((MESSAGE_JOB,
+                                                job.job_id,
+                                                job.action,
+                                                job.buckets,
+                                                job.deadline,
+                                                job.tokens))
+                        handle.jobs.add(job.job_id)
+                    handle.connection.send((MESSAGE_TASK,
+                                            job.job_id,
+                                            task_id,
+                                            chunk))
+                except OSError:
+                    # The consumer has terminated, dispatch the task again
+                    job.retries.appendleft((chunk, retry))
+                    self.fail_consumer(handle=handle,
+                                       error='Consumer terminated')
+                    break
+                handle.tasks[task_id] = ConsumerTask(job=job,
+                                                     chunk=chunk,
+                                                     retry=retry)
+                handle.sent += 1
+                job.handles.add(handle)
+
+    def complete_task(self,
+                      handle: ConsumerHandle,
+                      task_id: int) -> None:
+        """
+        Remove a completed task from the consumer and replace the consumer
+        when it has completed its maximum number of tasks
+        """
+        job = handle.tasks.pop(task_id).job
+        if job not in (task.job for task in handle.tasks.values()):
+            job.handles.discard(handle)
+        if self.is_retiring(handle) and not handle.tasks:
+            # The consumer has exited after its last task
+            self.handles.remove(handle)
+            handle.consumer.join()
+            handle.connection.close()
+            self.start_consumer()
+
+    def fail_consumer(self,
+                      handle: ConsumerHandle,
+                      error: str) -> None:
+        """
+        Replace a terminated or hung consumer and dispatch again the items
+        from its tasks whose results were not received.
+        Each item is dispatched alone, so an item failing again can be
+        identified and it gets a failure result
+        """
+        self.handles.remove(handle)
+        if handle.consumer.is_alive():
+            handle.consumer.terminate()
+        handle.consumer.join()
+        handle.connection.close()
+        for task in handle.tasks.values():
+            remaining = itertools.islice(task.chunk, task.received, None)
+            if task.retry:
+                # The item has failed again
+                task.job.results.extend(
+                    (item, get_failure_result(error)) for item in remaining)
+            else:
+                task.job.retries.extend(([item], True) for item in remaining)
+            task.job.handles.discard(handle)
+        self.start_consumer()
+
+    def results_as_iterator(self,
+                            job: ConsumersJob):
+        """
+        Dispatch the job tasks and receive the results from the consumers
+        while they are running, until every task was completed.
+        Many jobs can be consumed at the same time from different threads,
+        a single thread at once receives the results for every job.
+        A RuntimeError is raised if the pool is closed while the job is
+        still running, so the job is not mistaken for a completed one
+        """
+        while True:
+            with self.lock:
+                if self.closed:
+                    # The pool was closed while the job was running
+                    if job in self.jobs:
+                        self.jobs.remove(job)
+                    raise RuntimeError('The consumers pool was closed')
+                self.receive(job)
+                results = job.results
+                job.results = collections.deque()
+                finished = job.finished
+                if finished:
+                    self.forget(job)
+            for result in results:
+                # Skip any empty value
+                if result:
+                    yield result
+            if finished:
+                break
+
+    def receive(self,
+                job: ConsumersJob) -> None:
+        """
+        Dispatch the tasks for every running job and wait for the results,
+        until some results for the job are available
+        """
+        for running_job in list(self.jobs):
+            self.dispatch(running_job)
+        # Rotate the jobs to share the consumers between them
+        if len(self.jobs) > 1:
+            self.jobs.append(self.jobs.pop(0))
+        if job.results or job.finished:
+            return
+        handles = {handle.connection: handle
+                   for handle in self.handles
+                   if handle.tasks}
+        if len(self.jobs) > 1 or job.waiting:
+            # Dispatch periodically the tasks for the other jobs or the
+            # tasks not yet available
+            timeout = 0.2
+        elif any(task.job.deadline
+                 for handle in handles.values()
+                 for task in handle.tasks.values()):
+            # Check periodically for hung consumers when using a deadline
+            timeout = 1.0
+        else:
+            timeout = None
+        for connection in multiprocessing.connection.wait(handles, timeout):
+            handle = handles[connection]
+            try:
+                message, task_id, batch = connection.recv()
+            except (EOFError, OSError):
+                # The consumer has terminated unexpectedly
+                self.fail_consumer(handle=handle,
+                                   error='Consumer terminated')
+                continue
+            task = handle.tasks[task_id]
+            task.received += len(batch)
+            task.job.results.extend(batch)
+            if message == RESULTS_END:
+                self.complete_task(handle=handle,
+                                   task_id=task_id)
+        for handle in list(self.handles):
+            if self.is_hung(handle):
+                self.fail_consumer(handle=handle,
+                                   error='Timeout for hung consumer')
+
+    def forget(self,
+               job: ConsumersJob) -> None:
+        """
+        Remove a completed job and its action from the consumers
+        """
+        self.jobs.remove(job)
+        for handle in self.handles:
+            if job.job_id in handle.jobs:
+                self.send(handle=handle,
+                          message=(MESSAGE_FORGET, job.job_id))
+                handle.jobs.remove(job.job_id)
+
+    def send(self,
+             handle: ConsumerHandle,
+             message) -> None:
+        """
+        Send a message to a consumer, ignoring any terminated consumer
+        """
+        try:
+            handle.connection.send(message)
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        """
+        Stop every consumer in the pool.
+        Other threads could still be receiving the results, so no more
+        consumers will be started to replace the failed ones and any
+        consumer not exited in time is terminated
+        """
+        # A thread could be waiting for the results holding the lock
+        locked = self.lock.acquire(timeout=CLOSE_TIMEOUT)
+        try:
+            self.closed = True
+            handles = list(self.handles)
+            if locked:
+                for handle in handles:
+                    # Send the stopper value to exit from loop
+                    self.send(handle=handle,
+                              message=None)
+        finally:
+            if locked:
+                self.lock.release()
+        for handle in handles:
+            if locked:
+                handle.consumer.join(CLOSE_TIMEOUT)
+            if handle.consumer.is_alive():
+                handle.consumer.terminate()
+            handle.consumer.join(CLOSE_TIMEOUT)
+        # Any thread waiting for the results was woken by the consumers
+        # exit and it will stop as the pool is closed
+        with self.lock:
+            for handle in handles + self.handles:
+                handle.connection.close()
+            self.handles = []
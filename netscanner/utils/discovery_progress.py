@@ -0,0 +1,132 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+import bisect
+import json
+import uuid
+
+from netscanner.utils.address_chunks import address_to_numeric
+
+# Progress value for a run completed without interruptions
+PROGRESS_FINISHED = 'finished'
+
+
+class DiscoveryProgress(object):
+    def __init__(self,
+                 discovery,
+                 run_id: str = None,
+                 resume: bool = False) -> None:
+        """
+        DiscoveryProgress object to save the completed addresses of a
+        running discovery, as ranges of numeric addresses, so a stopped
+        discovery can be resumed without probing the completed addresses
+        again.
+        A discovery is resumed only if its last run has the same run id
+        (if any run id is requested), otherwise a new run is started.
+        A finished run is never resumed, unless the same run id was
+        requested (like for a sequence resumed after the discovery was
+        finished), and a new run is started instead
+        :param discovery: Discovery object to save the progress for
+        :param run_id: run id to resume or to start (None for any)
+        :param resume: continue the last run of the discovery
+        """
+        self.discovery = discovery
+        self.completed = set()
+        # Sorted ranges of completed addresses and their starts
+        self.ranges = []
+        self.starts = []
+        self.resumed = (resume and
+                        bool(discovery.run_id) and
+                        run_id in (None, discovery.run_id))
+        # The requested run was already finished
+        self.finished = (self.resumed and
+                         discovery.progress == PROGRESS_FINISHED)
+        if self.finished and run_id is None:
+            # Start a new run after a finished standalone run
+            self.resumed = False
+            self.finished = False
+        if self.finished:
+            # Nothing to load, every address was already completed
+            pass
+        elif self.resumed:
+            # Load the completed addresses from the last run
+            self.ranges = json.loads(discovery.progress or '[]')
+            self.starts = [start for start, _ in self.ranges]
+            for start, end in self.ranges:
+                self.completed.update(range(start, end + 1))
+        else:
+            # Start a new run
+            discovery.run_id = run_id or uuid.uuid4().hex
+            discovery.progress = ''
+            discovery.save(update_fields=['run_id', 'progress'])
+
+    def is_completed(self,
+                     address: str) -> bool:
+        """
+        Check if an address was already completed
+        """
+        return address_to_numeric(address) in self.completed
+
+    def add_value(self,
+                  value: int) -> None:
+        """
+        Add a numeric address to the completed ranges, merging it with the
+        adjacent ranges
+        """
+        index = bisect.bisect_right(self.starts, value)
+        if index and self.ranges[index - 1][1] >= value:
+            # Already in the previous range
+            return
+        extend_previous = (index > 0 and
+                           self.ranges[index - 1][1] == value - 1)
+        extend_next = (index < len(self.ranges) and
+                       self.ranges[index][0] == value + 1)
+        if extend_previous and extend_next:
+            # Join the previous and the next ranges
+            self.ranges[index - 1][1] = self.ranges[index][1]
+            del self.ranges[index]
+            del self.starts[index]
+        elif extend_previous:
+            self.ranges[index - 1][1] = value
+        elif extend_next:
+            self.ranges[index][0] = value
+            self.starts[index] = value
+        else:
+            self.ranges.insert(index, [value, value])
+            self.starts.insert(index, value)
+
+    def update(self,
+               addresses: list) -> None:
+        """
+        Add the addresses to the completed addresses and save the progress
+        """
+        for address in addresses:
+            value = address_to_numeric(address)
+            if value not in self.completed:
+                self.completed.add(value)
+                self.add_value(value)
+        self.discovery.progress = json.dumps(self.ranges)
+        self.discovery.save(update_fields=['progress'])
+
+    def finish(self) -> None:
+        """
+        Mark the run as finished, so it will not be resumed
+        """
+        self.discovery.progress = PROGRESS_FINISHED
+        self.discovery.save(update_fields=['progress'])
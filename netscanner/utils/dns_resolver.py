@@ -0,0 +1,484 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+import asyncio
+import atexit
+import contextlib
+import fcntl
+import json
+import os
+import random
+import socket
+import struct
+import threading
+import time
+
+# DNS record types and classes
+DNS_TYPE_PTR = 12
+DNS_CLASS_IN = 1
+# DNS response codes
+DNS_RCODE_NOERROR = 0
+DNS_RCODE_NXDOMAIN = 3
+# Receive buffer for the responses to many concurrent queries
+RECEIVE_BUFFER_SIZE = 1048576
+# Write the cached names after the number of names or seconds
+FLUSH_SIZE = 256
+FLUSH_INTERVAL = 1.0
+
+
+def get_nameservers(path: str = '/etc/resolv.conf') -> list:
+    """
+    Get the IPv4 nameservers from the resolver configuration
+    :param path: resolver configuration file
+    :return: list of (address, port) tuples
+    """
+    nameservers = []
+    try:
+        with open(path, 'r') as file:
+            for line in file:
+                fields = line.split()
+                if len(fields) >= 2 and fields[0] == 'nameserver':
+                    try:
+                        socket.inet_aton(fields[1])
+                    except OSError:
+                        # Skip the IPv6 nameservers
+                        continue
+                    nameservers.append((fields[1], 53))
+    except OSError:
+        pass
+    return nameservers
+
+
+def get_nameserver(value: str) -> tuple:
+    """
+    Get the (address, port) tuple for a nameserver like 127.0.0.1:5353
+    """
+    address, _, port = value.partition(':')
+    return address, int(port or 53)
+
+
+def get_ptr_name(address: str) -> str:
+    """
+    Get the PTR record name for an IPv4 address
+    """
+    return '.'.join(reversed(address.split('.'))) + '.in-addr.arpa'
+
+
+def build_query(query_id: int,
+                name: str) -> bytes:
+    """
+    Build a DNS PTR query with recursion desired
+    """
+    header = struct.pack('!HHHHHH', query_id, 0x0100, 1, 0, 0, 0)
+    question = b''.join(struct.pack('!B', len(label)) + label.encode('ascii')
+                        for label in name.split('.'))
+    return header + question + struct.pack('!BHH', 0, DNS_TYPE_PTR,
+                                           DNS_CLASS_IN)
+
+
+def read_name(data: bytes,
+              offset: int) -> tuple:
+    """
+    Read a (possibly compressed) name from a DNS message
+    :param data: DNS message
+    :param offset: name offset
+    :return: tuple with the name and the offset after the name
+    """
+    labels = []
+    end = None
+    for _ in range(128):
+        length = data[offset]
+        if length & 0xc0 == 0xc0:
+            # Pointer to another name
+            if end is None:
+                end = offset + 2
+            offset = struct.unpack('!H', data[offset:offset + 2])[0] & 0x3fff
+        elif length:
+            labels.append(data[offset + 1:offset + 1 + length].decode(
+                'ascii', errors='replace'))
+            offset += 1 + length
+        else:
+            return '.'.join(labels), end if end is not None else offset + 1
+    raise ValueError('Too many labels in name')
+
+
+def parse_response(data: bytes) -> tuple:
+    """
+    Parse a DNS PTR response
+    :param data: DNS message
+    :return: tuple with query id, question name, response code,
+             PTR name (empty if missing) and its TTL
+    """
+    (query_id, flags, questions, answers, _, _) = struct.unpack(
+        '!HHHHHH', data[:12])
+    offset = 12
+    question = ''
+    for _ in range(questions):
+        question, offset = read_name(data, offset)
+        offset += 4
+    for _ in range(answers):
+        _, offset = read_name(data, offset)
+        kind, _, ttl, length = struct.unpack('!HHIH',
+                                             data[offset:offset + 10])
+        offset += 10
+        if kind == DNS_TYPE_PTR:
+            name, _ = read_name(data, offset)
+            return query_id, question, flags & 0x0f, name, ttl
+        offset += length
+    return query_id, question, flags & 0x0f, '', 0
+
+
+class DNSCache(object):
+    def __init__(self,
+                 path: str = None) -> None:
+        """
+        DNSCache object to keep the resolved names until their TTL, in
+        memory and optionally in a file shared by many processes.
+        The file has a JSON line for each resolved name and it's
+        rewritten without the expired names when loaded.
+        The new names are buffered in memory and appended to the file by
+        flush, which also reads the names appended by the other processes
+        since the last flush. The names still buffered are flushed at the
+        exit of the main process, but not at the exit of the worker
+        processes, which skip the exit handlers.
+        Every access to the file holds an exclusive lock on a separate
+        lock file, so no name is appended while the file is rewritten
+        """
+        self.path = path
+        self.entries = None
+        self.lock = threading.Lock()
+        # Names not yet written in the file
+        self.buffer = []
+        self.flushed = time.monotonic()
+        # File identity and size read until the last flush
+        self.inode = None
+        self.offset = 0
+
+    def __getstate__(self) -> dict:
+        # The cache is loaded again by each process
+        return {'path': self.path}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(path=state['path'])
+
+    @contextlib.contextmanager
+    def lock_file(self):
+        """
+        Hold the exclusive lock shared by every process using the file
+        """
+        with open(self.path + '.lock', 'a') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def load(self) -> None:
+        """
+        Load the valid names from the cache file
+        """
+        self.entries = {}
+        if not self.path:
+            return
+        # Write any buffered name at the exit of the main process
+        atexit.register(self.flush_at_exit)
+        with self.lock_file():
+            if not os.path.exists(self.path):
+                return
+            now = time.time()
+            with open(self.path, 'r') as file:
+                self.read_entries(file=file,
+                                  now=now)
+            # Rewrite the cache file without the expired names
+            temporary_path = '{PATH}.{PID}'.format(PATH=self.path,
+                                                   PID=os.getpid())
+            with open(temporary_path, 'w') as file:
+                for address, (name, expiration) in self.entries.items():
+                    file.write(json.dumps([address, name, expiration]) +
+                               '\n')
+                stat = os.fstat(file.fileno())
+            os.replace(temporary_path, self.path)
+            self.inode = stat.st_ino
+            self.offset = stat.st_size
+
+    def read_entries(self,
+                     file,
+                     now: float) -> None:
+        """
+        Read the valid names from the cache file, keeping the names with
+        the latest expiration
+        """
+        for line in file:
+            try:
+                address, name, expiration = json.loads(line)
+            except ValueError:
+                # Skip any partial line
+                continue
+            if (expiration > now and
+                    expiration > self.entries.get(address, (None, 0))[1]):
+                self.entries[address] = (name, expiration)
+
+    def get(self,
+            address: str) -> tuple:
+        """
+        Get a cached name
+        :param address: IPv4 address
+        :return: tuple with the cached status and the name
+        """
+        with self.lock:
+            if self.entries is None:
+                self.load()
+            name, expiration = self.entries.get(address, (None, 0))
+            if expiration > time.time():
+                return True, name
+            return False, None
+
+    def set(self,
+            address: str,
+            name: str,
+            ttl: int) -> None:
+        """
+        Save a name in the cache for ttl seconds, buffering it for the
+        next flush
+        """
+        expiration = time.time() + ttl
+        with self.lock:
+            if self.entries is None:
+                self.load()
+            self.entries[address] = (name, expiration)
+            if self.path:
+                self.buffer.append([address, name, expiration])
+
+    def needs_flush(self) -> bool:
+        """
+        Check if the buffered names should be written in the file, after
+        FLUSH_SIZE names or FLUSH_INTERVAL seconds
+        """
+        return bool(self.buffer) and (
+            len(self.buffer) >= FLUSH_SIZE or
+            time.monotonic() - self.flushed >= FLUSH_INTERVAL)
+
+    def flush_at_exit(self) -> None:
+        """
+        Write the buffered names at the process exit, if the cache file is
+        still available
+        """
+        if self.buffer:
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def flush(self) -> None:
+        """
+        Append the buffered names to the file and read the names appended
+        by the other processes since the last flush
+        """
+        if not self.path:
+            return
+        with self.lock:
+            buffer = self.buffer
+            self.buffer = []
+            self.flushed = time.monotonic()
+            if self.entries is None:
+                self.load()
+            with self.lock_file(), open(self.path, 'a+') as file:
+                stat = os.fstat(file.fileno())
+                if stat.st_ino != self.inode or stat.st_size < self.offset:
+                    # The file was rewritten by another process
+                    self.offset = 0
+                file.seek(self.offset)
+                self.read_entries(file=file,
+                                  now=time.time())
+                file.writelines(json.dumps(entry) + '\n'
+                                for entry in buffer)
+                self.inode = stat.st_ino
+                self.offset = file.tell()
+
+
+class ResolverProtocol(asyncio.DatagramProtocol):
+    def __init__(self) -> None:
+        """
+        ResolverProtocol object to send the DNS queries from a single UDP
+        socket and to match the responses with the pending queries
+        """
+        self.transport = None
+        # Pending queries by id with question name, nameserver and future
+        self.pending = {}
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+        try:
+            # Avoid dropping the responses arriving at once, the size is
+            # limited by net.core.rmem_max
+            transport.get_extra_info('socket').setsockopt(
+                socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER_SIZE)
+        except OSError:
+            pass
+
+    def datagram_received(self, data: bytes, address: tuple) -> None:
+        try:
+            query_id, question, rcode, name, ttl = parse_response(data)
+        except (ValueError, IndexError, struct.error):
+            # Invalid response
+            return
+        query = self.pending.get(query_id)
+        if (query and
+                query[0].lower() == question.lower() and
+                query[1] == address and
+                not query[2].done()):
+            query[2].set_result((rcode, name, ttl))
+
+    def error_received(self, error) -> None:
+        # The queries will be retried after their timeout
+        pass
+
+
+class PTRResolver(object):
+    def __init__(self,
+                 nameservers: list,
+                 timeout: float,
+                 retries: int,
+                 cache: DNSCache,
+                 negative_ttl: int) -> None:
+        """
+        PTRResolver object to resolve many addresses concurrently, sending
+        the PTR queries asynchronously over UDP to the nameservers.
+        Each query is sent again after timeout seconds to the next
+        nameserver, for the number of retries
+        """
+        self.nameservers = nameservers
+        self.timeout = timeout
+        self.retries = retries
+        self.cache = cache
+        self.negative_ttl = negative_ttl
+        # Task opening the socket for the event loop
+        self.endpoint = None
+        self.loop = None
+        # Cache file written by a coroutine
+        self.flushing = False
+
+    def __getstate__(self) -> dict:
+        # The socket is opened again by each process
+        state = dict(self.__dict__)
+        state.update(endpoint=None, loop=None, flushing=False)
+        return state
+
+    async def get_protocol(self) -> ResolverProtocol:
+        """
+        Get the resolver protocol for the running event loop
+        """
+        loop = asyncio.get_running_loop()
+        if (self.loop is not loop or
+                (self.endpoint.done() and
+                 (self.endpoint.exception() or
+                  self.endpoint.result()[0].is_closing()))):
+            # Open the socket only once for the concurrent queries
+            self.loop = loop
+            self.endpoint = loop.create_task(
+                loop.create_datagram_endpoint(ResolverProtocol,
+                                              family=socket.AF_INET))
+        _, protocol = await self.endpoint
+        return protocol
+
+    async def resolve(self,
+                      address: str,
+                      protocol: ResolverProtocol = None) -> str:
+        """
+        Resolve the name for an IPv4 address
+        :param address: IPv4 address
+        :param protocol: resolver protocol to use (None for the protocol
+                         of the running event loop)
+        :return: name, empty string if not existing or None if no
+                 nameserver replied
+        """
+        cached, name = self.cache.get(address)
+        if cached:
+            return name
+        if protocol is None:
+            protocol = await self.get_protocol()
+        loop = asyncio.get_running_loop()
+        question = get_ptr_name(address)
+        for attempt in range(self.retries + 1):
+            nameserver = self.nameservers[attempt % len(self.nameservers)]
+            query_id = random.randint(0, 0xffff)
+            while query_id in protocol.pending:
+                query_id = random.randint(0, 0xffff)
+            future = loop.create_future()
+            protocol.pending[query_id] = (question, nameserver, future)
+            try:
+                protocol.transport.sendto(build_query(query_id=query_id,
+                                                      name=question),
+                                          nameserver)
+                rcode, name, ttl = await asyncio.wait_for(
+                    future, timeout=self.timeout)
+            except (asyncio.TimeoutError, OSError):
+                # Try again with the next nameserver
+                continue
+            finally:
+                protocol.pending.pop(query_id, None)
+            if rcode == DNS_RCODE_NOERROR and name:
+                self.cache.set(address=address,
+                               name=name,
+                               ttl=ttl)
+                await self.flush_cache()
+                return name
+            elif rcode in (DNS_RCODE_NOERROR, DNS_RCODE_NXDOMAIN):
+                # Not existing name
+                self.cache.set(address=address,
+                               name='',
+                               ttl=self.negative_ttl)
+                await self.flush_cache()
+                return ''
+        return None
+
+    async def flush_cache(self) -> None:
+        """
+        Write the buffered names in the cache file from the threads pool,
+        without blocking the event loop, from a single coroutine at once
+        """
+        if self.cache.needs_flush() and not self.flushing:
+            self.flushing = True
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.cache.flush)
+            finally:
+                self.flushing = False
+
+    async def resolve_once(self,
+                           address: str) -> str:
+        """
+        Resolve the name for an IPv4 address using its own socket
+        """
+        loop = asyncio.get_running_loop()
+        transport, protocol = await loop.create_datagram_endpoint(
+            ResolverProtocol,
+            family=socket.AF_INET)
+        try:
+            return await self.resolve(address=address,
+                                      protocol=protocol)
+        finally:
+            transport.close()
+
+    def resolve_sync(self,
+                     address: str) -> str:
+        """
+        Resolve the name for an IPv4 address from a new event loop
+        """
+        return asyncio.run(self.resolve_once(address))
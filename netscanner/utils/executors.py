@@ -0,0 +1,45 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+# Execute each task in a separate Consumer process
+EXECUTOR_PROCESS = 'process'
+# Execute each task in a threads pool in the current process
+EXECUTOR_THREAD = 'thread'
+# Execute each task as a coroutine in a single event loop
+EXECUTOR_ASYNC = 'async'
+
+EXECUTORS = (EXECUTOR_PROCESS,
+             EXECUTOR_THREAD,
+             EXECUTOR_ASYNC)
+
+
+def get_executor(options: dict,
+                 tool=None) -> str:
+    """
+    Get the executor to use for a discovery
+    The executor option has precedence over the preferred executor
+    declared by the scanner tool class
+    :param options: dictionary containing the options
+    :param tool: scanner tool to execute
+    :return: executor name
+    """
+    executor = options.get('executor',
+                           getattr(tool, 'executor', EXECUTOR_PROCESS))
+    return executor if executor in EXECUTORS else EXECUTOR_PROCESS
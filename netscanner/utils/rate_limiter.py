@@ -0,0 +1,108 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import multiprocessing
+import time
+
+
+class RateLimiter(object):
+    def __init__(self,
+                 slots: int = 4096) -> None:
+        """
+        RateLimiter object to keep many token buckets in shared memory.
+        The buckets are shared with any process started after the
+        RateLimiter creation, the buckets are assigned only from the
+        creating process.
+        Each bucket is refilled at its rate in tokens per second up to
+        its burst size, and each probe consumes a token from every bucket
+        it is subject to. A probe sending many packets consumes a token
+        for each packet, leaving the buckets in debt until they are
+        refilled.
+        """
+        self.lock = multiprocessing.Lock()
+        # Tokens and last refill time for each bucket
+        self.values = multiprocessing.RawArray('d', slots * 2)
+        self.slots = slots
+        # Assigned buckets by key
+        self.buckets = {}
+
+    def get_bucket(self,
+                   key: tuple,
+                   rate: float) -> tuple:
+        """
+        Get the bucket for a key, assigning a new bucket if needed
+        :param key: unique key for the bucket
+        :param rate: tokens per second for the bucket
+        :return: tuple with the bucket slot, rate and burst size
+        """
+        # Allow a burst of a tenth of second of tokens
+        burst = max(1.0, rate / 10)
+        # Assign the slot under the lock, as the buckets are requested also
+        # from the threads of the running discoveries
+        with self.lock:
+            if key not in self.buckets:
+                slot = len(self.buckets)
+                if slot >= self.slots:
+                    raise RuntimeError(
+                        'No more rate limiter buckets available')
+                self.values[slot * 2] = burst
+                self.values[slot * 2 + 1] = time.monotonic()
+                self.buckets[key] = slot
+            return self.buckets[key], rate, burst
+
+    def get_delay(self,
+                  buckets: tuple,
+                  tokens: int = 1) -> float:
+        """
+        Consume the tokens from every bucket if they all have a token
+        available, even if the tokens are more than the available ones
+        :param buckets: tuple of buckets from get_bucket
+        :param tokens: number of tokens to consume
+        :return: 0 if the tokens were consumed or else the seconds to wait
+                 before trying again
+        """
+        with self.lock:
+            now = time.monotonic()
+            delay = 0.0
+            for slot, rate, burst in buckets:
+                # Refill the bucket for the elapsed time
+                available = min(burst, self.values[slot * 2] +
+                                (now - self.values[slot * 2 + 1]) * rate)
+                self.values[slot * 2] = available
+                self.values[slot * 2 + 1] = now
+                if available < 1:
+                    delay = max(delay, (1 - available) / rate)
+            if not delay:
+                for slot, _, _ in buckets:
+                    self.values[slot * 2] -= tokens
+        return delay
+
+    def acquire(self,
+                buckets: tuple,
+                tokens: int = 1) -> None:
+        """
+        Wait until the tokens are consumed from every bucket
+        :param buckets: tuple of buckets from get_bucket
+        :param tokens: number of tokens to consume
+        """
+        delay = self.get_delay(buckets, tokens)
+        while delay:
+            time.sleep(delay)
+            delay = self.get_delay(buckets, tokens)
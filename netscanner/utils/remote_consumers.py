@@ -0,0 +1,388 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+import collections
+import datetime
+import hmac
+import http.server
+import itertools
+import json
+import threading
+import time
+import zlib
+
+from .rate_limiter import RateLimiter
+
+# Path to lease a task from the coordinator
+PATH_LEASE = '/lease'
+# Path to send a batch of results to the coordinator
+PATH_RESULTS = '/results'
+# Header for the shared token between the coordinator and the agents
+HEADER_TOKEN = 'X-Netscanner-Token'
+# Maximum size of a compressed message and of the decompressed message
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+MAX_DECODED_SIZE = 64 * 1024 * 1024
+
+
+def serialize_value(value):
+    """
+    Serialize the values not supported by JSON in the results
+    """
+    if isinstance(value, datetime.datetime):
+        # Convert datetime to timestamps
+        return value.timestamp()
+    elif isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return str(value)
+
+
+def encode_message(message) -> bytes:
+    """
+    Encode a message as compressed JSON
+    """
+    return zlib.compress(json.dumps(message,
+                                    default=serialize_value).encode('utf-8'))
+
+
+def decode_message(data: bytes,
+                   max_size: int = MAX_DECODED_SIZE):
+    """
+    Decode a message from compressed JSON, refusing any message larger
+    than max_size bytes once decompressed
+    """
+    decompressor = zlib.decompressobj()
+    data = decompressor.decompress(data, max_size)
+    if decompressor.unconsumed_tail:
+        raise ValueError('The message is larger than {SIZE} bytes'.format(
+            SIZE=max_size))
+    if not decompressor.eof:
+        raise ValueError('The message is incomplete')
+    return json.loads(data.decode('utf-8'))
+
+
+class RemoteTask(object):
+    def __init__(self,
+                 job: 'RemoteJob',
+                 task_id: int,
+                 chunk) -> None:
+        """
+        RemoteTask object to keep the state of a chunk leased to an agent
+        """
+        self.job = job
+        self.task_id = task_id
+        # Addresses still waiting for their results
+        self.items = list(chunk)
+        self.remaining = set(self.items)
+        # Agent owning the lease and lease expiration time
+        self.agent = None
+        self.expiration = 0
+
+
+class RemoteJob(object):
+    def __init__(self,
+                 consumers: 'RemoteConsumers',
+                 specs: dict,
+                 tasks) -> None:
+        """
+        RemoteJob object to serve the chunks of items in the tasks
+        iterable to the remote agents, which execute the scanner tool
+        described by specs
+        """
+        self.consumers = consumers
+        self.specs = specs
+        self.tasks = iter(tasks)
+        # No more tasks to lease
+        self.exhausted = False
+        # Tasks to lease again after their lease expired
+        self.retries = collections.deque()
+        # Tasks leased and not yet completed
+        self.leased = {}
+        # Results received and not yet consumed
+        self.results = collections.deque()
+
+    @property
+    def finished(self) -> bool:
+        """
+        Check if every task was leased and completed
+        """
+        return self.exhausted and not self.retries and not self.leased
+
+    def next_task(self):
+        """
+        Get the next task to lease, giving precedence to the retries.
+        A None task from the tasks iterator means no task is available yet
+        :return: RemoteTask object or None
+        """
+        if self.retries:
+            return self.retries.popleft()
+        try:
+            chunk = next(self.tasks)
+        except StopIteration:
+            self.exhausted = True
+            return None
+        if chunk is None:
+            return None
+        return RemoteTask(job=self,
+                          task_id=next(self.consumers.counter),
+                          chunk=chunk)
+
+    def results_as_iterator(self):
+        """
+        Get the results while the job is running, until every task was
+        completed
+        """
+        return self.consumers.results_as_iterator(job=self)
+
+
+class RemoteConsumers(object):
+    def __init__(self,
+                 address: str,
+                 port: int,
+                 lease: float = 30,
+                 token: str = '') -> None:
+        """
+        RemoteConsumers object to serve the chunks of the running jobs to
+        the remote agents over HTTP and to receive their results.
+        Each chunk is leased to a single agent for lease seconds, renewed
+        by every batch of results; the remaining items of an expired
+        lease are leased again to any other agent.
+        The rate of the rate limiter buckets is divided between the agents
+        seen in the last lease seconds, as each agent has its own buckets
+        """
+        self.lease = lease
+        self.token = token
+        self.jobs = []
+        self.tasks = {}
+        self.counter = itertools.count(1)
+        # Last request time by agent name
+        self.agents = {}
+        self.condition = threading.Condition()
+        # The rate limiter buckets are sent to the agents
+        self.limiter = RateLimiter()
+        self.server = http.server.ThreadingHTTPServer(
+            (address, port), self.get_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    def __enter__(self) -> 'RemoteConsumers':
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def execute(self,
+                specs: dict,
+                tasks) -> RemoteJob:
+        """
+        Serve the chunks from the tasks iterable to the remote agents
+        :param specs: dictionary describing the scanner tool to execute
+        :param tasks: iterable of chunks of addresses to process
+        :return: running job to get the results from
+        """
+        with self.condition:
+            job = RemoteJob(consumers=self,
+                            specs=dict(specs, job=next(self.counter)),
+                            tasks=tasks)
+            self.jobs.append(job)
+            return job
+
+    def expire_leases(self) -> None:
+        """
+        Lease again the tasks whose agent didn't send any result in time
+        """
+        now = time.monotonic()
+        for task in list(self.tasks.values()):
+            if task.agent and task.expiration < now:
+                task.agent = None
+                task.job.retries.append(task)
+
+    def see_agent(self,
+                  agent: str) -> int:
+        """
+        Save the last request time of an agent
+        :param agent: name of the agent
+        :return: number of agents seen in the last lease seconds
+        """
+        now = time.monotonic()
+        self.agents[agent] = now
+        for name, last_time in list(self.agents.items()):
+            if last_time < now - self.lease:
+                del self.agents[name]
+        return len(self.agents)
+
+    def lease_task(self,
+                   agent: str) -> dict:
+        """
+        Lease the next available task to an agent
+        :param agent: name of the agent
+        :return: dictionary with the task to execute or None
+        """
+        with self.condition:
+            self.expire_leases()
+            agents = self.see_agent(agent)
+            for job in list(self.jobs):
+                task = job.next_task()
+                if task:
+                    task.agent = agent
+                    task.expiration = time.monotonic() + self.lease
+                    job.leased[task.task_id] = task
+                    self.tasks[task.task_id] = task
+                    # Rotate the jobs to serve them in turn
+                    self.jobs.remove(job)
+                    self.jobs.append(job)
+                    # Share the rate between the running agents
+                    buckets = [(slot, rate / agents, max(1.0, burst / agents))
+                               for slot, rate, burst in job.specs['buckets']]
+                    return {'task': task.task_id,
+                            'lease': self.lease,
+                            'specs': dict(job.specs, buckets=buckets),
+                            'items': [item
+                                      for item in task.items
+                                      if item in task.remaining]}
+                elif job.finished:
+                    self.condition.notify_all()
+        return None
+
+    def receive_results(self,
+                        agent: str,
+                        task_id: int,
+                        results: list,
+                        final: bool) -> bool:
+        """
+        Receive a batch of results for a leased task, ignoring the results
+        already received from another agent
+        :param agent: name of the agent
+        :param task_id: leased task id
+        :param results: list of (address, result) items
+        :param final: the agent completed the task
+        :return: True if the task is still leased by the agent
+        """
+        with self.condition:
+            self.see_agent(agent)
+            task = self.tasks.get(task_id)
+            if not task:
+                # Unknown or already completed task
+                return False
+            for address, result in results:
+                if address in task.remaining:
+                    task.remaining.discard(address)
+                    task.job.results.append((address, result))
+            owner = task.agent == agent
+            if owner:
+                # Renew the lease
+                task.expiration = time.monotonic() + self.lease
+            if not task.remaining:
+                # Task completed
+                del self.tasks[task_id]
+                task.job.leased.pop(task_id, None)
+                if task in task.job.retries:
+                    task.job.retries.remove(task)
+            elif final and owner:
+                # Lease again the items without results
+                task.agent = None
+                task.job.retries.append(task)
+            self.condition.notify_all()
+            return owner
+
+    def results_as_iterator(self,
+                            job: RemoteJob):
+        """
+        Get the results while the job is running, until every task was
+        completed
+        """
+        while True:
+            with self.condition:
+                while not job.results and not job.finished:
+                    self.condition.wait(timeout=1.0)
+                    self.expire_leases()
+                results = job.results
+                job.results = collections.deque()
+                finished = job.finished and not results
+                if finished:
+                    self.jobs.remove(job)
+            if finished:
+                break
+            yield from results
+
+    def is_authorized(self,
+                      token: str) -> bool:
+        """
+        Check the token sent by an agent
+        """
+        return hmac.compare_digest(token or '', self.token)
+
+    def get_handler(self):
+        """
+        Get the HTTP requests handler class for the agents
+        """
+        consumers = self
+
+        class RemoteConsumersHandler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                if not consumers.is_authorized(
+                        self.headers.get(HEADER_TOKEN)):
+                    self.send_error(403)
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                    if length > MAX_MESSAGE_SIZE:
+                        self.send_error(413)
+                        return
+                    elif length < 0:
+                        raise ValueError('Invalid Content-Length')
+                    message = decode_message(self.rfile.read(length))
+                    if self.path == PATH_LEASE:
+                        response = consumers.lease_task(
+                            agent=message['agent'])
+                    elif self.path == PATH_RESULTS:
+                        response = consumers.receive_results(
+                            agent=message['agent'],
+                            task_id=message['task'],
+                            results=message['results'],
+                            final=message['final'])
+                    else:
+                        self.send_error(404)
+                        return
+                except (ValueError, KeyError, TypeError, zlib.error):
+                    self.send_error(400)
+                    return
+                data = encode_message(response)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args) -> None:
+                # Don't log every request
+                pass
+
+        return RemoteConsumersHandler
+
+    def close(self) -> None:
+        """
+        Stop serving the agents
+        """
+        if self.thread:
+            self.server.shutdown()
+            self.thread = None
+        self.server.server_close()
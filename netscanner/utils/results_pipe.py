@@ -0,0 +1,106 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import multiprocessing.connection
+import time
+
+# Message containing a batch of results
+RESULTS_BATCH = 0
+# Message containing the last batch of results before the end of stream
+RESULTS_END = 1
+
+
+class ResultsWriter(object):
+    def __init__(self,
+                 connection: multiprocessing.connection.Connection,
+                 batch_size: int,
+                 flush_interval: float,
+                 stream=None) -> None:
+        """
+        ResultsWriter object to send the results over a pipe connection.
+        The results are collected and sent in batches as soon as the
+        batch contains batch_size results or after flush_interval seconds
+        from the previous sending.
+        Every message contains the stream identifier, to share the same
+        connection between many streams.
+        """
+        self.connection = connection
+        self.stream = stream
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.batch = []
+        self.last_flush = time.monotonic()
+
+    def put(self,
+            result) -> None:
+        """
+        Add a result to the current batch and send it when needed
+        """
+        self.batch.append(result)
+        if (len(self.batch) >= self.batch_size or
+                time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Send the current batch, if not empty
+        """
+        if self.batch:
+            self.connection.send((RESULTS_BATCH, self.stream, self.batch))
+            self.batch = []
+        self.last_flush = time.monotonic()
+
+    def close(self) -> None:
+        """
+        Send the remaining results with the end of stream marker
+        """
+        self.connection.send((RESULTS_END, self.stream, self.batch))
+        self.batch = []
+
+
+class ResultsReader(object):
+    def __init__(self,
+                 connections: list) -> None:
+        """
+        ResultsReader object to receive the results from many ResultsWriter
+        objects, each one using its own pipe connection.
+        """
+        self.connections = connections
+
+    def __iter__(self):
+        """
+        Receive the results as soon as they are available, until every
+        writer has sent its end of stream marker.
+        A closed connection without the end of stream marker (like for a
+        terminated process) is considered as ended.
+        """
+        pending = list(self.connections)
+        while pending:
+            for connection in multiprocessing.connection.wait(pending):
+                try:
+                    message, _, batch = connection.recv()
+                except EOFError:
+                    # The writer was closed without the end of stream
+                    message, batch = RESULTS_END, []
+                yield from batch
+                if message == RESULTS_END:
+                    # No more results from this writer
+                    pending.remove(connection)
+                    connection.close()
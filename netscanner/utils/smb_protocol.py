@@ -0,0 +1,295 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import asyncio
+import datetime
+import socket
+import struct
+
+# NetBIOS session service header: type, flags and length
+NETBIOS_HEADER = struct.Struct('!BBH')
+NETBIOS_SESSION_MESSAGE = 0x00
+NETBIOS_SESSION_REQUEST = 0x81
+NETBIOS_SESSION_KEEPALIVE = 0x85
+# SMB header
+SMB_HEADER_SIZE = 32
+SMB_SIGNATURE = b'\xffSMB'
+SMB_FLAGS2 = struct.Struct('<H')
+SMB_FLAGS2_OFFSET = 10
+SMB_FLAGS2_UNICODE = 0x8000
+# Session setup AndX response: word count, AndX command, reserved,
+# AndX offset, action, security blob length and byte count
+SMB_SESSION_SETUP_RESPONSE = struct.Struct('<BBBHHHH')
+# NTLMSSP challenge message: signature, message type, target name,
+# flags, server challenge, reserved, target info and version
+NTLMSSP_SIGNATURE = b'NTLMSSP\x00'
+NTLMSSP_CHALLENGE = struct.Struct('<8sIHHII8s8xHHI')
+NTLMSSP_VERSION = struct.Struct('<BBH3xB')
+# NTLMSSP target info attribute: type and length
+NTLMSSP_AV_PAIR = struct.Struct('<HH')
+NTLMSSP_AV_EOL = 0
+NTLMSSP_AV_TIMESTAMP = 7
+NTLMSSP_AV_TYPES = {
+    1: 'netbios_computer_name',
+    2: 'netbios_domain_name',
+    3: 'dns_computer_name',
+    4: 'dns_domain_name',
+}
+# Difference between the FILETIME and the UNIX epochs
+EPOCH_AS_FILETIME = 116444736000000000
+
+# SMB negotiate request offering the NT LM 0.12 dialect
+SMB_NEGOTIATE_REQUEST = (
+    b'\x00\x00\x00\x85\xff\x53\x4d\x42\x72\x00\x00\x00\x00'
+    b'\x18\x53\xc8\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+    b'\x00\x00\x00\x00\xff\xfe\x00\x00\x00\x00\x00\x62\x00'
+    b'\x02\x50\x43\x20\x4e\x45\x54\x57\x4f\x52\x4b\x20\x50'
+    b'\x52\x4f\x47\x52\x41\x4d\x20\x31\x2e\x30\x00\x02\x4c'
+    b'\x41\x4e\x4d\x41\x4e\x31\x2e\x30\x00\x02\x57\x69\x6e'
+    b'\x64\x6f\x77\x73\x20\x66\x6f\x72\x20\x57\x6f\x72\x6b'
+    b'\x67\x72\x6f\x75\x70\x73\x20\x33\x2e\x31\x61\x00\x02'
+    b'\x4c\x4d\x31\x2e\x32\x58\x30\x30\x32\x00\x02\x4c\x41'
+    b'\x4e\x4d\x41\x4e\x32\x2e\x31\x00\x02\x4e\x54\x20\x4c'
+    b'\x4d\x20\x30\x2e\x31\x32\x00')
+# SMB session setup AndX request with a NTLMSSP negotiate message
+SMB_SESSION_SETUP_REQUEST = (
+    b'\x00\x00\x01\x0a\xff\x53\x4d\x42\x73\x00\x00\x00\x00'
+    b'\x18\x07\xc8\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+    b'\x00\x00\x00\x00\xff\xfe\x00\x00\x40\x00\x0c\xff\x00'
+    b'\x0a\x01\x04\x41\x32\x00\x00\x00\x00\x00\x00\x00\x4a'
+    b'\x00\x00\x00\x00\x00\xd4\x00\x00\xa0\xcf\x00\x60\x48'
+    b'\x06\x06\x2b\x06\x01\x05\x05\x02\xa0\x3e\x30\x3c\xa0'
+    b'\x0e\x30\x0c\x06\x0a\x2b\x06\x01\x04\x01\x82\x37\x02'
+    b'\x02\x0a\xa2\x2a\x04\x28\x4e\x54\x4c\x4d\x53\x53\x50'
+    b'\x00\x01\x00\x00\x00\x07\x82\x08\xa2\x00\x00\x00\x00'
+    b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x05'
+    b'\x02\xce\x0e\x00\x00\x00\x0f\x00\x57\x00\x69\x00\x6e'
+    b'\x00\x64\x00\x6f\x00\x77\x00\x73\x00\x20\x00\x53\x00'
+    b'\x65\x00\x72\x00\x76\x00\x65\x00\x72\x00\x20\x00\x32'
+    b'\x00\x30\x00\x30\x00\x33\x00\x20\x00\x33\x00\x37\x00'
+    b'\x39\x00\x30\x00\x20\x00\x53\x00\x65\x00\x72\x00\x76'
+    b'\x00\x69\x00\x63\x00\x65\x00\x20\x00\x50\x00\x61\x00'
+    b'\x63\x00\x6b\x00\x20\x00\x32\x00\x00\x00\x00\x00\x57'
+    b'\x00\x69\x00\x6e\x00\x64\x00\x6f\x00\x77\x00\x73\x00'
+    b'\x20\x00\x53\x00\x65\x00\x72\x00\x76\x00\x65\x00\x72'
+    b'\x00\x20\x00\x32\x00\x30\x00\x30\x00\x33\x00\x20\x00'
+    b'\x35\x00\x2e\x00\x32\x00\x00\x00\x00\x00')
+
+
+def get_encoded_name(name: str) -> bytes:
+    """
+    Encode a NetBIOS computer name
+    :param name: computer name to encode
+    :return: byte string with the encoded computer name
+    """
+    result = bytearray()
+    for char in name.ljust(16, '\x20').encode(errors='ignore')[:16]:
+        result.append(0x41 + (char >> 4))
+        result.append(0x41 + (char & 0x0f))
+    return bytes(result)
+
+
+def get_session_request(name: str) -> bytes:
+    """
+    Get a NetBIOS session request for a computer name
+    :param name: called computer name
+    :return: byte string with the request
+    """
+    return (b'\x81\x00\x00D ' +
+            get_encoded_name(name) +
+            b'\x00 EOENEBFACACACACACACACACACACACACA\x00')
+
+
+def get_message_length(header: bytes) -> int:
+    """
+    Get the message length from a NetBIOS session header
+    :param header: NetBIOS session header
+    :return: message length, without the header
+    """
+    _, flags, length = NETBIOS_HEADER.unpack_from(header)
+    return (flags & 0x01) << 16 | length
+
+
+def recv_exactly(sock: socket.socket,
+                 size: int) -> bytearray:
+    """
+    Receive exactly the requested number of bytes
+    :param sock: connected socket
+    :param size: number of bytes to receive
+    :return: bytearray with the received data
+    """
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if not count:
+            raise ConnectionError('Connection closed by the remote host')
+        received += count
+    return buffer
+
+
+def read_message(sock: socket.socket) -> bytearray:
+    """
+    Read a whole NetBIOS session message, skipping the keep alive messages
+    :param sock: connected socket
+    :return: bytearray with the message, without the header
+    """
+    while True:
+        header = recv_exactly(sock, NETBIOS_HEADER.size)
+        message = recv_exactly(sock, get_message_length(header))
+        if header[0] != NETBIOS_SESSION_KEEPALIVE:
+            return message
+
+
+async def read_message_async(reader: asyncio.StreamReader) -> bytes:
+    """
+    Read a whole NetBIOS session message, skipping the keep alive messages
+    :param reader: stream reader for the connection
+    :return: bytes with the message, without the header
+    """
+    while True:
+        header = await reader.readexactly(NETBIOS_HEADER.size)
+        message = await reader.readexactly(get_message_length(header))
+        if header[0] != NETBIOS_SESSION_KEEPALIVE:
+            return message
+
+
+def parse_session_setup(data: bytes) -> dict:
+    """
+    Parse a SMB session setup AndX response containing a NTLMSSP challenge
+    :param data: SMB message, without the NetBIOS session header
+    :return: dictionary object with the versions and the target info
+    """
+    results = {}
+    view = memoryview(data)
+    if (len(view) < SMB_HEADER_SIZE + SMB_SESSION_SETUP_RESPONSE.size or
+            view[:4] != SMB_SIGNATURE):
+        return results
+    (_, _, _, _, _, blob_length,
+     byte_count) = SMB_SESSION_SETUP_RESPONSE.unpack_from(
+        view, SMB_HEADER_SIZE)
+    blob_start = SMB_HEADER_SIZE + SMB_SESSION_SETUP_RESPONSE.size
+    blob_end = min(blob_start + blob_length, len(view))
+    # Native OS and LAN manager versions
+    strings_end = min(blob_start + byte_count, len(view))
+    (flags2, ) = SMB_FLAGS2.unpack_from(view, SMB_FLAGS2_OFFSET)
+    if flags2 & SMB_FLAGS2_UNICODE:
+        # Unicode strings are aligned to 16 bits
+        versions = bytes(view[blob_end + blob_end % 2:strings_end]).decode(
+            'UTF-16-LE', errors='ignore')
+    else:
+        versions = bytes(view[blob_end:strings_end]).decode(
+            'UTF-8', errors='ignore')
+    results['version'] = [item for item in versions.split('\x00') if item]
+    # NTLMSSP challenge inside the security blob
+    start = data.find(NTLMSSP_SIGNATURE, blob_start, blob_end)
+    if start < 0 or start + NTLMSSP_CHALLENGE.size > blob_end:
+        return results
+    (_, _, _, _, _, _, _, info_length, _,
+     info_offset) = NTLMSSP_CHALLENGE.unpack_from(view, start)
+    version_start = start + NTLMSSP_CHALLENGE.size
+    if version_start + NTLMSSP_VERSION.size <= blob_end:
+        (results['major'],
+         results['minor'],
+         results['build'],
+         results['ntlm_revision']) = NTLMSSP_VERSION.unpack_from(
+            view, version_start)
+    # Target info attributes
+    index = start + info_offset
+    info_end = min(index + info_length, blob_end)
+    while index + NTLMSSP_AV_PAIR.size <= info_end:
+        item_type, item_length = NTLMSSP_AV_PAIR.unpack_from(view, index)
+        if item_type == NTLMSSP_AV_EOL:
+            # End of the data
+            break
+        index += NTLMSSP_AV_PAIR.size
+        item_content = view[index:min(index + item_length, info_end)]
+        if item_type == NTLMSSP_AV_TIMESTAMP and len(item_content) == 8:
+            timestamp = int.from_bytes(bytes=item_content,
+                                       byteorder='little')
+            try:
+                results['timestamp'] = datetime.datetime.fromtimestamp(
+                    (timestamp - EPOCH_AS_FILETIME) / 10000000)
+            except (OverflowError, OSError, ValueError):
+                # Skip invalid timestamps
+                pass
+        elif item_type in NTLMSSP_AV_TYPES:
+            results[NTLMSSP_AV_TYPES[item_type]] = (
+                bytes(item_content).decode('UTF-16-LE', errors='ignore'))
+        index += item_length
+    return results
+
+
+class SMBClient(object):
+    def __init__(self,
+                 timeout: int):
+        self.timeout = timeout
+
+    def get_info(self,
+                 destination: str,
+                 port: int,
+                 name: str = None) -> dict:
+        """
+        Get the SMB information negotiating a session
+        :param destination: address to connect to
+        :param port: SMB port (139 for NetBIOS or 445)
+        :param name: computer name for the NetBIOS session request
+        :return: dictionary object with the versions and the target info
+        """
+        with socket.socket(family=socket.AF_INET,
+                           type=socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect((destination, port))
+            if name:
+                sock.sendall(get_session_request(name))
+                read_message(sock)
+            sock.sendall(SMB_NEGOTIATE_REQUEST)
+            read_message(sock)
+            sock.sendall(SMB_SESSION_SETUP_REQUEST)
+            return parse_session_setup(read_message(sock))
+
+    async def get_info_async(self,
+                             destination: str,
+                             port: int,
+                             name: str = None) -> dict:
+        """
+        Get the SMB information negotiating a session from an event loop
+        :param destination: address to connect to
+        :param port: SMB port (139 for NetBIOS or 445)
+        :param name: computer name for the NetBIOS session request
+        :return: dictionary object with the versions and the target info
+        """
+        timeout = self.timeout or None
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host=destination,
+                                    port=port),
+            timeout=timeout)
+        try:
+            requests = [SMB_NEGOTIATE_REQUEST, SMB_SESSION_SETUP_REQUEST]
+            if name:
+                requests.insert(0, get_session_request(name))
+            for request in requests:
+                writer.write(request)
+                message = await asyncio.wait_for(read_message_async(reader),
+                                                 timeout=timeout)
+            return parse_session_setup(message)
+        finally:
+            writer.close()
@@ -0,0 +1,70 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+
+def get_sweeps(tasks,
+               size: int):
+    """
+    Group the addresses from the chunks in sweeps of at most size
+    addresses, each sweep as a single item of its own chunk.
+    Any pending sweep is sent when no chunk is available yet
+    :param tasks: iterable of chunks of addresses (or None)
+    :param size: maximum number of addresses for each sweep
+    :return: iterator of chunks with a single list of addresses or None
+             if no address is available yet
+    """
+    sweep = []
+    for chunk in tasks:
+        if chunk is None:
+            if sweep:
+                yield [sweep]
+                sweep = []
+            else:
+                yield None
+            continue
+        for address in chunk:
+            sweep.append(address)
+            if len(sweep) >= size:
+                yield [sweep]
+                sweep = []
+    if sweep:
+        yield [sweep]
+
+
+class SweepsJob(object):
+    def __init__(self,
+                 job) -> None:
+        """
+        SweepsJob object to get the results for each address from a
+        running job processing sweeps of addresses
+        """
+        self.job = job
+
+    def results_as_iterator(self):
+        """
+        Get the results for each address while the job is running.
+        A failure result for a whole sweep is repeated for each address
+        """
+        for sweep, results in self.job.results_as_iterator():
+            if isinstance(results, dict):
+                for address in sweep:
+                    yield address, results
+            else:
+                yield from results
@@ -0,0 +1,133 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import datetime
+import signal
+import threading
+import types
+
+
+class TaskTimeout(Exception):
+    """
+    The task has exceeded its deadline
+    """
+    pass
+
+
+def get_failure_result(error: str) -> dict:
+    """
+    Get the result for a failed task
+    :param error: error description
+    :return: dict with the failed status and the error
+    """
+    return {
+        'status': False,
+        'error': error,
+        'timestamp': datetime.datetime.now().timestamp(),
+    }
+
+
+def get_timeout_result(deadline: float) -> dict:
+    """
+    Get the result for a task which has exceeded its deadline
+    :param deadline: task deadline in seconds
+    :return: dict with the failed status and the error
+    """
+    return get_failure_result('Timeout after {DEADLINE} seconds'.format(
+        DEADLINE=deadline))
+
+
+def get_error_result(error: Exception) -> dict:
+    """
+    Get the result for a task which has raised an exception
+    :param error: exception raised from the task
+    :return: dict with the failed status and the error
+    """
+    return get_failure_result('{NAME}: {ERROR}'.format(
+        NAME=type(error).__name__,
+        ERROR=error))
+
+
+def raise_timeout(signum, frame) -> None:
+    """
+    Signal handler to interrupt a task which has exceeded its deadline
+    """
+    raise TaskTimeout()
+
+
+def execute_with_deadline(action: types.FunctionType,
+                          item,
+                          deadline: float) -> dict:
+    """
+    Execute the action for an item, interrupting it after deadline seconds
+    (0 for no deadline). Any error is returned as a failure result.
+    The deadline uses the SIGALRM signal, so it must be used only from the
+    main thread of a process
+    :param action: action to execute
+    :param item: item to pass to the action
+    :param deadline: seconds before interrupting the action
+    :return: action result or failure result
+    """
+    if deadline:
+        signal.signal(signal.SIGALRM, raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, deadline)
+    try:
+        return action(item)
+    except TaskTimeout:
+        return get_timeout_result(deadline)
+    except Exception as error:
+        return get_error_result(error)
+    finally:
+        if deadline:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def execute_with_thread_deadline(action: types.FunctionType,
+                                 item,
+                                 deadline: float) -> dict:
+    """
+    Execute the action for an item, giving up after deadline seconds
+    (0 for no deadline). Any error is returned as a failure result.
+    The action is executed in a separate daemon thread, which cannot be
+    interrupted and it's left running after the deadline, so it can be
+    used from any thread
+    :param action: action to execute
+    :param item: item to pass to the action
+    :param deadline: seconds before giving up the action
+    :return: action result or failure result
+    """
+    if not deadline:
+        try:
+            return action(item)
+        except Exception as error:
+            return get_error_result(error)
+    results = []
+
+    def execute() -> None:
+        try:
+            results.append(action(item))
+        except Exception as error:
+            results.append(get_error_result(error))
+
+    thread = threading.Thread(target=execute,
+                              daemon=True)
+    thread.start()
+    thread.join(deadline)
+    return results[0] if results else get_timeout_result(deadline)
@@ -0,0 +1,213 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import concurrent.futures
+import queue
+import threading
+import time
+import types
+
+from .concurrency import ConcurrencyController
+from .rate_limiter import RateLimiter
+from .task_deadline import execute_with_thread_deadline
+
+
+class ThreadConsumers(object):
+    def __init__(self) -> None:
+        """
+        ThreadConsumers object to consume the data in the tasks iterable
+        using many threads in the current process.
+        The results will be saved in the results queue.
+        """
+        self.tasks = None
+        self.results = queue.Queue()
+        self.executor = None
+        self.futures = []
+        self.lock = threading.Lock()
+        self.controller = None
+        self.condition = threading.Condition()
+        self.running = 0
+        self.limiter = None
+        self.buckets = ()
+        self.tokens = None
+        self.deadline = 0
+        self.action = None
+        self.exhausted = False
+        self.probes = None
+
+    def execute(self,
+                runners: int,
+                action: types.FunctionType,
+                tasks,
+                controller: ConcurrencyController = None,
+                limiter: RateLimiter = None,
+                buckets: tuple = (),
+                deadline: float = 0,
+                tokens: types.FunctionType = None,
+                probes: threading.Semaphore = None) -> 'ThreadConsumers':
+        """
+        Execute the action for every item in the tasks iterable, keeping
+        at most a number of concurrent threads defined by runners.
+        If a ConcurrencyController is passed, the concurrent actions are
+        adapted by the controller, up to its maximum limit, starting only
+        the threads allowed by its current limit and adding more threads
+        while the limit grows.
+        Each item will be processed after consuming a token from every
+        limiter bucket in buckets, or the tokens from the tokens function
+        for the item, and it will be given up after deadline seconds (0 for
+        no deadline). Any error is saved as a failure result.
+        If a probes semaphore is passed, each action holds it while
+        running, to share the probes at once with other executors.
+        The threads are started without waiting for their completion,
+        the results can be consumed using results_as_iterator while the
+        threads are still running.
+        """
+        # Every runner consumes the same iterator, so each item will
+        # be processed only once
+        self.tasks = iter(tasks)
+        self.controller = controller
+        self.limiter = limiter
+        self.buckets = buckets
+        self.tokens = tokens
+        self.deadline = deadline
+        self.action = action
+        self.exhausted = False
+        self.probes = probes
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(controller.maximum if controller else runners,
+                            1))
+        with self.condition:
+            self._start_runners(controller.limit if controller else runners)
+        return self
+
+    def _start_runners(self,
+                       runners: int) -> None:
+        """
+        Start new threads until there are runners threads, unless the
+        items are already exhausted.
+        The condition must be held by the caller
+        """
+        while len(self.futures) < max(runners, 1) and not self.exhausted:
+            self.futures.append(self.executor.submit(self._consume,
+                                                     self.action))
+
+    def _next_task(self) -> tuple:
+        """
+        Get the next item from the shared tasks iterator
+        :return: tuple with valid status and the item
+        """
+        with self.lock:
+            for item in self.tasks:
+                return True, item
+            self.exhausted = True
+            return False, None
+
+    def _consume(self,
+                 action: types.FunctionType) -> None:
+        """
+        Process the items until the iterator is exhausted and save the
+        results into the results queue.
+        A None item means no item is available yet from the iterator
+        """
+        try:
+            while True:
+                if self.controller:
+                    # Wait until the controller allows another action
+                    with self.condition:
+                        self.condition.wait_for(
+                            lambda: self.running < self.controller.limit)
+                        self.running += 1
+                result = None
+                try:
+                    valid, item = self._next_task()
+                    if valid and item is not None:
+                        if self.buckets:
+                            # Wait for the rate limiter
+                            self.limiter.acquire(self.buckets,
+                                                 self.tokens(item)
+                                                 if self.tokens else 1)
+                        if self.probes:
+                            # Wait for the shared probes
+                            self.probes.acquire()
+                        try:
+                            started = time.monotonic()
+                            result = execute_with_thread_deadline(
+                                action=action,
+                                item=item,
+                                deadline=self.deadline)
+                        finally:
+                            if self.probes:
+                                self.probes.release()
+                        self.results.put((item, result))
+                finally:
+                    if self.controller:
+                        self._release(elapsed=(time.monotonic() - started
+                                               if result is not None
+                                               else None),
+                                      result=result)
+                if not valid:
+                    break
+                elif item is None:
+                    # Wait for the next available item
+                    time.sleep(0.1)
+        finally:
+            # Signal the runner completion in the results queue
+            self.results.put(None)
+
+    def _release(self,
+                 elapsed: float,
+                 result: dict) -> None:
+        """
+        Record the completed action and wake up the waiting runners
+        """
+        with self.condition:
+            if result is not None:
+                self.controller.record(elapsed=elapsed,
+                                       status=bool(result.get('status')))
+            self.running -= 1
+            # Add the threads for a grown limit
+            self._start_runners(self.controller.limit)
+            self.condition.notify_all()
+
+    def results_as_iterator(self):
+        """
+        Consume the results queue while the threads are running, until
+        every thread has signaled its completion
+        """
+        completed = 0
+        # Any thread is added by a running thread before its completion
+        while completed < len(self.futures):
+            result = self.results.get()
+            if result is None:
+                # A runner has processed all the items
+                completed += 1
+            elif result:
+                # Skip any empty value
+                yield result
+        self.executor.shutdown(wait=True)
+        for future in self.futures:
+            # Raise any error from the runners
+            future.result()
+
+    def results_as_list(self) -> list:
+        """
+        Consume the results queue and convert it to a list
+        """
+        return list(self.results_as_iterator())
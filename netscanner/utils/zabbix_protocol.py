@@ -0,0 +1,142 @@
+##
+#     Project: Django NetScanner
+# Description: A Django application to make network scans
+#      Author: Fabio Castelli (Muflone) <muflone@muflone.com>
+#   Copyright: 2019 Fabio Castelli
+#     License: GPL-3+
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+# https://www.zabbix.com/documentation/current/manual/appendix/protocols/header_datalen
+
+import asyncio
+import struct
+import zlib
+
+# ZBXD header: signature, flags, data length and reserved (uncompressed
+# data length for the compressed messages)
+ZBXD_SIGNATURE = b'ZBXD'
+ZBXD_HEADER = struct.Struct('<4sBII')
+# Reserved field for the large packets, after the 8 bytes data length
+ZBXD_RESERVED_LARGE = struct.Struct('<Q')
+ZBXD_FLAG_PROTOCOL = 0x01
+ZBXD_FLAG_COMPRESSION = 0x02
+ZBXD_FLAG_LARGE = 0x04
+# Maximum accepted data length
+ZBXD_MAX_LENGTH = 128 * 1024 * 1024
+ZBX_NOTSUPPORTED = b'ZBX_NOTSUPPORTED'
+# Errors raised for the failed requests
+ZBXD_ERRORS = (OSError,
+               EOFError,
+               ValueError,
+               zlib.error,
+               asyncio.TimeoutError)
+
+
+def get_request(item: str) -> bytes:
+    """
+    Get a ZBXD request for an item
+    :param item: item key to request
+    :return: byte string with the header and the data
+    """
+    data = item.encode('utf-8')
+    return ZBXD_HEADER.pack(ZBXD_SIGNATURE,
+                            ZBXD_FLAG_PROTOCOL,
+                            len(data),
+                            0) + data
+
+
+async def read_response(reader: asyncio.StreamReader) -> bytes:
+    """
+    Read a whole ZBXD response, reading the header first and then exactly
+    the data length from the header
+    :param reader: stream reader for the connection
+    :return: bytes with the data, decompressed if needed
+    """
+    (signature, flags, length, reserved) = ZBXD_HEADER.unpack(
+        await reader.readexactly(ZBXD_HEADER.size))
+    if signature != ZBXD_SIGNATURE:
+        raise ValueError('Invalid ZBXD header')
+    if flags & ZBXD_FLAG_LARGE:
+        # The data length uses 8 bytes, followed by 8 reserved bytes
+        length |= reserved << 32
+        await reader.readexactly(ZBXD_RESERVED_LARGE.size)
+    if length > ZBXD_MAX_LENGTH:
+        raise ValueError('ZBXD data too large')
+    data = await reader.readexactly(length)
+    if flags & ZBXD_FLAG_COMPRESSION:
+        decompressor = zlib.decompressobj()
+        data = decompressor.decompress(data, ZBXD_MAX_LENGTH)
+        if decompressor.unconsumed_tail:
+            raise ValueError('ZBXD data too large')
+    return data
+
+
+class ZabbixClient(object):
+    def __init__(self,
+                 timeout: int,
+                 max_connections: int):
+        self.timeout = timeout
+        self.max_connections = max_connections
+
+    async def get_value(self,
+                        destination: str,
+                        port: int,
+                        item: str) -> bytes:
+        """
+        Get an item value using a new connection to the agent
+        :param destination: agent address
+        :param port: agent port
+        :param item: item key to request
+        :return: bytes with the item value
+        """
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host=destination,
+                                    port=port),
+            timeout=self.timeout or None)
+        try:
+            writer.write(get_request(item))
+            return await asyncio.wait_for(read_response(reader),
+                                          timeout=self.timeout or None)
+        finally:
+            writer.close()
+
+    async def get_values(self,
+                         destination: str,
+                         port: int,
+                         items: list) -> dict:
+        """
+        Get many items values concurrently, limiting the connections to
+        the agent, skipping the failed and the unsupported items
+        :param destination: agent address
+        :param port: agent port
+        :param items: items keys to request
+        :return: dictionary object with the values by item
+        """
+        semaphore = asyncio.Semaphore(max(self.max_connections, 1))
+
+        async def get_item(item: str) -> bytes:
+            async with semaphore:
+                try:
+                    return await self.get_value(destination=destination,
+                                                port=port,
+                                                item=item)
+                except ZBXD_ERRORS:
+                    return None
+
+        values = await asyncio.gather(*(get_item(item) for item in items))
+        return {item: value.decode('utf-8', errors='replace')
+                for item, value in zip(items, values)
+                if value is not None and
+                not value.startswith(ZBX_NOTSUPPORTED)}